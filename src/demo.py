@@ -17,6 +17,7 @@ from flask_login import LoginManager,\
 from user_blueprint.blueprint import user_blueprint,\
                                      user_handler
 from user_blueprint.user import RegistrationData,\
+                                console_login_link_email_sender,\
                                 console_password_reset_email_sender,\
                                 console_verification_email_sender
 
@@ -138,6 +139,7 @@ def get_user_by_id(user_id: str) -> Optional[User]:
 
 
 user_handler.token_signing_key = "DemoResetTokenSecret"
+user_handler.login_link_email_sender(console_login_link_email_sender)
 user_handler.password_reset_email_sender(console_password_reset_email_sender)
 user_handler.verification_email_sender(console_verification_email_sender)
 
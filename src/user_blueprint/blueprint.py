@@ -7,7 +7,11 @@ Flask user handler blueprint.
 # ----------------------------------------
 
 
+from urllib.parse import urlparse
+
 from flask import Blueprint,\
+                  abort,\
+                  jsonify,\
                   redirect,\
                   render_template,\
                   request,\
@@ -17,19 +21,21 @@ from flask_login import current_user,\
                         login_required,\
                         logout_user
 
-from werkzeug.urls import url_parse
-
+from user_blueprint.hashing import LOGIN, REGISTRATION, RESET,\
+                                   HashingError
 from user_blueprint.user import UserHandler,\
-                                LoginForm, LoginData,\
+                                LoginForm, LoginData, LoginLinkForm,\
                                 PasswordResetForm,\
                                 RegistrationForm, RegistrationData,\
-                                RequestPasswordResetForm
+                                RequestLoginLinkForm, RequestPasswordResetForm
 
 
 # Typing imports
 # ----------------------------------------
 
 
+from typing import Any
+
 # Metadata
 # ------------------------------------------------------------
 
@@ -56,6 +62,22 @@ user_handler: UserHandler = UserHandler()
 The user handler the blueprint is using to interact with the user database.
 """
 
+busy_message: str = "The server is busy, please try again in a few seconds."
+"""
+The message that is displayed when a request is rejected because the server is overloaded.
+"""
+
+challenge_failed_message: str = "Browser verification failed, please try again."
+"""
+The message that is displayed when a login attempt is rejected due to a missing or invalid
+proof-of-work challenge solution.
+"""
+
+throttled_message: str = "Too many failed login attempts, please try again later."
+"""
+The message that is displayed when a login attempt is rejected due to too many failed attempts.
+"""
+
 
 # Blueprint routes
 # ----------------------------------------
@@ -70,17 +92,64 @@ def login():
         return redirect(url_for("index"))
 
     login_error = ""
+    status = 200
     form = LoginForm()
+    if request.method == "POST" and user_handler.is_hashing_saturated(LOGIN):
+        return busy_response(
+            "login.html", form=form, title="Log In", login_error=busy_message,
+            challenge=user_handler.get_login_challenge()
+        )
+
     if form.validate_on_submit():
-        if user_handler.login_user(LoginData.from_form(form)):
-            next_page = request.args.get("next")
-            if not is_internal_url(next_page):
-                next_page = url_for("index")
-            return redirect(next_page)
+        data: LoginData = LoginData.from_form(form)
+        if user_handler.is_login_throttled(data.username):
+            login_error, status = throttled_message, 429
+        elif not user_handler.check_login_challenge(data):
+            login_error = challenge_failed_message
         else:
-            login_error = "Invalid username or password."
+            try:
+                logged_in: bool = user_handler.login_user(data)
+            except HashingError:
+                return busy_response(
+                    "login.html", form=form, title="Log In", login_error=busy_message,
+                    challenge=user_handler.get_login_challenge()
+                )
+
+            if logged_in:
+                next_page = request.args.get("next")
+                if not is_internal_url(next_page):
+                    next_page = url_for("index")
+                return redirect(next_page)
+            else:
+                login_error = "Invalid username or password."
+
+    return render_template(
+        "login.html", form=form, title="Log In", login_error=login_error,
+        challenge=user_handler.get_login_challenge()
+    ), status
+
+
+@user_blueprint.route("/login_link/<token>", methods=["GET", "POST"])
+def login_link(token: str):
+    """
+    View function that logs in the user the given login link token belongs to.
 
-    return render_template("login.html", form=form, title="Log In", login_error=login_error)
+    Opening the link only renders a confirmation form, the token is consumed when the
+    form is submitted, so link scanners of email providers can not use up the link.
+    """
+    if current_user.is_authenticated:
+        return redirect(url_for("index"))
+
+    if user_handler.get_user_for_login_token(token) is None:
+        return redirect(url_for(".request_login_link"))
+
+    form = LoginLinkForm()
+    if form.validate_on_submit():
+        if user_handler.login_user_with_token(token, remember=form.remember.data):
+            return redirect(url_for("index"))
+        return redirect(url_for(".request_login_link"))
+
+    return render_template("login_link.html", title="Log In", token=token, form=form)
 
 
 @user_blueprint.route("/logout", methods=["GET"])
@@ -93,6 +162,26 @@ def logout():
     return redirect(url_for(".login"))
 
 
+@user_blueprint.route("/prehash_parameters", methods=["GET"])
+def prehash_parameters():
+    """
+    View function that returns the client-side pre-hashing parameters (salt and iteration
+    count) of the user with the identifier in the `identifier` query parameter as JSON.
+
+    The username and the email address of a user get the same salt, so the route should
+    be rate limited (for example by the reverse proxy) to slow down linking them.
+    """
+    if user_handler.client_prehashing is None:
+        abort(404)
+
+    identifier: str = request.args.get("identifier", "")
+    if not 5 <= len(identifier) <= 40:
+        abort(400)
+
+    salt, iterations = user_handler.get_prehash_parameters(identifier)
+    return jsonify(salt=salt, iterations=iterations)
+
+
 @user_blueprint.route("/register", methods=["GET", "POST"])
 def register():
     """
@@ -102,13 +191,50 @@ def register():
         return redirect(url_for("index"))
 
     form = RegistrationForm(user_handler)
+    if request.method == "POST" and user_handler.is_hashing_saturated(REGISTRATION):
+        return busy_response("register.html", form=form, title="Register", busy_message=busy_message)
+
     if form.validate_on_submit():
-        if user_handler.insert_user(RegistrationData.from_form(form)):
+        try:
+            data: RegistrationData = RegistrationData.from_form(form)
+        except HashingError:
+            return busy_response("register.html", form=form, title="Register", busy_message=busy_message)
+
+        if user_handler.insert_user(data):
             return redirect(url_for(".login"))
 
     return render_template("register.html", form=form, title="Register")
 
 
+@user_blueprint.route("/request_login_link", methods=["GET", "POST"])
+def request_login_link():
+    """
+    View function for the page where the visitor can request a login link for an email address.
+    """
+    if current_user.is_authenticated:
+        return redirect(url_for("index"))
+
+    if not user_handler.is_login_link_enabled():
+        abort(404)
+
+    form = RequestLoginLinkForm()
+    if form.validate_on_submit():
+        user_handler.send_login_link_email(form.email.data)
+        return render_template(
+            "request_login_link.html",
+            title="Email Login Link",
+            form=form,
+            message="Login link sent."
+        )
+
+    return render_template(
+        "request_login_link.html",
+        title="Email Login Link",
+        form=form,
+        message=""
+    )
+
+
 @user_blueprint.route("/request_password_reset", methods=["GET", "POST"])
 def request_password_reset():
     """
@@ -148,15 +274,44 @@ def reset(token: str):
         return redirect(url_for(".login"))
 
     form = PasswordResetForm()
+    if request.method == "POST" and user_handler.is_hashing_saturated(RESET):
+        return busy_response(
+            "reset_password_with_token.html",
+            title="Reset Password",
+            token=token,
+            username=user.username,
+            form=form,
+            busy_message=busy_message
+        )
+
     if form.validate_on_submit():
-        from passlib.hash import argon2
-        user_handler.update_password(user, argon2.hash(form.password.data))
+        try:
+            password_hash: str = user_handler.hash_password(
+                form.password.data,
+                RESET,
+                client_hash=form.client_hash.data or "",
+                salt=form.salt.data or "",
+                username=user.username
+            )
+        except HashingError:
+            return busy_response(
+                "reset_password_with_token.html",
+                title="Reset Password",
+                token=token,
+                username=user.username,
+                form=form,
+                busy_message=busy_message
+            )
+
+        if user_handler.consume_token(token):
+            user_handler.update_password(user, password_hash)
         return redirect(url_for(".login"))
 
     return render_template(
         "reset_password_with_token.html",
         title="Reset Password",
         token=token,
+        username=user.username,
         form=form
     )
 
@@ -173,10 +328,43 @@ def verify(token: str):
     return redirect(url_for(".login"))
 
 
+# Context processors
+# ----------------------------------------
+
+
+@user_blueprint.context_processor
+def inject_user_handler_settings():
+    """
+    Makes the settings of the user handler that affect the templates available to them.
+    """
+    return {
+        "login_link_enabled": user_handler.is_login_link_enabled(),
+        "prehashing": user_handler.client_prehashing
+    }
+
+
 # Methods
 # ----------------------------------------
 
 
+def busy_response(template: str, **context: Any) -> Any:
+    """
+    Returns a "503 Service Unavailable" response with a `Retry-After` header that
+    renders the given template with the given context.
+
+    Arguments:
+        template (str): The name of the template to render.
+        context (Any): The context to render the template with.
+
+    Returns:
+        The response tuple.
+    """
+    return \
+        render_template(template, **context),\
+        503,\
+        {"Retry-After": str(user_handler.hashing_retry_after())}
+
+
 def is_internal_url(url: str) -> bool:
     """
     Returns whether the given URL is internal to the application.
@@ -187,4 +375,4 @@ def is_internal_url(url: str) -> bool:
     Returns:
         Whether the given URL is internal to the application.
     """
-    return url is not None and url_parse(url).netloc == ""
+    return url is not None and urlparse(url).netloc == ""
@@ -0,0 +1,236 @@
+"""
+Argon2 parameter calibration that picks the strongest hash parameters meeting a latency
+budget on the current machine.
+
+The calibration can be executed at application start (see `calibrate()`) or from the
+command line:
+
+    python -m user_blueprint.calibration --target-ms 250 --concurrency 4
+"""
+
+
+# Imports
+# ----------------------------------------
+
+
+from concurrent.futures import ThreadPoolExecutor
+
+from math import ceil
+
+from os import cpu_count
+
+from time import perf_counter
+
+from user_blueprint.hashers import Argon2Hasher,\
+                                   Argon2Parameters,\
+                                   PasslibArgon2Hasher
+
+
+# Typing imports
+# ----------------------------------------
+
+
+from typing import Any, List, NamedTuple, Optional, Type
+
+
+# Metadata
+# ------------------------------------------------------------
+
+
+__author__ = "Peter Volf"
+
+
+# Classes
+# ------------------------------------------------------------
+
+
+class CalibrationResult(NamedTuple):
+    """
+    The result of an Argon2 parameter calibration.
+    """
+
+    # Properties
+    # ------------------------------------------------------------
+
+    parameters: Argon2Parameters
+    """
+    The selected parameters.
+    """
+
+    latency_ms: float
+    """
+    The measured verification latency (in milliseconds, at the requested percentile)
+    of the selected parameters.
+    """
+
+    meets_target: bool
+    """
+    Whether the selected parameters meet the latency target. If even the weakest
+    parameters that were tried miss the target, those parameters are returned.
+    """
+
+
+# Methods
+# ------------------------------------------------------------
+
+
+def measure_verify_latency(parameters: Argon2Parameters,
+                           concurrency: int = 1,
+                           samples: int = 8,
+                           percentile: float = 95,
+                           hasher_class: Type[Argon2Hasher] = PasslibArgon2Hasher) -> float:
+    """
+    Measures the verification latency of the given Argon2 parameters while `concurrency`
+    verifications are running at the same time.
+
+    Arguments:
+        parameters (Argon2Parameters): The parameters to measure.
+        concurrency (int): The number of concurrently running verifications.
+        samples (int): The number of verifications to execute per concurrent worker.
+        percentile (float): The percentile of the measured latencies to return.
+        hasher_class (Type[Argon2Hasher]): The Argon2 hasher to measure.
+
+    Returns:
+        The verification latency (in milliseconds) at the given percentile.
+    """
+    hasher: Argon2Hasher = hasher_class(parameters)
+    password_hash: str = hasher.hash("calibration password")
+
+    def verify() -> float:
+        start: float = perf_counter()
+        hasher.verify("calibration password", password_hash)
+        return (perf_counter() - start) * 1000
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        latencies: List[float] = sorted(executor.map(lambda _: verify(), range(concurrency * samples)))
+
+    index: int = min(len(latencies) - 1, max(0, ceil(len(latencies) * percentile / 100) - 1))
+    return latencies[index]
+
+
+def calibrate(target_ms: float = 250,
+              concurrency: int = 1,
+              percentile: float = 95,
+              samples: int = 8,
+              min_memory_mb: int = 8,
+              max_memory_mb: int = 1024,
+              max_time_cost: int = 10,
+              parallelism: Optional[int] = None,
+              hasher_class: Optional[Type[Argon2Hasher]] = None,
+              user_handler: Any = None) -> CalibrationResult:
+    """
+    Selects the strongest Argon2 parameters whose verification latency - measured with
+    `concurrency` concurrently running verifications - is within `target_ms` at the
+    given percentile.
+
+    Memory-hardness is the primary defence of Argon2, so the calibration first doubles
+    `memory_cost` (starting at `min_memory_mb`) as long as the target is met, and then
+    increases `time_cost` with the selected memory cost.
+
+    Arguments:
+        target_ms (float): The verification latency budget in milliseconds.
+        concurrency (int): The number of concurrent verifications the budget must hold for.
+        percentile (float): The latency percentile the budget applies to.
+        samples (int): The number of verifications to execute per concurrent worker
+                       in each measurement.
+        min_memory_mb (int): The smallest memory cost (in MiB) to try.
+        max_memory_mb (int): The largest memory cost (in MiB) to try.
+        max_time_cost (int): The largest time cost to try.
+        parallelism (Optional[int]): The number of lanes to use. If `None`, the available
+                                     CPU cores are divided among the concurrent hashes.
+        hasher_class (Optional[Type[Argon2Hasher]]): The Argon2 hasher to calibrate. If `None`,
+                                                     the Argon2 hasher of `user_handler` or
+                                                     `PasslibArgon2Hasher` is calibrated.
+        user_handler (Any): The `UserHandler` whose password hasher should be set to
+                            an Argon2 hasher with the selected parameters.
+
+    Returns:
+        The result of the calibration.
+    """
+    if parallelism is None:
+        parallelism = max(1, min(8, (cpu_count() or 1) // max(1, concurrency)))
+
+    if hasher_class is None:
+        current_hasher: Any = None if user_handler is None else user_handler.password_hasher
+        hasher_class = type(current_hasher) if isinstance(current_hasher, Argon2Hasher) else PasslibArgon2Hasher
+
+    def measure(params: Argon2Parameters) -> float:
+        return measure_verify_latency(
+            params, concurrency=concurrency, samples=samples, percentile=percentile, hasher_class=hasher_class
+        )
+
+    best: Argon2Parameters = Argon2Parameters(time_cost=1, memory_cost=min_memory_mb * 1024, parallelism=parallelism)
+    best_latency: float = measure(best)
+    meets_target: bool = best_latency <= target_ms
+
+    if meets_target:
+        memory_mb: int = min_memory_mb * 2
+        while memory_mb <= max_memory_mb:
+            params: Argon2Parameters = best._replace(memory_cost=memory_mb * 1024)
+            latency: float = measure(params)
+            if latency > target_ms:
+                break
+            best, best_latency = params, latency
+            memory_mb *= 2
+
+        for time_cost in range(2, max_time_cost + 1):
+            params = best._replace(time_cost=time_cost)
+            latency = measure(params)
+            if latency > target_ms:
+                break
+            best, best_latency = params, latency
+
+    if user_handler is not None:
+        user_handler.password_hasher = hasher_class(best)
+
+    return CalibrationResult(parameters=best, latency_ms=best_latency, meets_target=meets_target)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """
+    Command line entry point of the calibration.
+
+    Arguments:
+        argv (Optional[List[str]]): The command line arguments, `None` means `sys.argv`.
+    """
+    from argparse import ArgumentParser
+
+    parser: ArgumentParser = ArgumentParser(
+        prog="python -m user_blueprint.calibration",
+        description="Selects the strongest Argon2 parameters that meet a verification latency budget."
+    )
+    parser.add_argument("--target-ms", type=float, default=250, help="Verification latency budget in milliseconds.")
+    parser.add_argument("--concurrency", type=int, default=1, help="Number of concurrent verifications.")
+    parser.add_argument("--percentile", type=float, default=95, help="Latency percentile the budget applies to.")
+    parser.add_argument("--samples", type=int, default=8, help="Verifications per concurrent worker per measurement.")
+    parser.add_argument("--min-memory-mb", type=int, default=8, help="Smallest memory cost to try in MiB.")
+    parser.add_argument("--max-memory-mb", type=int, default=1024, help="Largest memory cost to try in MiB.")
+    parser.add_argument("--max-time-cost", type=int, default=10, help="Largest time cost to try.")
+    parser.add_argument("--parallelism", type=int, default=None, help="Number of lanes to use.")
+    args = parser.parse_args(argv)
+
+    result: CalibrationResult = calibrate(
+        target_ms=args.target_ms,
+        concurrency=args.concurrency,
+        percentile=args.percentile,
+        samples=args.samples,
+        min_memory_mb=args.min_memory_mb,
+        max_memory_mb=args.max_memory_mb,
+        max_time_cost=args.max_time_cost,
+        parallelism=args.parallelism
+    )
+
+    params: Argon2Parameters = result.parameters
+    print(
+        f"time_cost={params.time_cost} memory_cost={params.memory_cost} parallelism={params.parallelism} "
+        f"(p{args.percentile:g} verify latency: {result.latency_ms:.1f} ms"
+        f"{'' if result.meets_target else ', target not met'})"
+    )
+
+
+# Entry
+# ------------------------------------------------------------
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+"""
+Hashcash-style proof-of-work challenges that make clients pay for their login attempts
+while the server is overloaded.
+"""
+
+
+# Imports
+# ----------------------------------------
+
+
+from collections import OrderedDict
+
+from hashlib import sha256
+
+from hmac import compare_digest, new as new_hmac
+
+from secrets import token_hex
+
+from threading import Lock
+
+from time import time
+
+
+# Typing imports
+# ----------------------------------------
+
+
+from typing import Optional
+
+
+# Metadata
+# ------------------------------------------------------------
+
+
+__author__ = "Peter Volf"
+
+
+# Classes
+# ------------------------------------------------------------
+
+
+class ProofOfWorkChallenge(object):
+    """
+    Issues and verifies stateless, signed proof-of-work challenges.
+
+    A challenge has the `<difficulty>.<expiration>.<nonce>.<signature>` format. It is
+    solved by finding a (decimal) solution for which the SHA-256 digest of
+    `<challenge>:<solution>` starts with at least `difficulty` zero bits, which takes
+    `2 ** difficulty` hash computations on average.
+
+    Challenges are only required while the hashing backlog is at least
+    `threshold_queue_depth` long, and the difficulty grows by one (doubling the work
+    of the clients) for every `difficulty_step` additional queued jobs.
+
+    Solved challenges are remembered until they expire, so a solution can only be used
+    once. The number of remembered challenges is bounded by `max_spent_challenges`.
+    """
+
+    # Initialization
+    # ------------------------------------------------------------
+
+    def __init__(self,
+                 secret_key: str,
+                 threshold_queue_depth: int = 8,
+                 base_difficulty: int = 14,
+                 max_difficulty: int = 22,
+                 difficulty_step: int = 8,
+                 ttl: float = 300,
+                 max_spent_challenges: int = 100000) -> None:
+        """
+        Initialization.
+
+        Arguments:
+            secret_key (str): The secret key to sign the challenges with.
+            threshold_queue_depth (int): The hashing queue depth from which challenges are required.
+            base_difficulty (int): The difficulty of the challenges at the threshold queue depth.
+            max_difficulty (int): The maximum difficulty of the challenges.
+            difficulty_step (int): The number of additional queued jobs that increase the
+                                   difficulty by one.
+            ttl (float): The number of seconds a challenge is valid for.
+            max_spent_challenges (int): The maximum number of solved challenges to remember.
+        """
+        if threshold_queue_depth < 1 or difficulty_step < 1:
+            raise ValueError("threshold_queue_depth and difficulty_step must be at least 1.")
+        if not 1 <= base_difficulty <= max_difficulty <= 255:
+            raise ValueError("Invalid difficulty range.")
+
+        self.threshold_queue_depth: int = threshold_queue_depth
+        """
+        The hashing queue depth from which challenges are required.
+        """
+
+        self.base_difficulty: int = base_difficulty
+        """
+        The difficulty of the challenges at the threshold queue depth.
+        """
+
+        self.max_difficulty: int = max_difficulty
+        """
+        The maximum difficulty of the challenges.
+        """
+
+        self.difficulty_step: int = difficulty_step
+        """
+        The number of additional queued jobs that increase the difficulty by one.
+        """
+
+        self.ttl: float = ttl
+        """
+        The number of seconds a challenge is valid for.
+        """
+
+        self.max_spent_challenges: int = max_spent_challenges
+        """
+        The maximum number of solved challenges to remember.
+        """
+
+        self._lock: Lock = Lock()
+        """
+        Lock that protects the spent challenges.
+        """
+
+        self._secret_key: bytes = secret_key.encode("utf-8")
+        """
+        The secret key to sign the challenges with.
+        """
+
+        self._spent: "OrderedDict[str, float]" = OrderedDict()
+        """
+        The solved challenges with their expiration time in expiration order.
+        """
+
+    # Methods
+    # ------------------------------------------------------------
+
+    def get_difficulty(self, queue_depth: int) -> int:
+        """
+        Returns the difficulty of the challenges for the given hashing queue depth.
+
+        Arguments:
+            queue_depth (int): The current depth of the hashing queue.
+
+        Returns:
+            The difficulty of the challenges or 0 if no challenge is required.
+        """
+        if queue_depth < self.threshold_queue_depth:
+            return 0
+
+        extra: int = (queue_depth - self.threshold_queue_depth) // self.difficulty_step
+        return min(self.max_difficulty, self.base_difficulty + extra)
+
+    def issue(self, difficulty: int) -> str:
+        """
+        Issues a new challenge with the given difficulty.
+
+        Arguments:
+            difficulty (int): The difficulty of the challenge.
+
+        Returns:
+            The challenge.
+        """
+        payload: str = f"{difficulty}.{int(time() + self.ttl)}.{token_hex(8)}"
+        return f"{payload}.{self._sign(payload)}"
+
+    def verify(self, challenge: str, solution: str, consume: bool = False, min_difficulty: int = 0) -> bool:
+        """
+        Returns whether the given solution solves the given challenge.
+
+        Arguments:
+            challenge (str): The challenge that was issued by this object.
+            solution (str): The solution of the challenge.
+            consume (bool): Whether to mark the challenge as spent if the solution is valid.
+            min_difficulty (int): The minimum difficulty the challenge must have. Challenges
+                                  that were issued with a lower difficulty (for example before
+                                  the hashing backlog grew) are rejected.
+
+        Returns:
+            `True` if the challenge is authentic, unexpired, unspent, at least as difficult
+            as `min_difficulty` and the solution is valid, `False` otherwise.
+        """
+        try:
+            payload, signature = challenge.rsplit(".", 1)
+            difficulty_str, expiration_str, _ = payload.split(".")
+            difficulty: int = int(difficulty_str)
+            expiration: float = int(expiration_str)
+        except (AttributeError, ValueError):
+            return False
+
+        # Issued challenges are ASCII, int() and compare_digest() alone would not ensure it.
+        if difficulty < min_difficulty or not challenge.isascii() or\
+           not compare_digest(signature, self._sign(payload)):
+            return False
+
+        now: float = time()
+        # isdigit() also accepts non-ASCII digits like "²", only ASCII digits are valid.
+        if expiration < now or not isinstance(solution, str) or not solution.isascii() or\
+           not solution.isdigit() or len(solution) > 20:
+            return False
+
+        digest: bytes = sha256(f"{challenge}:{solution}".encode("ascii")).digest()
+        if int.from_bytes(digest, "big") >> (256 - difficulty) != 0:
+            return False
+
+        with self._lock:
+            self._prune(now)
+            if challenge in self._spent:
+                return False
+
+            if consume:
+                self._spent[challenge] = expiration
+                if len(self._spent) > self.max_spent_challenges:
+                    self._spent.popitem(last=False)
+
+        return True
+
+    # Protected methods
+    # ------------------------------------------------------------
+
+    def _prune(self, now: float) -> None:
+        """
+        Forgets the spent challenges that have expired.
+
+        The method must be called while holding the lock of the object.
+        """
+        # Challenges are issued with the same TTL, so they are (nearly) in expiration order.
+        while self._spent:
+            challenge, expiration = next(iter(self._spent.items()))
+            if expiration >= now:
+                break
+            del self._spent[challenge]
+
+    def _sign(self, payload: str) -> str:
+        """
+        Returns the signature of the given challenge payload.
+        """
+        return new_hmac(self._secret_key, payload.encode("ascii"), sha256).hexdigest()[:32]
+
+
+# Methods
+# ------------------------------------------------------------
+
+
+def solve(challenge: str) -> Optional[str]:
+    """
+    Solves the given challenge. The method is meant for testing and for non-browser clients.
+
+    Arguments:
+        challenge (str): The challenge to solve.
+
+    Returns:
+        The solution of the challenge or `None` if the challenge is malformed.
+    """
+    try:
+        difficulty: int = int(challenge.split(".", 1)[0])
+    except ValueError:
+        return None
+
+    counter: int = 0
+    while True:
+        digest: bytes = sha256(f"{challenge}:{counter}".encode("ascii")).digest()
+        if int.from_bytes(digest, "big") >> (256 - difficulty) == 0:
+            return str(counter)
+        counter += 1
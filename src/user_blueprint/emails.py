@@ -0,0 +1,409 @@
+"""
+Precompiled Jinja templates of the verification, password reset and login link emails.
+
+Every email template has a `subject`, a `text` and an optional `html` block. The templates
+are loaded and compiled once, and each block is rendered once with placeholder values, so
+the static parts of the emails (including the values of the template context) are cached
+and rendering an email only substitutes the per-user fields (`username`, `email` and `link`).
+
+The rendering throughput of the precompiled templates and of plain Jinja rendering can be
+compared with:
+
+    python -m user_blueprint.emails
+"""
+
+
+# Imports
+# ----------------------------------------
+
+
+from os import path
+
+from re import compile as compile_regex
+
+from threading import Lock
+
+from time import perf_counter
+
+from jinja2 import Environment, FileSystemLoader, Template
+
+from markupsafe import escape
+
+
+# Typing imports
+# ----------------------------------------
+
+
+from typing import Any, Dict, List, Mapping, NamedTuple, Optional, Pattern, Tuple
+
+
+# Metadata
+# ------------------------------------------------------------
+
+
+__author__ = "Peter Volf"
+
+
+# Global properties
+# ------------------------------------------------------------
+
+
+EMAIL_FIELDS: Tuple[str, ...] = ("username", "email", "link")
+"""
+The per-user fields of the email templates.
+"""
+
+EMAIL_BLOCKS: Tuple[str, ...] = ("subject", "text", "html")
+"""
+The blocks of the email templates.
+"""
+
+DEFAULT_TEMPLATE_FOLDER: str = path.join(path.dirname(path.abspath(__file__)), "templates", "emails")
+"""
+The folder of the built-in email templates.
+"""
+
+_placeholder_variants: Tuple[str, ...] = ("xY", "zW")
+"""
+The variant markers of the placeholders the blocks are pre-rendered with. They are mixed
+case, so case-changing filters are detected.
+"""
+
+_placeholder_pattern: Pattern = compile_regex("\x1e(\\d+)\\.(xY|zW)(&amp;|&)\x1f")
+"""
+Pattern of the placeholders the blocks are pre-rendered with. The `&` of the placeholder
+shows whether the field is HTML escaped where it is used.
+"""
+
+
+# Classes
+# ------------------------------------------------------------
+
+
+class RenderedEmail(NamedTuple):
+    """
+    A rendered email.
+    """
+
+    # Properties
+    # ------------------------------------------------------------
+
+    subject: str
+    """
+    The subject of the email.
+    """
+
+    text: str
+    """
+    The plain text body of the email.
+    """
+
+    html: Optional[str]
+    """
+    The HTML alternative of the body of the email or `None` if the template has no HTML block.
+    """
+
+
+class _CompiledBlock(NamedTuple):
+    """
+    A pre-rendered template block.
+    """
+
+    # Properties
+    # ------------------------------------------------------------
+
+    chunks: Tuple[str, ...]
+    """
+    The static parts of the block. There is one more chunk than substitution.
+    """
+
+    substitutions: Tuple[Tuple[int, bool], ...]
+    """
+    The index of the field (in `EMAIL_FIELDS`) and whether it is HTML escaped, for each
+    place where a field is substituted.
+    """
+
+
+class EmailTemplates(object):
+    """
+    Email templates that are compiled and pre-rendered once per email kind.
+
+    The templates are loaded from `<kind>.jinja` files (see `user_blueprint.outbox` for
+    the email kinds used by `UserHandler`), and they are rendered without a Flask
+    application or request context. The values of `context` are available in every
+    template and they are part of the cached static content.
+
+    The `html` block is rendered with autoescaping enabled, whether or not the template
+    enables it, so the per-user fields (and the values of `context`) are HTML escaped in it.
+
+    Blocks that transform the per-user fields (for example with a filter other than `e`)
+    are detected and rendered with Jinja for every email. Conditions and tests on the
+    per-user fields are not detected: such blocks are pre-rendered as if the field was a
+    non-empty string, so templates must not branch on the per-user fields.
+
+    The class is thread-safe.
+    """
+
+    # Initialization
+    # ------------------------------------------------------------
+
+    def __init__(self,
+                 template_folder: str = DEFAULT_TEMPLATE_FOLDER,
+                 context: Optional[Mapping[str, Any]] = None) -> None:
+        """
+        Initialization.
+
+        Arguments:
+            template_folder (str): The folder that contains the `<kind>.jinja` templates.
+            context (Optional[Mapping[str, Any]]): Values that are available in every template,
+                                                   for example the name of the site.
+        """
+
+        self.context: Dict[str, Any] = dict(context or {})
+        """
+        Values that are available in every template.
+        """
+
+        self._compiled: Dict[str, Dict[str, Tuple[Template, Optional[_CompiledBlock]]]] = {}
+        """
+        The template each block is rendered with and the pre-rendered block (or `None` for
+        blocks that must be rendered with Jinja) by block name, by email kind.
+        """
+
+        self._environment: Environment = Environment(
+            loader=FileSystemLoader(template_folder), trim_blocks=True, lstrip_blocks=True
+        )
+        """
+        The Jinja environment the templates of the `subject` and `text` blocks are loaded with.
+        """
+
+        self._html_environment: Environment = Environment(
+            loader=FileSystemLoader(template_folder), autoescape=True, trim_blocks=True, lstrip_blocks=True
+        )
+        """
+        The Jinja environment with autoescaping the templates of the `html` block are loaded with.
+        """
+
+        self._lock: Lock = Lock()
+        """
+        Lock that protects the compilation of the templates.
+        """
+
+    # Methods
+    # ------------------------------------------------------------
+
+    def clear(self) -> None:
+        """
+        Forgets the compiled templates, so they are reloaded on their next use. Must be
+        called after changing the context.
+        """
+        with self._lock:
+            self._compiled = {}
+
+    def render(self, kind: str, user: Any, link: str) -> RenderedEmail:
+        """
+        Renders the email of the given kind.
+
+        Arguments:
+            kind (str): The kind of the email, the name of its template without the extension.
+            user (Any): The user to render the email for. The user is assumed to have a `username`
+                        and an `email` property.
+            link (str): The link the email contains.
+
+        Returns:
+            The rendered email.
+
+        Raises:
+            jinja2.TemplateNotFound: If there is no template for the given kind.
+        """
+        return self.render_fields(kind, (user.username, user.email, link))
+
+    def render_fields(self, kind: str, values: Tuple[str, ...]) -> RenderedEmail:
+        """
+        Renders the email of the given kind with the given field values.
+
+        Arguments:
+            kind (str): The kind of the email, the name of its template without the extension.
+            values (Tuple[str, ...]): The values of the `EMAIL_FIELDS`, in the same order.
+
+        Returns:
+            The rendered email.
+
+        Raises:
+            jinja2.TemplateNotFound: If there is no template for the given kind.
+        """
+        compiled: Optional[Dict[str, Tuple[Template, Optional[_CompiledBlock]]]] = self._compiled.get(kind)
+        if compiled is None:
+            compiled = self._compile(kind)
+
+        escaped: Optional[Tuple[str, ...]] = None
+        rendered: List[Optional[str]] = []
+        for name in EMAIL_BLOCKS:
+            if name not in compiled:
+                rendered.append(None)
+                continue
+
+            template, block = compiled[name]
+            if block is None:
+                rendered.append(self._render_block(template, name, values).strip())
+                continue
+
+            if escaped is None and any(is_escaped for _, is_escaped in block.substitutions):
+                escaped = tuple(str(escape(value)) for value in values)
+
+            parts: List[str] = [block.chunks[0]]
+            for (index, is_escaped), chunk in zip(block.substitutions, block.chunks[1:]):
+                parts.append(escaped[index] if is_escaped else values[index])
+                parts.append(chunk)
+            rendered.append("".join(parts).strip())
+
+        return RenderedEmail(subject=rendered[0] or "", text=rendered[1] or "", html=rendered[2])
+
+    # Protected methods
+    # ------------------------------------------------------------
+
+    def _compile(self, kind: str) -> Dict[str, Tuple[Template, Optional[_CompiledBlock]]]:
+        """
+        Loads the template of the given kind and pre-renders its blocks.
+        """
+        with self._lock:
+            compiled: Optional[Dict[str, Tuple[Template, Optional[_CompiledBlock]]]] = self._compiled.get(kind)
+            if compiled is None:
+                compiled = {}
+                for name in EMAIL_BLOCKS:
+                    environment: Environment = self._html_environment if name == "html" else self._environment
+                    template: Template = environment.get_template(f"{kind}.jinja")
+                    if name in template.blocks:
+                        compiled[name] = (template, self._pre_render(template, name))
+                self._compiled[kind] = compiled
+
+            return compiled
+
+    def _pre_render(self, template: Template, name: str) -> Optional[_CompiledBlock]:
+        """
+        Pre-renders the given block of the given template, or returns `None` if the block
+        must be rendered with Jinja.
+
+        The block is rendered with two different sets of placeholders, and it can only be
+        pre-rendered if both renderings have the same static parts and substitutions.
+        """
+        results: List[_CompiledBlock] = []
+        for variant in _placeholder_variants:
+            output: str = self._render_block(
+                template, name, tuple(f"\x1e{index}.{variant}&\x1f" for index in range(len(EMAIL_FIELDS)))
+            )
+
+            chunks: List[str] = []
+            substitutions: List[Tuple[int, bool]] = []
+            position: int = 0
+            for match in _placeholder_pattern.finditer(output):
+                if match.group(2) != variant:
+                    return None
+                chunks.append(output[position:match.start()])
+                substitutions.append((int(match.group(1)), match.group(3) == "&amp;"))
+                position = match.end()
+            chunks.append(output[position:])
+
+            if any("\x1e" in chunk or "\x1f" in chunk for chunk in chunks):
+                # A placeholder has been transformed by a filter.
+                return None
+
+            results.append(_CompiledBlock(chunks=tuple(chunks), substitutions=tuple(substitutions)))
+
+        return results[0] if results[0] == results[1] else None
+
+    def _render_block(self, template: Template, name: str, values: Tuple[str, ...]) -> str:
+        """
+        Renders the given block of the given template with Jinja.
+        """
+        variables: Dict[str, Any] = dict(self.context)
+        variables.update(zip(EMAIL_FIELDS, values))
+        return "".join(template.blocks[name](template.new_context(variables)))
+
+
+class EmailBenchmarkResult(NamedTuple):
+    """
+    The result of an email rendering benchmark.
+    """
+
+    # Properties
+    # ------------------------------------------------------------
+
+    emails_per_second: float
+    """
+    The number of emails rendered per second.
+    """
+
+    render_us: float
+    """
+    The average duration of rendering an email in microseconds.
+    """
+
+
+# Methods
+# ------------------------------------------------------------
+
+
+def benchmark_emails(count: int = 20000, kind: str = "password_reset") -> Dict[str, EmailBenchmarkResult]:
+    """
+    Measures the bulk rendering throughput of the given kind of emails with the precompiled
+    templates and with plain Jinja rendering of the same templates.
+
+    Arguments:
+        count (int): The number of emails to render per configuration.
+        kind (str): The kind of the emails to render.
+
+    Returns:
+        The benchmark results by configuration name.
+    """
+    templates: EmailTemplates = EmailTemplates(context={"site_name": "Benchmark"})
+    values: List[Tuple[str, ...]] = [
+        (f"user{index}", f"user{index}@example.com", f"https://example.com/auth/reset/token{index}")
+        for index in range(count)
+    ]
+    compiled: Dict[str, Tuple[Template, Optional[_CompiledBlock]]] = templates._compile(kind)
+
+    def render_with_jinja(fields: Tuple[str, ...]) -> RenderedEmail:
+        rendered: List[Optional[str]] = [
+            templates._render_block(compiled[name][0], name, fields).strip() if name in compiled else None
+            for name in EMAIL_BLOCKS
+        ]
+        return RenderedEmail(subject=rendered[0] or "", text=rendered[1] or "", html=rendered[2])
+
+    configurations: Dict[str, Any] = {
+        "precompiled": lambda fields: templates.render_fields(kind, fields),
+        "jinja": render_with_jinja
+    }
+
+    results: Dict[str, EmailBenchmarkResult] = {}
+    for name, render in configurations.items():
+        render(values[0])  # Warm up.
+
+        start: float = perf_counter()
+        for fields in values:
+            render(fields)
+        duration: float = perf_counter() - start
+
+        results[name] = EmailBenchmarkResult(emails_per_second=count / duration, render_us=duration * 1000000 / count)
+
+    return results
+
+
+def main() -> None:
+    """
+    Command line entry point that benchmarks the rendering throughput of the built-in email templates.
+    """
+    for kind in ("verification", "password_reset", "login_link"):
+        for name, result in benchmark_emails(kind=kind).items():
+            print(
+                f"{kind + ' / ' + name:<32} {result.emails_per_second:10.1f} emails/s   "
+                f"render: {result.render_us:8.3f} us"
+            )
+
+
+# Entry
+# ------------------------------------------------------------
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,684 @@
+"""
+Password hasher implementations the user handler can use to hash and verify passwords.
+
+The per-call overhead of the hashers can be compared by running:
+
+    python -m user_blueprint.hashers
+"""
+
+
+# Imports
+# ----------------------------------------
+
+
+from base64 import b64decode, b64encode
+
+from hmac import compare_digest
+
+from os import urandom
+
+from threading import Lock
+
+from time import perf_counter
+
+
+# Typing imports
+# ----------------------------------------
+
+
+from typing import Any, Dict, List, NamedTuple, Optional
+
+
+# Metadata
+# ------------------------------------------------------------
+
+
+__author__ = "Peter Volf"
+
+
+# Classes
+# ------------------------------------------------------------
+
+
+class Argon2Parameters(NamedTuple):
+    """
+    Argon2 cost parameters.
+    """
+
+    # Properties
+    # ------------------------------------------------------------
+
+    time_cost: int
+    """
+    The number of iterations.
+    """
+
+    memory_cost: int
+    """
+    The amount of memory (in KiB) a single hash allocates.
+    """
+
+    parallelism: int
+    """
+    The number of parallel lanes a single hash uses.
+    """
+
+
+class PasswordHasher(object):
+    """
+    Base class of the password hashers the user handler can use.
+
+    Hashers are executed by the hashing executor of the user handler, so they must be
+    thread-safe, and picklable if the executor uses a process pool.
+    """
+
+    # Properties
+    # ------------------------------------------------------------
+
+    @property
+    def memory_kib(self) -> int:
+        """
+        The amount of memory (in KiB) a single hash or verification allocates.
+        """
+        return 0
+
+    # Methods
+    # ------------------------------------------------------------
+
+    def hash(self, password: str) -> str:
+        """
+        Returns the hash of the given password.
+
+        Arguments:
+            password (str): The password to hash.
+
+        Returns:
+            The hash of the password.
+        """
+        raise NotImplementedError()
+
+    def needs_update(self, password_hash: str) -> bool:
+        """
+        Returns whether the given hash was created with outdated parameters and should be replaced.
+
+        Arguments:
+            password_hash (str): The password hash to check.
+
+        Returns:
+            `True` if the hash should be replaced, `False` otherwise.
+        """
+        raise NotImplementedError()
+
+    def verify(self, password: str, password_hash: str) -> bool:
+        """
+        Returns whether the given password matches the given hash.
+
+        Arguments:
+            password (str): The password to verify.
+            password_hash (str): The hash to verify the password against.
+
+        Returns:
+            `True` if the password matches the hash, `False` otherwise (including
+            the case when the hash is malformed).
+        """
+        raise NotImplementedError()
+
+
+class Argon2Hasher(PasswordHasher):
+    """
+    Base class of the Argon2 password hashers.
+    """
+
+    # Initialization
+    # ------------------------------------------------------------
+
+    def __init__(self, parameters: Optional[Argon2Parameters] = None) -> None:
+        """
+        Initialization.
+
+        Arguments:
+            parameters (Optional[Argon2Parameters]): The parameters of the hashes, `None`
+                                                     means the defaults of the backend.
+        """
+
+        self._parameters: Optional[Argon2Parameters] = parameters
+        """
+        The parameters of the hashes, `None` means the defaults of the backend.
+        """
+
+    # Properties
+    # ------------------------------------------------------------
+
+    @property
+    def memory_kib(self) -> int:
+        """
+        The amount of memory (in KiB) a single hash or verification allocates.
+        """
+        return self.parameters.memory_cost
+
+    @property
+    def parameters(self) -> Argon2Parameters:
+        """
+        The parameters of the hashes.
+        """
+        raise NotImplementedError()
+
+
+class PasslibArgon2Hasher(Argon2Hasher):
+    """
+    Argon2 password hasher that uses passlib's `argon2` handler.
+    """
+
+    # Properties
+    # ------------------------------------------------------------
+
+    @property
+    def parameters(self) -> Argon2Parameters:
+        """
+        The parameters of the hashes.
+        """
+        if self._parameters is not None:
+            return self._parameters
+
+        handler: Any = self._get_handler()
+        return Argon2Parameters(
+            time_cost=handler.default_rounds,
+            memory_cost=handler.memory_cost,
+            parallelism=handler.parallelism
+        )
+
+    # Methods
+    # ------------------------------------------------------------
+
+    def hash(self, password: str) -> str:
+        """
+        Returns the hash of the given password.
+
+        Arguments:
+            password (str): The password to hash.
+
+        Returns:
+            The hash of the password.
+        """
+        return self._get_handler().hash(password)
+
+    def needs_update(self, password_hash: str) -> bool:
+        """
+        Returns whether the given hash was created with outdated parameters and should be replaced.
+
+        Arguments:
+            password_hash (str): The password hash to check.
+
+        Returns:
+            `True` if the hash should be replaced, `False` otherwise.
+        """
+        try:
+            return self._get_handler().needs_update(password_hash)
+        except Exception:
+            # Catch everything the needs_update method can raise.
+            return False
+
+    def verify(self, password: str, password_hash: str) -> bool:
+        """
+        Returns whether the given password matches the given hash.
+
+        Arguments:
+            password (str): The password to verify.
+            password_hash (str): The hash to verify the password against.
+
+        Returns:
+            `True` if the password matches the hash, `False` otherwise (including
+            the case when the hash is malformed).
+        """
+        try:
+            return self._get_handler().verify(password, password_hash)
+        except Exception:
+            # Catch everything the verify method can raise.
+            return False
+
+    # Protected methods
+    # ------------------------------------------------------------
+
+    def _get_handler(self) -> Any:
+        """
+        Returns passlib's Argon2 handler configured with the parameters of the hasher.
+        """
+        return _get_passlib_argon2(self._parameters)
+
+
+class Argon2CffiHasher(Argon2Hasher):
+    """
+    Argon2 password hasher that uses the low-level API of `argon2-cffi` directly,
+    avoiding the wrapper and parameter parsing overhead of passlib.
+
+    The produced hashes are in the standard Argon2 format, so they are interchangeable
+    with the hashes of `PasslibArgon2Hasher`.
+    """
+
+    # Initialization
+    # ------------------------------------------------------------
+
+    def __init__(self, parameters: Optional[Argon2Parameters] = None) -> None:
+        """
+        Initialization.
+
+        Arguments:
+            parameters (Optional[Argon2Parameters]): The parameters of the hashes, `None`
+                                                     means the defaults of `argon2-cffi`.
+        """
+        super(Argon2CffiHasher, self).__init__(parameters)
+
+        self._hasher: Any = None
+        """
+        The reused `argon2.PasswordHasher` instance (created lazily) the hasher uses to
+        check whether hashes need to be updated.
+        """
+
+    # Special methods
+    # ------------------------------------------------------------
+
+    def __getstate__(self) -> Dict[str, Any]:
+        """
+        Returns the picklable state of the hasher.
+        """
+        return {"_parameters": self._parameters, "_hasher": None}
+
+    # Properties
+    # ------------------------------------------------------------
+
+    @property
+    def parameters(self) -> Argon2Parameters:
+        """
+        The parameters of the hashes.
+        """
+        if self._parameters is not None:
+            return self._parameters
+
+        hasher: Any = self._get_hasher()
+        return Argon2Parameters(
+            time_cost=hasher.time_cost,
+            memory_cost=hasher.memory_cost,
+            parallelism=hasher.parallelism
+        )
+
+    # Methods
+    # ------------------------------------------------------------
+
+    def hash(self, password: str) -> str:
+        """
+        Returns the hash of the given password.
+
+        Arguments:
+            password (str): The password to hash.
+
+        Returns:
+            The hash of the password.
+        """
+        from argon2.low_level import Type, hash_secret
+
+        hasher: Any = self._get_hasher()
+        return hash_secret(
+            password.encode("utf-8"),
+            urandom(hasher.salt_len),
+            time_cost=hasher.time_cost,
+            memory_cost=hasher.memory_cost,
+            parallelism=hasher.parallelism,
+            hash_len=hasher.hash_len,
+            type=Type.ID
+        ).decode("ascii")
+
+    def needs_update(self, password_hash: str) -> bool:
+        """
+        Returns whether the given hash was created with outdated parameters and should be replaced.
+
+        Arguments:
+            password_hash (str): The password hash to check.
+
+        Returns:
+            `True` if the hash should be replaced, `False` otherwise.
+        """
+        try:
+            return self._get_hasher().check_needs_rehash(password_hash)
+        except Exception:
+            # Catch everything the check_needs_rehash method can raise.
+            return False
+
+    def verify(self, password: str, password_hash: str) -> bool:
+        """
+        Returns whether the given password matches the given hash.
+
+        Arguments:
+            password (str): The password to verify.
+            password_hash (str): The hash to verify the password against.
+
+        Returns:
+            `True` if the password matches the hash, `False` otherwise (including
+            the case when the hash is malformed).
+        """
+        from argon2.low_level import Type, verify_secret
+
+        if password_hash.startswith("$argon2id$"):
+            hash_type: Type = Type.ID
+        elif password_hash.startswith("$argon2i$"):
+            hash_type = Type.I
+        elif password_hash.startswith("$argon2d$"):
+            hash_type = Type.D
+        else:
+            return False
+
+        try:
+            return verify_secret(password_hash.encode("ascii"), password.encode("utf-8"), hash_type)
+        except Exception:
+            # Catch everything the verify_secret method can raise.
+            return False
+
+    # Protected methods
+    # ------------------------------------------------------------
+
+    def _get_hasher(self) -> Any:
+        """
+        Returns the reused `argon2.PasswordHasher` instance of the hasher.
+        """
+        if self._hasher is None:
+            from argon2 import PasswordHasher as CffiPasswordHasher
+            self._hasher = CffiPasswordHasher() if self._parameters is None else\
+                CffiPasswordHasher(**self._parameters._asdict())
+
+        return self._hasher
+
+
+class ScryptHasher(PasswordHasher):
+    """
+    Password hasher that uses the scrypt implementation of `hashlib`.
+
+    Hashes are stored in the `$scrypt$ln=<log2(n)>,r=<r>,p=<p>$<salt>$<hash>` format,
+    where salt and hash are base64 encoded without padding.
+    """
+
+    # Initialization
+    # ------------------------------------------------------------
+
+    def __init__(self, log_n: int = 16, r: int = 8, p: int = 1, salt_size: int = 16, hash_size: int = 32) -> None:
+        """
+        Initialization.
+
+        Arguments:
+            log_n (int): The base 2 logarithm of the CPU/memory cost parameter.
+            r (int): The block size parameter.
+            p (int): The parallelization parameter.
+            salt_size (int): The size of the random salt in bytes.
+            hash_size (int): The size of the derived key in bytes.
+        """
+
+        self.log_n: int = log_n
+        """
+        The base 2 logarithm of the CPU/memory cost parameter.
+        """
+
+        self.r: int = r
+        """
+        The block size parameter.
+        """
+
+        self.p: int = p
+        """
+        The parallelization parameter.
+        """
+
+        self.salt_size: int = salt_size
+        """
+        The size of the random salt in bytes.
+        """
+
+        self.hash_size: int = hash_size
+        """
+        The size of the derived key in bytes.
+        """
+
+    # Properties
+    # ------------------------------------------------------------
+
+    @property
+    def memory_kib(self) -> int:
+        """
+        The amount of memory (in KiB) a single hash or verification allocates.
+        """
+        return 128 * self.r * (2 ** self.log_n) // 1024
+
+    # Methods
+    # ------------------------------------------------------------
+
+    def hash(self, password: str) -> str:
+        """
+        Returns the hash of the given password.
+
+        Arguments:
+            password (str): The password to hash.
+
+        Returns:
+            The hash of the password.
+        """
+        salt: bytes = urandom(self.salt_size)
+        key: bytes = self._derive(password, salt, self.log_n, self.r, self.p, self.hash_size)
+        return f"$scrypt$ln={self.log_n},r={self.r},p={self.p}${_b64encode(salt)}${_b64encode(key)}"
+
+    def needs_update(self, password_hash: str) -> bool:
+        """
+        Returns whether the given hash was created with outdated parameters and should be replaced.
+
+        Arguments:
+            password_hash (str): The password hash to check.
+
+        Returns:
+            `True` if the hash should be replaced, `False` otherwise.
+        """
+        try:
+            log_n, r, p, salt, key = self._parse(password_hash)
+        except Exception:
+            return False
+
+        return (log_n, r, p, len(salt), len(key)) != (self.log_n, self.r, self.p, self.salt_size, self.hash_size)
+
+    def verify(self, password: str, password_hash: str) -> bool:
+        """
+        Returns whether the given password matches the given hash.
+
+        Arguments:
+            password (str): The password to verify.
+            password_hash (str): The hash to verify the password against.
+
+        Returns:
+            `True` if the password matches the hash, `False` otherwise (including
+            the case when the hash is malformed).
+        """
+        try:
+            log_n, r, p, salt, key = self._parse(password_hash)
+            return compare_digest(self._derive(password, salt, log_n, r, p, len(key)), key)
+        except Exception:
+            # Catch everything parsing and key derivation can raise.
+            return False
+
+    # Protected methods
+    # ------------------------------------------------------------
+
+    @staticmethod
+    def _derive(password: str, salt: bytes, log_n: int, r: int, p: int, size: int) -> bytes:
+        """
+        Derives the scrypt key of the given password with the given parameters.
+        """
+        from hashlib import scrypt
+
+        n: int = 2 ** log_n
+        return scrypt(
+            password.encode("utf-8"), salt=salt, n=n, r=r, p=p, dklen=size, maxmem=256 * r * (n + p + 1)
+        )
+
+    @staticmethod
+    def _parse(password_hash: str) -> tuple:
+        """
+        Parses the given scrypt hash into a `(log_n, r, p, salt, key)` tuple.
+
+        Raises:
+            ValueError: If the hash is malformed.
+        """
+        parts: List[str] = password_hash.split("$")
+        if len(parts) != 5 or parts[0] != "" or parts[1] != "scrypt":
+            raise ValueError("Not a scrypt hash.")
+
+        params: Dict[str, int] = {k: int(v) for k, v in (item.split("=") for item in parts[2].split(","))}
+        return params["ln"], params["r"], params["p"], _b64decode(parts[3]), _b64decode(parts[4])
+
+
+class HasherBenchmarkResult(NamedTuple):
+    """
+    The result of a password hasher benchmark.
+    """
+
+    # Properties
+    # ------------------------------------------------------------
+
+    hash_ms: float
+    """
+    The average duration of a `hash()` call in milliseconds.
+    """
+
+    verify_ms: float
+    """
+    The average duration of a `verify()` call in milliseconds.
+    """
+
+    needs_update_us: float
+    """
+    The average duration of a `needs_update()` call in microseconds.
+    """
+
+
+# Global properties
+# ------------------------------------------------------------
+
+
+_passlib_lock: Lock = Lock()
+"""
+Lock that serializes the loading of passlib's Argon2 handler and its backend.
+"""
+
+_passlib_handlers: Dict[Argon2Parameters, Any] = {}
+"""
+Cache of the passlib Argon2 handlers that are configured with custom parameters.
+"""
+
+
+# Methods
+# ------------------------------------------------------------
+
+
+def _b64decode(value: str) -> bytes:
+    """
+    Decodes the given base64 string that may lack padding.
+    """
+    return b64decode(value + "=" * (-len(value) % 4))
+
+
+def _b64encode(value: bytes) -> str:
+    """
+    Encodes the given bytes to a base64 string without padding.
+    """
+    return b64encode(value).decode("ascii").rstrip("=")
+
+
+def _get_passlib_argon2(parameters: Optional[Argon2Parameters] = None) -> Any:
+    """
+    Returns passlib's Argon2 handler configured with the given parameters and with its backend loaded.
+
+    Passlib loads both the handler and its backend lazily on first use and that is not
+    safe to do from multiple threads concurrently, so they are loaded here under a lock.
+
+    Arguments:
+        parameters (Optional[Argon2Parameters]): The parameters of the handler, `None` means
+                                                 passlib's defaults.
+    """
+    handler: Any = _passlib_handlers.get(parameters)
+    if handler is not None:
+        return handler
+
+    with _passlib_lock:
+        from passlib.hash import argon2
+        argon2.get_backend()
+
+        if parameters is None:
+            return argon2
+
+        handler = _passlib_handlers.get(parameters)
+        if handler is None:
+            handler = argon2.using(**parameters._asdict())
+            _passlib_handlers[parameters] = handler
+
+    return handler
+
+
+def benchmark_hashers(hashers: Dict[str, PasswordHasher], rounds: int = 20) -> Dict[str, HasherBenchmarkResult]:
+    """
+    Measures the average duration of the `hash()`, `verify()` and `needs_update()` calls
+    of the given hashers.
+
+    Hashers that are configured with the same cost parameters do the same amount of
+    work, so the differences between their results is the overhead of their backends.
+
+    Arguments:
+        hashers (Dict[str, PasswordHasher]): The hashers to benchmark by name.
+        rounds (int): The number of calls to execute per method and hasher.
+
+    Returns:
+        The benchmark results by hasher name.
+    """
+    results: Dict[str, HasherBenchmarkResult] = {}
+    for name, hasher in hashers.items():
+        password_hash: str = hasher.hash("benchmark password")  # Warm up.
+
+        start: float = perf_counter()
+        for _ in range(rounds):
+            hasher.hash("benchmark password")
+        hash_ms: float = (perf_counter() - start) * 1000 / rounds
+
+        start = perf_counter()
+        for _ in range(rounds):
+            hasher.verify("benchmark password", password_hash)
+        verify_ms: float = (perf_counter() - start) * 1000 / rounds
+
+        start = perf_counter()
+        for _ in range(rounds * 100):
+            hasher.needs_update(password_hash)
+        needs_update_us: float = (perf_counter() - start) * 1000000 / (rounds * 100)
+
+        results[name] = HasherBenchmarkResult(hash_ms=hash_ms, verify_ms=verify_ms, needs_update_us=needs_update_us)
+
+    return results
+
+
+def main() -> None:
+    """
+    Command line entry point that benchmarks the available hashers.
+
+    The Argon2 hashers are configured with low cost parameters, so the per-call
+    overhead of the backends is not hidden by the hash computation itself.
+    """
+    parameters: Argon2Parameters = Argon2Parameters(time_cost=1, memory_cost=8 * 1024, parallelism=1)
+    results: Dict[str, HasherBenchmarkResult] = benchmark_hashers({
+        "passlib-argon2": PasslibArgon2Hasher(parameters),
+        "argon2-cffi": Argon2CffiHasher(parameters),
+        "scrypt (n=2**13, r=8)": ScryptHasher(log_n=13)
+    })
+
+    for name, result in results.items():
+        print(
+            f"{name:<24} hash: {result.hash_ms:8.3f} ms   verify: {result.verify_ms:8.3f} ms   "
+            f"needs_update: {result.needs_update_us:8.3f} us"
+        )
+
+
+# Entry
+# ------------------------------------------------------------
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,920 @@
+"""
+Executor that runs the password hashing and verification work of the user blueprint.
+"""
+
+
+# Imports
+# ----------------------------------------
+
+
+from collections import deque
+
+from math import ceil
+
+from concurrent.futures import Executor,\
+                               Future,\
+                               ProcessPoolExecutor,\
+                               ThreadPoolExecutor
+
+from threading import RLock
+
+from time import monotonic
+
+
+# Typing imports
+# ----------------------------------------
+
+
+from typing import Any, Callable, Deque, Dict, Mapping, NamedTuple, Optional
+
+
+# Metadata
+# ------------------------------------------------------------
+
+
+__author__ = "Peter Volf"
+
+
+# Job categories
+# ------------------------------------------------------------
+
+
+LOGIN: str = "login"
+"""
+The category of the password verification jobs of logins.
+"""
+
+REGISTRATION: str = "registration"
+"""
+The category of the password hashing jobs of registrations.
+"""
+
+RESET: str = "reset"
+"""
+The category of the password hashing jobs of password resets.
+"""
+
+REHASH: str = "rehash"
+"""
+The category of the background jobs that rehash passwords with outdated parameters.
+"""
+
+DEFAULT_WEIGHTS: Mapping[str, float] = {LOGIN: 4, REGISTRATION: 1, RESET: 1, REHASH: 0.5}
+"""
+The default scheduling weights of the job categories.
+"""
+
+
+# Exceptions
+# ------------------------------------------------------------
+
+
+class HashingError(Exception):
+    """
+    Base class of the errors raised by the hashing executor.
+    """
+
+
+class HashingQueueFullError(HashingError):
+    """
+    Error raised when a hashing job is submitted while the queue of the executor is full.
+    """
+
+
+# Classes
+# ------------------------------------------------------------
+
+
+class HashingJob(object):
+    """
+    A password hashing or verification job that is waiting for or being executed
+    by a `HashingExecutor`.
+    """
+
+    # Initialization
+    # ------------------------------------------------------------
+
+    def __init__(self,
+                 fn: Callable[..., Any],
+                 args: tuple,
+                 memory_kib: int = 0,
+                 category: str = LOGIN,
+                 client: Optional[str] = None) -> None:
+        """
+        Initialization.
+
+        Arguments:
+            fn (Callable[..., Any]): The function to execute.
+            args (tuple): The positional arguments to call `fn` with.
+            memory_kib (int): The amount of memory (in KiB) the job allocates.
+            category (str): The scheduling category of the job.
+            client (Optional[str]): The key of the client (e.g. IP address) the job is executed for.
+        """
+
+        self.category: str = category
+        """
+        The scheduling category of the job.
+        """
+
+        self.client: Optional[str] = client
+        """
+        The key of the client (e.g. IP address) the job is executed for.
+        """
+
+        self.fn: Callable[..., Any] = fn
+        """
+        The function to execute.
+        """
+
+        self.args: tuple = args
+        """
+        The positional arguments to call `fn` with.
+        """
+
+        self.future: Future = Future()
+        """
+        The future that is resolved with the result of the job.
+        """
+
+        self.memory_kib: int = memory_kib
+        """
+        The amount of memory (in KiB) the job allocates.
+        """
+
+        self.submitted_at: float = monotonic()
+        """
+        The (monotonic) time when the job was submitted.
+        """
+
+        self.started_at: Optional[float] = None
+        """
+        The (monotonic) time when the job was started.
+        """
+
+
+class FairJobQueue(object):
+    """
+    Queue of hashing jobs that serves the jobs of different clients with deficit round
+    robin scheduling, so a burst of jobs from a single client can not starve the jobs
+    of other clients.
+
+    Every client with waiting jobs gets `quantum` jobs per round, the jobs of a single
+    client are served in submission order. Jobs without a client key are treated as
+    the jobs of a single (anonymous) client.
+    """
+
+    # Initialization
+    # ------------------------------------------------------------
+
+    def __init__(self, quantum: int = 1) -> None:
+        """
+        Initialization.
+
+        Arguments:
+            quantum (int): The number of jobs a client may execute per round.
+        """
+        if quantum < 1:
+            raise ValueError("quantum must be at least 1.")
+
+        self.quantum: int = quantum
+        """
+        The number of jobs a client may execute per round.
+        """
+
+        self._active: Deque[Optional[str]] = deque()
+        """
+        The round robin order of the clients that have waiting jobs.
+        """
+
+        self._deficits: Dict[Optional[str], int] = {}
+        """
+        The deficit counter (the number of jobs it may still execute in the current round) of each client.
+        """
+
+        self._length: int = 0
+        """
+        The total number of jobs in the queue.
+        """
+
+        self._queues: Dict[Optional[str], Deque[HashingJob]] = {}
+        """
+        The queues of the clients that have waiting jobs.
+        """
+
+    # Special methods
+    # ------------------------------------------------------------
+
+    def __len__(self) -> int:
+        return self._length
+
+    # Methods
+    # ------------------------------------------------------------
+
+    def depth(self, client: Optional[str]) -> int:
+        """
+        Returns the number of queued jobs of the given client.
+
+        Arguments:
+            client (Optional[str]): The key of the client.
+        """
+        queue: Optional[Deque[HashingJob]] = self._queues.get(client)
+        return 0 if queue is None else len(queue)
+
+    def peek(self) -> Optional[HashingJob]:
+        """
+        Returns the job that would be taken from the queue next or `None` if the queue is empty.
+        """
+        if not self._active:
+            return None
+
+        return self._queues[self._get_current_client()][0]
+
+    def pop(self) -> HashingJob:
+        """
+        Removes and returns the next job of the queue.
+
+        Raises:
+            IndexError: If the queue is empty.
+        """
+        if not self._active:
+            raise IndexError("pop from an empty queue")
+
+        client: Optional[str] = self._get_current_client()
+        queue: Deque[HashingJob] = self._queues[client]
+        job: HashingJob = queue.popleft()
+        self._length -= 1
+        self._deficits[client] -= 1
+
+        if not queue:
+            # Idle clients do not keep their deficit.
+            self._active.popleft()
+            del self._deficits[client]
+            del self._queues[client]
+        elif self._deficits[client] < 1:
+            self._active.rotate(-1)
+
+        return job
+
+    def push(self, job: HashingJob) -> None:
+        """
+        Adds the given job to the queue.
+
+        Arguments:
+            job (HashingJob): The job to add.
+        """
+        queue: Optional[Deque[HashingJob]] = self._queues.get(job.client)
+        if queue is None:
+            queue = deque()
+            self._queues[job.client] = queue
+            self._deficits[job.client] = 0
+            self._active.append(job.client)
+
+        queue.append(job)
+        self._length += 1
+
+    # Protected methods
+    # ------------------------------------------------------------
+
+    def _get_current_client(self) -> Optional[str]:
+        """
+        Returns the client whose turn it is, granting it its quantum if it has just
+        arrived to the front of the round robin order.
+
+        The queue must not be empty.
+        """
+        client: Optional[str] = self._active[0]
+        if self._deficits[client] < 1:
+            self._deficits[client] += self.quantum
+
+        return client
+
+
+class PriorityJobQueue(object):
+    """
+    Queue of hashing jobs that is split into per-category queues and schedules the
+    categories with stride scheduling according to their weights.
+
+    Whenever a job is taken from the queue, the category with the lowest "pass" value
+    is selected and its pass is advanced by the inverse of its weight, so non-empty
+    categories are served in proportion to their weights (e.g. four login jobs for
+    every registration job with the default weights) and no category starves. Within
+    a category, the jobs of different clients are served by a `FairJobQueue`.
+    """
+
+    # Initialization
+    # ------------------------------------------------------------
+
+    def __init__(self, weights: Optional[Mapping[str, float]] = None, quantum: int = 1) -> None:
+        """
+        Initialization.
+
+        Arguments:
+            weights (Optional[Mapping[str, float]]): The scheduling weights of the job categories,
+                                                     `None` means `DEFAULT_WEIGHTS`. Categories
+                                                     without a weight have a weight of 1.
+            quantum (int): The number of jobs a client may execute per round within a category.
+        """
+        weights = DEFAULT_WEIGHTS if weights is None else weights
+        if any(weight <= 0 for weight in weights.values()):
+            raise ValueError("Weights must be positive.")
+
+        self.weights: Mapping[str, float] = weights
+        """
+        The scheduling weights of the job categories.
+        """
+
+        self.quantum: int = quantum
+        """
+        The number of jobs a client may execute per round within a category.
+        """
+
+        self._length: int = 0
+        """
+        The total number of jobs in the queue.
+        """
+
+        self._passes: Dict[str, float] = {}
+        """
+        The current pass value of each category.
+        """
+
+        self._queues: Dict[str, FairJobQueue] = {}
+        """
+        The queues of the job categories.
+        """
+
+        self._virtual_time: float = 0
+        """
+        The pass value of the category that was served last.
+        """
+
+    # Special methods
+    # ------------------------------------------------------------
+
+    def __len__(self) -> int:
+        return self._length
+
+    # Methods
+    # ------------------------------------------------------------
+
+    def depth(self, category: str) -> int:
+        """
+        Returns the number of queued jobs in the given category.
+
+        Arguments:
+            category (str): The category to get the queue depth of.
+        """
+        queue: Optional[FairJobQueue] = self._queues.get(category)
+        return 0 if queue is None else len(queue)
+
+    def client_depth(self, client: Optional[str]) -> int:
+        """
+        Returns the number of queued jobs of the given client in all categories.
+
+        Arguments:
+            client (Optional[str]): The key of the client.
+        """
+        return sum(queue.depth(client) for queue in self._queues.values())
+
+    def depths(self) -> Dict[str, int]:
+        """
+        Returns the number of queued jobs by category.
+        """
+        return {category: len(queue) for category, queue in self._queues.items() if len(queue) > 0}
+
+    def peek(self) -> Optional[HashingJob]:
+        """
+        Returns the job that would be taken from the queue next or `None` if the queue is empty.
+        """
+        category: Optional[str] = self._next_category()
+        return None if category is None else self._queues[category].peek()
+
+    def pop(self) -> HashingJob:
+        """
+        Removes and returns the next job of the queue.
+
+        Raises:
+            IndexError: If the queue is empty.
+        """
+        category: Optional[str] = self._next_category()
+        if category is None:
+            raise IndexError("pop from an empty queue")
+
+        self._virtual_time = self._passes[category]
+        self._passes[category] += 1 / self.weights.get(category, 1)
+        self._length -= 1
+        return self._queues[category].pop()
+
+    def push(self, job: HashingJob) -> None:
+        """
+        Adds the given job to the queue.
+
+        Arguments:
+            job (HashingJob): The job to add.
+        """
+        queue: Optional[FairJobQueue] = self._queues.get(job.category)
+        if queue is None:
+            queue = FairJobQueue(self.quantum)
+            self._queues[job.category] = queue
+
+        if len(queue) == 0:
+            # A category that was idle must not accumulate credit for the time it was idle.
+            self._passes[job.category] = max(self._passes.get(job.category, 0), self._virtual_time)
+
+        queue.push(job)
+        self._length += 1
+
+    # Protected methods
+    # ------------------------------------------------------------
+
+    def _next_category(self) -> Optional[str]:
+        """
+        Returns the non-empty category with the lowest pass value or `None` if the queue is empty.
+        """
+        result: Optional[str] = None
+        for category, queue in self._queues.items():
+            if len(queue) > 0 and (result is None or self._passes[category] < self._passes[result]):
+                result = category
+
+        return result
+
+
+class HashingStats(NamedTuple):
+    """
+    Snapshot of the state and the queueing statistics of a `HashingExecutor`.
+    """
+
+    # Properties
+    # ------------------------------------------------------------
+
+    queue_depth: int
+    """
+    The number of jobs that are waiting for execution.
+    """
+
+    queue_depths: Mapping[str, int]
+    """
+    The number of jobs that are waiting for execution by job category.
+    """
+
+    running: int
+    """
+    The number of currently running jobs.
+    """
+
+    memory_in_use_mb: float
+    """
+    The amount of memory (in MiB) the currently running jobs allocate.
+    """
+
+    started_jobs: int
+    """
+    The number of jobs that have been started since the last statistics reset.
+    """
+
+    average_wait_time: float
+    """
+    The average time (in seconds) the started jobs spent in the queue.
+    """
+
+    max_wait_time: float
+    """
+    The maximum time (in seconds) a started job spent in the queue.
+    """
+
+    average_run_time: float
+    """
+    The exponential moving average of the time (in seconds) it takes to execute a job.
+    """
+
+    expected_wait_time: float
+    """
+    The estimated time (in seconds) a newly submitted job would spend in the queue.
+    """
+
+
+class HashingExecutor(object):
+    """
+    Executor that runs password hashing and verification jobs on a pool of worker
+    threads or processes, so the request threads of the application are not pinned
+    by memory-hard hash computations and the number of concurrently running hashes
+    is bounded.
+
+    Jobs that can not be started immediately wait in the executor's queue. Jobs are
+    categorized (`LOGIN`, `REGISTRATION`, `RESET`, `REHASH`) and the categories are
+    served in proportion to their configured weights (see `PriorityJobQueue`), so for
+    example logins of existing users can stay fast under load while registrations and
+    password resets wait. Within a category, the jobs of different clients (e.g. IP
+    addresses) are served in a round robin fashion (see `FairJobQueue`), so a single
+    client's burst can not starve the jobs of other clients. Submitting a job while
+    the queue (or the queue of the job's category, or the queue of the job's client)
+    is full raises `HashingQueueFullError`.
+
+    If `max_hash_memory_mb` is set, the executor also acts as a memory-aware admission
+    controller: jobs only start if the memory they allocate fits into the budget next
+    to the memory of the already running jobs. A job whose memory requirement exceeds
+    the whole budget is started only when no other job is running. The `stats()` method
+    reports the queue depth and the queueing times that can be used to size the budget.
+
+    Finally, the executor can tell whether it is saturated, i.e. whether its queue is
+    full, the queue length reached `shed_queue_length` or the expected queueing time
+    exceeds `shed_wait_time`. The application should shed load (reject the request
+    immediately) instead of submitting new jobs to a saturated executor, so the latency
+    of the already admitted requests stays bounded.
+
+    The worker pool is created lazily when the first job is submitted. Process pools
+    require the submitted functions and their arguments to be picklable.
+    """
+
+    # Initialization
+    # ------------------------------------------------------------
+
+    def __init__(self,
+                 max_workers: int = 4,
+                 max_queue_size: int = 64,
+                 use_processes: bool = False,
+                 max_hash_memory_mb: Optional[int] = None,
+                 shed_queue_length: Optional[int] = None,
+                 shed_wait_time: Optional[float] = None,
+                 weights: Optional[Mapping[str, float]] = None,
+                 queue_limits: Optional[Mapping[str, int]] = None,
+                 client_queue_limit: Optional[int] = None,
+                 client_quantum: int = 1) -> None:
+        """
+        Initialization.
+
+        Arguments:
+            max_workers (int): The maximum number of jobs that may run concurrently.
+            max_queue_size (int): The maximum number of jobs that may wait for execution.
+            use_processes (bool): Whether to use a process pool instead of a thread pool.
+            max_hash_memory_mb (Optional[int]): The maximum amount of memory (in MiB) the
+                                                concurrently running jobs may allocate,
+                                                `None` means no limit.
+            shed_queue_length (Optional[int]): The queue length at which the executor
+                                               reports itself saturated.
+            shed_wait_time (Optional[float]): The expected queueing time (in seconds) above
+                                              which the executor reports itself saturated.
+            weights (Optional[Mapping[str, float]]): The scheduling weights of the job categories,
+                                                     `None` means `DEFAULT_WEIGHTS`.
+            queue_limits (Optional[Mapping[str, int]]): The maximum number of waiting jobs per
+                                                        job category. Categories without a limit
+                                                        are only limited by `max_queue_size`.
+            client_queue_limit (Optional[int]): The maximum number of waiting jobs per client,
+                                                `None` means no limit.
+            client_quantum (int): The number of jobs a client may execute per round within a
+                                  job category.
+        """
+        if max_workers < 1:
+            raise ValueError("max_workers must be at least 1.")
+        if max_queue_size < 0:
+            raise ValueError("max_queue_size must not be negative.")
+        if max_hash_memory_mb is not None and max_hash_memory_mb < 1:
+            raise ValueError("max_hash_memory_mb must be at least 1.")
+
+        self.max_workers: int = max_workers
+        """
+        The maximum number of jobs that may run concurrently.
+        """
+
+        self.max_queue_size: int = max_queue_size
+        """
+        The maximum number of jobs that may wait for execution.
+        """
+
+        self.use_processes: bool = use_processes
+        """
+        Whether the executor uses a process pool instead of a thread pool.
+        """
+
+        self.max_hash_memory_mb: Optional[int] = max_hash_memory_mb
+        """
+        The maximum amount of memory (in MiB) the concurrently running jobs may allocate.
+        """
+
+        self.shed_queue_length: Optional[int] = shed_queue_length
+        """
+        The queue length at which the executor reports itself saturated.
+        """
+
+        self.shed_wait_time: Optional[float] = shed_wait_time
+        """
+        The expected queueing time (in seconds) above which the executor reports itself saturated.
+        """
+
+        self.queue_limits: Mapping[str, int] = {} if queue_limits is None else queue_limits
+        """
+        The maximum number of waiting jobs per job category.
+        """
+
+        self.client_queue_limit: Optional[int] = client_queue_limit
+        """
+        The maximum number of waiting jobs per client.
+        """
+
+        self._average_run_time: float = 0
+        """
+        The exponential moving average of the time (in seconds) it takes to execute a job.
+        """
+
+        self._lock: RLock = RLock()
+        """
+        Lock that protects the internal state of the executor.
+        """
+
+        self._pending: PriorityJobQueue = PriorityJobQueue(weights, client_quantum)
+        """
+        The jobs that are waiting for execution.
+        """
+
+        self._pool: Optional[Executor] = None
+        """
+        The worker pool of the executor.
+        """
+
+        self._memory_in_use_kib: int = 0
+        """
+        The amount of memory (in KiB) the currently running jobs allocate.
+        """
+
+        self._running: int = 0
+        """
+        The number of currently running jobs.
+        """
+
+        self._started_jobs: int = 0
+        """
+        The number of jobs that have been started since the last statistics reset.
+        """
+
+        self._total_wait_time: float = 0
+        """
+        The total time (in seconds) the started jobs spent in the queue.
+        """
+
+        self._max_wait_time: float = 0
+        """
+        The maximum time (in seconds) a started job spent in the queue.
+        """
+
+    # Properties
+    # ------------------------------------------------------------
+
+    @property
+    def queue_depth(self) -> int:
+        """
+        The number of jobs that are waiting for execution.
+        """
+        return len(self._pending)
+
+    @property
+    def running(self) -> int:
+        """
+        The number of currently running jobs.
+        """
+        return self._running
+
+    @property
+    def expected_wait_time(self) -> float:
+        """
+        The estimated time (in seconds) a newly submitted job would spend in the queue.
+        """
+        with self._lock:
+            return self._get_expected_wait_time()
+
+    # Methods
+    # ------------------------------------------------------------
+
+    def is_saturated(self, category: Optional[str] = None, client: Optional[str] = None) -> bool:
+        """
+        Returns whether the executor is saturated and new jobs should not be submitted to it.
+
+        Arguments:
+            category (Optional[str]): If not `None`, the queue limit of the given job category
+                                      is also taken into account.
+            client (Optional[str]): If not `None`, the queue limit of the given client is also
+                                    taken into account.
+        """
+        with self._lock:
+            queue_depth: int = len(self._pending)
+            if self._running >= self.max_workers and self._is_queue_full(category, client):
+                return True
+            if self.shed_queue_length is not None and queue_depth >= self.shed_queue_length:
+                return True
+            return self.shed_wait_time is not None and self._get_expected_wait_time() > self.shed_wait_time
+
+    def reset_stats(self) -> None:
+        """
+        Resets the queueing statistics of the executor.
+        """
+        with self._lock:
+            self._started_jobs = 0
+            self._total_wait_time = 0
+            self._max_wait_time = 0
+
+    def retry_after(self) -> int:
+        """
+        Returns the number of seconds after which clients of a saturated executor
+        should retry their requests.
+        """
+        return max(1, ceil(self.expected_wait_time))
+
+    def run(self,
+            fn: Callable[..., Any],
+            *args: Any,
+            memory_kib: int = 0,
+            category: str = LOGIN,
+            client: Optional[str] = None) -> Any:
+        """
+        Executes the given function with the given arguments on the worker pool
+        and returns its result.
+
+        Arguments:
+            fn (Callable[..., Any]): The function to execute.
+            args (Any): The positional arguments to call `fn` with.
+            memory_kib (int): The amount of memory (in KiB) the function call allocates.
+            category (str): The scheduling category of the job.
+            client (Optional[str]): The key of the client (e.g. IP address) the job is executed for.
+
+        Returns:
+            The result of the function call.
+
+        Raises:
+            HashingQueueFullError: If the queue of the executor is full.
+        """
+        return self.submit(fn, *args, memory_kib=memory_kib, category=category, client=client).result()
+
+    def shutdown(self, wait: bool = True) -> None:
+        """
+        Shuts down the worker pool of the executor.
+
+        Arguments:
+            wait (bool): Whether to wait for the running jobs to complete.
+        """
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=wait)
+
+    def stats(self) -> HashingStats:
+        """
+        Returns a snapshot of the state and the queueing statistics of the executor.
+        """
+        with self._lock:
+            return HashingStats(
+                queue_depth=len(self._pending),
+                queue_depths=self._pending.depths(),
+                running=self._running,
+                memory_in_use_mb=self._memory_in_use_kib / 1024,
+                started_jobs=self._started_jobs,
+                average_wait_time=self._total_wait_time / self._started_jobs if self._started_jobs > 0 else 0,
+                max_wait_time=self._max_wait_time,
+                average_run_time=self._average_run_time,
+                expected_wait_time=self._get_expected_wait_time()
+            )
+
+    def submit(self,
+               fn: Callable[..., Any],
+               *args: Any,
+               memory_kib: int = 0,
+               category: str = LOGIN,
+               client: Optional[str] = None) -> Future:
+        """
+        Schedules the execution of the given function with the given arguments.
+
+        Arguments:
+            fn (Callable[..., Any]): The function to execute.
+            args (Any): The positional arguments to call `fn` with.
+            memory_kib (int): The amount of memory (in KiB) the function call allocates.
+            category (str): The scheduling category of the job.
+            client (Optional[str]): The key of the client (e.g. IP address) the job is executed for.
+
+        Returns:
+            The future that is resolved with the result of the function call.
+
+        Raises:
+            HashingQueueFullError: If the queue of the executor is full.
+        """
+        job: HashingJob = HashingJob(fn, args, memory_kib, category, client)
+        with self._lock:
+            if self._is_queue_full(category, client) and (len(self._pending) > 0 or not self._can_start(job)):
+                raise HashingQueueFullError(f"The hashing queue is full ({category}).")
+            self._pending.push(job)
+            self._dispatch()
+
+        return job.future
+
+    # Protected methods
+    # ------------------------------------------------------------
+
+    def _can_start(self, job: HashingJob) -> bool:
+        """
+        Returns whether the given job fits into the free capacity of the executor.
+
+        The method must be called while holding the executor's lock.
+
+        Arguments:
+            job (HashingJob): The job to check.
+        """
+        if self._running >= self.max_workers:
+            return False
+
+        if self.max_hash_memory_mb is None or self._running == 0:
+            return True
+
+        return self._memory_in_use_kib + job.memory_kib <= self.max_hash_memory_mb * 1024
+
+    def _get_expected_wait_time(self) -> float:
+        """
+        Returns the estimated time (in seconds) a newly submitted job would spend in the queue.
+
+        The method must be called while holding the executor's lock.
+        """
+        if self._running < self.max_workers and len(self._pending) == 0:
+            return 0
+
+        # Every pending job and one of the running ones must complete before a new job can start.
+        return (len(self._pending) + 1) * self._average_run_time / max(1, self._running)
+
+    def _is_queue_full(self, category: Optional[str] = None, client: Optional[str] = None) -> bool:
+        """
+        Returns whether the queue of the executor, the queue of the given job category
+        or the queue of the given client is full.
+
+        The method must be called while holding the executor's lock.
+
+        Arguments:
+            category (Optional[str]): The job category to check the queue limit of.
+            client (Optional[str]): The client to check the queue limit of.
+        """
+        if len(self._pending) >= self.max_queue_size:
+            return True
+
+        if client is not None and self.client_queue_limit is not None and\
+           self._pending.client_depth(client) >= self.client_queue_limit:
+            return True
+
+        limit: Optional[int] = None if category is None else self.queue_limits.get(category)
+        return limit is not None and self._pending.depth(category) >= limit
+
+    def _create_pool(self) -> Executor:
+        """
+        Creates the worker pool of the executor.
+        """
+        if self.use_processes:
+            return ProcessPoolExecutor(max_workers=self.max_workers)
+
+        return ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="user-blueprint-hashing")
+
+    def _dispatch(self) -> None:
+        """
+        Starts as many pending jobs as the free capacity of the executor allows.
+
+        The method must be called while holding the executor's lock.
+        """
+        while len(self._pending) > 0 and self._can_start(self._pending.peek()):
+            job: HashingJob = self._pending.pop()
+            if not job.future.set_running_or_notify_cancel():
+                continue
+
+            if self._pool is None:
+                self._pool = self._create_pool()
+
+            job.started_at = monotonic()
+            wait_time: float = job.started_at - job.submitted_at
+            self._started_jobs += 1
+            self._total_wait_time += wait_time
+            self._max_wait_time = max(self._max_wait_time, wait_time)
+
+            self._running += 1
+            self._memory_in_use_kib += job.memory_kib
+            try:
+                pool_future: Future = self._pool.submit(job.fn, *job.args)
+            except Exception as e:
+                self._running -= 1
+                self._memory_in_use_kib -= job.memory_kib
+                job.future.set_exception(e)
+                continue
+
+            pool_future.add_done_callback(lambda f, job=job: self._on_job_done(job, f))
+
+    def _on_job_done(self, job: HashingJob, pool_future: Future) -> None:
+        """
+        Callback that is called when the given job has been executed by the worker pool.
+
+        Arguments:
+            job (HashingJob): The completed job.
+            pool_future (Future): The future of the worker pool that executed the job.
+        """
+        with self._lock:
+            self._running -= 1
+            self._memory_in_use_kib -= job.memory_kib
+            run_time: float = monotonic() - job.started_at
+            self._average_run_time = run_time if self._average_run_time == 0 else\
+                0.8 * self._average_run_time + 0.2 * run_time
+            self._dispatch()
+
+        exception: Optional[BaseException] = pool_future.exception()
+        if exception is None:
+            job.future.set_result(pool_future.result())
+        else:
+            job.future.set_exception(exception)
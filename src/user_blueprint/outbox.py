@@ -0,0 +1,639 @@
+"""
+Background outbox that sends the verification, password reset and login link emails of
+the user blueprint on worker threads, so slow mail servers do not inflate the latency
+of the requests that trigger the emails.
+"""
+
+
+# Imports
+# ----------------------------------------
+
+
+from collections import deque
+
+from heapq import heappop, heappush
+
+from logging import getLogger, Logger
+
+from os import close, open as open_file, O_CREAT, O_RDWR
+
+from secrets import token_hex
+
+from sqlite3 import connect, Connection
+
+from threading import Condition, Thread
+
+from time import time
+
+
+# Typing imports
+# ----------------------------------------
+
+
+from typing import Any, Callable, Deque, List, NamedTuple, Optional, Tuple
+
+
+# Metadata
+# ------------------------------------------------------------
+
+
+__author__ = "Peter Volf"
+
+
+# Email kinds
+# ------------------------------------------------------------
+
+
+VERIFICATION_EMAIL: str = "verification"
+"""
+The kind of the registration verification emails.
+"""
+
+PASSWORD_RESET_EMAIL: str = "password_reset"
+"""
+The kind of the password reset emails.
+"""
+
+LOGIN_LINK_EMAIL: str = "login_link"
+"""
+The kind of the login link emails.
+"""
+
+
+# Global properties
+# ------------------------------------------------------------
+
+
+_logger: Logger = getLogger(__name__)
+"""
+The logger of the module.
+"""
+
+
+# Exceptions
+# ------------------------------------------------------------
+
+
+class OutboxError(Exception):
+    """
+    Base class of the errors raised by the email outbox.
+    """
+
+
+class OutboxFullError(OutboxError):
+    """
+    Error raised when an email is enqueued while the queue of the outbox is full.
+    """
+
+
+# Classes
+# ------------------------------------------------------------
+
+
+class OutboxEmail(NamedTuple):
+    """
+    An email that is waiting to be sent by an `EmailOutbox`.
+    """
+
+    # Properties
+    # ------------------------------------------------------------
+
+    id: int
+    """
+    The ID of the email within the outbox.
+    """
+
+    kind: str
+    """
+    The kind of the email, e.g. `PASSWORD_RESET_EMAIL`.
+    """
+
+    user_key: str
+    """
+    The reset key of the user to send the email to.
+    """
+
+    link: str
+    """
+    The link the email contains.
+    """
+
+    attempts: int
+    """
+    The number of failed delivery attempts.
+    """
+
+    expires_at: Optional[float] = None
+    """
+    The time (in seconds since the epoch) the link of the email expires at, `None` if unknown.
+    """
+
+
+class OutboxStats(NamedTuple):
+    """
+    Snapshot of the state and the delivery statistics of an `EmailOutbox`.
+    """
+
+    # Properties
+    # ------------------------------------------------------------
+
+    queue_depth: int
+    """
+    The number of emails that are waiting to be sent, including the ones that are
+    waiting for a retry.
+    """
+
+    sending: int
+    """
+    The number of emails that are currently being sent.
+    """
+
+    sent: int
+    """
+    The number of emails that have been sent.
+    """
+
+    retried: int
+    """
+    The number of failed delivery attempts that have been scheduled for a retry.
+    """
+
+    failed: int
+    """
+    The number of emails that have been dropped after `max_attempts` failed delivery attempts
+    or because their link expired before they could be sent.
+    """
+
+
+class EmailOutbox(object):
+    """
+    Bounded queue of outgoing emails that are sent by a pool of worker threads.
+
+    Emails are identified by their kind (`VERIFICATION_EMAIL`, `PASSWORD_RESET_EMAIL`,
+    `LOGIN_LINK_EMAIL`), the reset key of their user and the link they contain, and they
+    are delivered with the callback the outbox is started with (usually by `UserHandler`,
+    which resolves the user and calls the configured email sender). Failed deliveries -
+    the callback returns `False` or raises an exception - are retried with exponential
+    backoff until `max_attempts` is reached. Emails whose link has expired (if the expiration
+    time is known) are dropped instead of being sent.
+
+    If `database_path` is set, the queue is persisted in an SQLite database: emails are
+    removed from the database only after they have been delivered (or dropped), so the
+    queue survives process crashes and restarts. Delivery is at-least-once in this case.
+
+    Several processes (each with its own outbox) can share the database. An outbox only
+    sends the emails it has claimed: the ones it enqueued and the ones it claimed from the
+    database, which are the emails that are not claimed by a running outbox. Claims are
+    leases that the outbox renews every `lease_time / 3` seconds, so the emails of a crashed
+    process are taken over by the other outboxes (or by the restarted process) after at most
+    `lease_time` seconds, while the emails of a stopped outbox are released right away. An
+    email may be sent twice if its outbox does not renew its claim for `lease_time` seconds,
+    for example because a delivery blocks for that long.
+
+    Persisted emails contain their complete link, which is a live bearer token (anyone who
+    reads it can reset the user's password or log in as the user until the token expires).
+    The database file is created readable by its owner only, but its location must be
+    protected like any other secret, and it should not be backed up or shared.
+
+    Deliveries run within the application context of `app` (if it is set), so user getters
+    and email senders can use the application's database session and `current_app`, but
+    they are called without a Flask request context.
+    """
+
+    # Initialization
+    # ------------------------------------------------------------
+
+    def __init__(self,
+                 max_workers: int = 2,
+                 max_queue_size: int = 1024,
+                 max_attempts: int = 5,
+                 retry_delay: float = 1,
+                 max_retry_delay: float = 300,
+                 database_path: Optional[str] = None,
+                 app: Any = None,
+                 lease_time: float = 300) -> None:
+        """
+        Initialization.
+
+        Arguments:
+            max_workers (int): The number of worker threads that send the emails.
+            max_queue_size (int): The maximum number of emails that may wait to be sent.
+            max_attempts (int): The maximum number of delivery attempts per email.
+            retry_delay (float): The number of seconds to wait before the first retry.
+                                 The delay is doubled after every failed retry.
+            max_retry_delay (float): The maximum number of seconds to wait before a retry.
+            database_path (Optional[str]): The path of the SQLite database to persist
+                                           the queue in, `None` means no persistence.
+                                           The database contains live reset and login links.
+            app (Any): The Flask application in whose context the emails are delivered,
+                       `None` means no application context.
+            lease_time (float): The number of seconds the claim of the outbox on the emails
+                                of the database is valid for without being renewed.
+        """
+        if max_workers < 1 or max_queue_size < 1 or max_attempts < 1:
+            raise ValueError("max_workers, max_queue_size and max_attempts must be at least 1.")
+        if lease_time <= 0:
+            raise ValueError("lease_time must be positive.")
+
+        self.max_workers: int = max_workers
+        """
+        The number of worker threads that send the emails.
+        """
+
+        self.max_queue_size: int = max_queue_size
+        """
+        The maximum number of emails that may wait to be sent.
+        """
+
+        self.max_attempts: int = max_attempts
+        """
+        The maximum number of delivery attempts per email.
+        """
+
+        self.retry_delay: float = retry_delay
+        """
+        The number of seconds to wait before the first retry.
+        """
+
+        self.max_retry_delay: float = max_retry_delay
+        """
+        The maximum number of seconds to wait before a retry.
+        """
+
+        self.database_path: Optional[str] = database_path
+        """
+        The path of the SQLite database to persist the queue in.
+        """
+
+        self.app: Any = app
+        """
+        The Flask application in whose context the emails are delivered, `None` means
+        no application context.
+        """
+
+        self.lease_time: float = lease_time
+        """
+        The number of seconds the claim of the outbox on the emails of the database is
+        valid for without being renewed.
+        """
+
+        self._condition: Condition = Condition()
+        """
+        Condition that protects the state of the outbox and wakes up the workers.
+        """
+
+        self._connection: Optional[Connection] = None
+        """
+        The connection to the SQLite database of the queue.
+        """
+
+        self._deliver: Optional[Callable[[str, str, str], bool]] = None
+        """
+        Function that delivers an email with the given kind, user key and link.
+        """
+
+        self._failed: int = 0
+        """
+        The number of emails that have been dropped.
+        """
+
+        self._last_id: int = 0
+        """
+        The last email ID that has been assigned without a database.
+        """
+
+        self._lease_renewal: float = 0
+        """
+        The time the claim of the outbox on the emails of the database must be renewed at.
+        """
+
+        self._owner: str = token_hex(8)
+        """
+        The ID the outbox claims the emails of the database with.
+        """
+
+        self._ready: Deque[OutboxEmail] = deque()
+        """
+        The emails that can be sent right away, in enqueueing order.
+        """
+
+        self._retried: int = 0
+        """
+        The number of failed delivery attempts that have been scheduled for a retry.
+        """
+
+        self._scheduled: List[Tuple[float, int, OutboxEmail]] = []
+        """
+        Heap of the emails that are waiting for a retry with their due time and ID.
+        """
+
+        self._sending: int = 0
+        """
+        The number of emails that are currently being sent.
+        """
+
+        self._sent: int = 0
+        """
+        The number of emails that have been sent.
+        """
+
+        self._stopping: bool = False
+        """
+        Whether the workers should stop.
+        """
+
+        self._threads: List[Thread] = []
+        """
+        The worker threads.
+        """
+
+    # Special methods
+    # ------------------------------------------------------------
+
+    def __len__(self) -> int:
+        """
+        Returns the number of emails that are waiting to be sent.
+        """
+        with self._condition:
+            return len(self._ready) + len(self._scheduled)
+
+    # Properties
+    # ------------------------------------------------------------
+
+    @property
+    def is_started(self) -> bool:
+        """
+        Whether the workers of the outbox are running.
+        """
+        return len(self._threads) > 0
+
+    # Methods
+    # ------------------------------------------------------------
+
+    def enqueue(self, kind: str, user_key: str, link: str, expires_at: Optional[float] = None) -> None:
+        """
+        Adds an email to the queue of the outbox.
+
+        Arguments:
+            kind (str): The kind of the email.
+            user_key (str): The reset key of the user to send the email to.
+            link (str): The link the email contains.
+            expires_at (Optional[float]): The time (in seconds since the epoch) the link expires
+                                          at, `None` if the email should be sent regardless.
+
+        Raises:
+            OutboxError: If the outbox has not been started.
+            OutboxFullError: If the queue of the outbox is full.
+        """
+        with self._condition:
+            if not self.is_started:
+                raise OutboxError("The outbox has not been started.")
+            if len(self._ready) + len(self._scheduled) >= self.max_queue_size:
+                raise OutboxFullError("The email outbox is full.")
+
+            if self._connection is None:
+                self._last_id += 1
+                email_id: int = self._last_id
+            else:
+                with self._connection:
+                    email_id = self._connection.execute(
+                        "INSERT INTO outbox (kind, user_key, link, attempts, due, owner, lease, expires_at) "
+                        "VALUES (?, ?, ?, 0, 0, ?, ?, ?)",
+                        (kind, user_key, link, self._owner, time() + self.lease_time, expires_at)
+                    ).lastrowid
+
+            self._ready.append(OutboxEmail(email_id, kind, user_key, link, 0, expires_at))
+            self._condition.notify()
+
+    def join(self, timeout: Optional[float] = None) -> bool:
+        """
+        Waits until every email of the queue has been sent or dropped.
+
+        Arguments:
+            timeout (Optional[float]): The maximum number of seconds to wait, `None` means no limit.
+
+        Returns:
+            Whether the queue has been emptied.
+        """
+        with self._condition:
+            return self._condition.wait_for(
+                lambda: len(self._ready) + len(self._scheduled) + self._sending == 0,
+                timeout
+            )
+
+    def shutdown(self, wait: bool = True) -> None:
+        """
+        Stops the workers of the outbox. Emails that are still in the queue are lost
+        unless the queue is persisted, in which case they are released, so other outboxes
+        that share the database can send them.
+
+        Arguments:
+            wait (bool): Whether to wait for the emails that are being sent.
+        """
+        with self._condition:
+            self._stopping = True
+            threads, self._threads = self._threads, []
+            self._condition.notify_all()
+
+        if wait:
+            for thread in threads:
+                thread.join()
+
+        with self._condition:
+            if self._connection is not None and self._sending == 0:
+                self._execute("UPDATE outbox SET owner = NULL WHERE owner = ?", (self._owner,))
+                self._connection.close()
+                self._connection = None
+
+    def start(self, deliver: Callable[[str, str, str], bool], app: Any = None) -> None:
+        """
+        Starts the workers of the outbox, or replaces the delivery callback of the
+        already running workers.
+
+        Arguments:
+            deliver (Callable[[str, str, str], bool]): Function that delivers an email with
+                the given kind, user key and link, and returns whether the delivery succeeded.
+            app (Any): The Flask application in whose context the emails are delivered,
+                       `None` keeps the current `app` of the outbox.
+        """
+        with self._condition:
+            self._deliver = deliver
+            if app is not None:
+                self.app = app
+            if self.is_started:
+                return
+
+            self._stopping = False
+            if self.database_path is not None and self._connection is None:
+                self._open_database()
+
+            for index in range(self.max_workers):
+                thread: Thread = Thread(target=self._work, name=f"user-blueprint-outbox-{index}", daemon=True)
+                self._threads.append(thread)
+                thread.start()
+
+    def stats(self) -> OutboxStats:
+        """
+        Returns a snapshot of the state and the delivery statistics of the outbox.
+        """
+        with self._condition:
+            return OutboxStats(
+                queue_depth=len(self._ready) + len(self._scheduled),
+                sending=self._sending,
+                sent=self._sent,
+                retried=self._retried,
+                failed=self._failed
+            )
+
+    # Protected methods
+    # ------------------------------------------------------------
+
+    def _finish(self, email: OutboxEmail, delivered: bool) -> None:
+        """
+        Removes the given email from the queue or schedules its retry.
+
+        The method must be called while holding the lock of the object.
+        """
+        self._sending -= 1
+        attempts: int = email.attempts + 1
+        if delivered or attempts >= self.max_attempts:
+            if delivered:
+                self._sent += 1
+            else:
+                self._failed += 1
+                _logger.error("Dropped %s email after %d failed attempts.", email.kind, attempts)
+            self._execute("DELETE FROM outbox WHERE id = ?", (email.id,))
+        else:
+            self._retried += 1
+            due: float = time() + min(self.max_retry_delay, self.retry_delay * 2 ** email.attempts)
+            heappush(self._scheduled, (due, email.id, email._replace(attempts=attempts)))
+            self._execute("UPDATE outbox SET attempts = ?, due = ? WHERE id = ?", (attempts, due, email.id))
+
+        self._condition.notify_all()
+
+    def _execute(self, statement: str, parameters: tuple) -> None:
+        """
+        Executes the given statement on the database of the queue if it is persisted.
+
+        The method must be called while holding the lock of the object.
+        """
+        if self._connection is not None:
+            with self._connection:
+                self._connection.execute(statement, parameters)
+
+    def _next_email(self) -> Optional[OutboxEmail]:
+        """
+        Waits for the next email to send, or returns `None` if the workers should stop.
+        """
+        with self._condition:
+            while not self._stopping:
+                now: float = time()
+                if self._connection is not None and self._lease_renewal <= now:
+                    self._renew_lease(now)
+
+                while self._scheduled and self._scheduled[0][0] <= now:
+                    self._ready.append(heappop(self._scheduled)[2])
+
+                while self._ready:
+                    email: OutboxEmail = self._ready.popleft()
+                    if email.expires_at is not None and email.expires_at <= now:
+                        self._failed += 1
+                        _logger.warning("Dropped %s email, its link has expired.", email.kind)
+                        self._execute("DELETE FROM outbox WHERE id = ?", (email.id,))
+                        self._condition.notify_all()
+                        continue
+
+                    self._sending += 1
+                    return email
+
+                timeout: Optional[float] = self._scheduled[0][0] - now if self._scheduled else None
+                if self._connection is not None:
+                    timeout = self._lease_renewal - now if timeout is None else min(timeout, self._lease_renewal - now)
+                self._condition.wait(timeout)
+
+        return None
+
+    def _open_database(self) -> None:
+        """
+        Opens the database of the queue and claims (and loads) the unclaimed emails it contains.
+
+        The method must be called while holding the lock of the object.
+        """
+        # Create the file readable by its owner only, it contains live reset and login links.
+        close(open_file(self.database_path, O_CREAT | O_RDWR, 0o600))
+        connection: Connection = connect(self.database_path, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS outbox ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, kind TEXT NOT NULL, user_key TEXT NOT NULL, "
+            "link TEXT NOT NULL, attempts INTEGER NOT NULL, due REAL NOT NULL, "
+            "owner TEXT, lease REAL NOT NULL DEFAULT 0, expires_at REAL)"
+        )
+        # Databases of earlier versions have no claim and expiration columns.
+        columns: List[str] = [row[1] for row in connection.execute("PRAGMA table_info(outbox)")]
+        for column, definition in (("owner", "TEXT"), ("lease", "REAL NOT NULL DEFAULT 0"), ("expires_at", "REAL")):
+            if column not in columns:
+                connection.execute(f"ALTER TABLE outbox ADD COLUMN {column} {definition}")
+        connection.commit()
+
+        # The database is the source of truth, the in-memory queue may be left over from a previous run.
+        self._ready.clear()
+        self._scheduled = []
+        self._connection = connection
+        self._renew_lease(time())
+
+    def _renew_lease(self, now: float) -> None:
+        """
+        Renews the claim of the outbox on its emails in the database, deletes the unclaimed
+        emails whose link has expired, and claims and loads the rest of the unclaimed emails
+        (including the ones whose claim has not been renewed in time).
+
+        The method must be called while holding the lock of the object.
+        """
+        lease: float = now + self.lease_time
+        claim: str = token_hex(8)
+        with self._connection:
+            self._connection.execute("UPDATE outbox SET lease = ? WHERE owner = ?", (lease, self._owner))
+            unclaimed: str = "(owner IS NULL OR lease < ?)"
+            self._connection.execute(f"DELETE FROM outbox WHERE expires_at <= ? AND {unclaimed}", (now, now))
+            # Claim with a temporary ID first, so the claimed emails can be told apart from the loaded ones.
+            self._connection.execute(f"UPDATE outbox SET owner = ?, lease = ? WHERE {unclaimed}", (claim, lease, now))
+            claimed: List[Tuple[Any, ...]] = self._connection.execute(
+                "SELECT id, kind, user_key, link, attempts, due, expires_at FROM outbox WHERE owner = ? ORDER BY id",
+                (claim,)
+            ).fetchall()
+            self._connection.execute("UPDATE outbox SET owner = ? WHERE owner = ?", (self._owner, claim))
+
+        for email_id, kind, user_key, link, attempts, due, expires_at in claimed:
+            email: OutboxEmail = OutboxEmail(email_id, kind, user_key, link, attempts, expires_at)
+            if attempts == 0:
+                self._ready.append(email)
+            else:
+                heappush(self._scheduled, (due, email_id, email))
+
+        self._lease_renewal = now + self.lease_time / 3
+        if claimed:
+            self._condition.notify_all()
+
+    def _work(self) -> None:
+        """
+        The main loop of the worker threads.
+        """
+        while True:
+            email: Optional[OutboxEmail] = self._next_email()
+            if email is None:
+                return
+
+            try:
+                app: Any = self.app
+                if app is None:
+                    delivered: bool = bool(self._deliver(email.kind, email.user_key, email.link))
+                else:
+                    with app.app_context():
+                        delivered = bool(self._deliver(email.kind, email.user_key, email.link))
+            except Exception:
+                _logger.exception("Failed to send %s email.", email.kind)
+                delivered = False
+
+            with self._condition:
+                self._finish(email, delivered)
@@ -0,0 +1,266 @@
+"""
+Client-side password pre-hashing protocol that moves the expensive key stretching from
+the server to the browser.
+
+The browser stretches the password with PBKDF2-HMAC-SHA256 (the slow, salted key derivation
+function that is available in every browser through WebCrypto) using a per-user salt, and
+sends the result (the client hash) instead of - or during migration, besides - the password.
+The server only stores and checks a keyed HMAC-SHA256 of the client hash, which costs
+microseconds instead of the tens or hundreds of milliseconds of an Argon2 verification.
+
+Stored hashes have the `$prehash$i=<iterations>$<salt>$<mac>` format, so they can live
+side by side with the Argon2 hashes of users who have not logged in since the protocol
+was enabled.
+"""
+
+
+# Imports
+# ----------------------------------------
+
+
+from base64 import urlsafe_b64encode
+
+from hashlib import pbkdf2_hmac, sha256
+
+from hmac import compare_digest, new as new_hmac
+
+from re import compile as compile_regex
+
+from secrets import token_bytes
+
+
+# Typing imports
+# ----------------------------------------
+
+
+from typing import Optional, Pattern, Tuple
+
+
+# Metadata
+# ------------------------------------------------------------
+
+
+__author__ = "Peter Volf"
+
+
+# Global properties
+# ------------------------------------------------------------
+
+
+PREHASH_PREFIX: str = "$prehash$"
+"""
+The prefix of the stored hashes of the client-side pre-hashing protocol.
+"""
+
+CLIENT_HASH_REGEX: str = r"[0-9a-f]{64}"
+"""
+Regular expression of valid client hashes (hex encoded 32 byte PBKDF2 outputs).
+"""
+
+SALT_REGEX: str = r"[A-Za-z0-9_-]{16,64}"
+"""
+Regular expression of valid salts (unpadded URL-safe base64).
+"""
+
+_client_hash_pattern: Pattern = compile_regex(CLIENT_HASH_REGEX)
+"""
+The compiled `CLIENT_HASH_REGEX`.
+"""
+
+_salt_pattern: Pattern = compile_regex(SALT_REGEX)
+"""
+The compiled `SALT_REGEX`.
+"""
+
+
+# Classes
+# ------------------------------------------------------------
+
+
+class ClientPrehashing(object):
+    """
+    Server side of the client-side pre-hashing protocol.
+
+    While `migrate` is enabled, the browser sends both the plain password and the client
+    hash, so users whose stored hash is still a server-side (Argon2) hash can log in and
+    their hash is replaced with a pre-hash. Once every user is migrated (or the rest of the
+    users are expected to reset their password), `migrate` can be disabled and the
+    browser stops sending the plain password on login.
+
+    Salts are never random: the salt of every user is derived from the user's canonical
+    identifier (the lowercase username) with the secret key, and the salt of an unknown
+    identifier is derived from the identifier itself, so the salt lookup does not reveal
+    whether a user exists or whether it has been migrated. The lookup does return the same
+    salt for the username and the email address of a user though, so it can be used to link
+    the two, and the route that serves it should be rate limited.
+    """
+
+    # Initialization
+    # ------------------------------------------------------------
+
+    def __init__(self,
+                 secret_key: str,
+                 iterations: int = 600000,
+                 migrate: bool = True) -> None:
+        """
+        Initialization.
+
+        Arguments:
+            secret_key (str): The secret key of the keyed hash of the client hashes.
+            iterations (int): The number of PBKDF2 iterations the browser executes.
+            migrate (bool): Whether users with a server-side password hash can still log in.
+        """
+        if iterations < 1:
+            raise ValueError("iterations must be at least 1.")
+
+        self.iterations: int = iterations
+        """
+        The number of PBKDF2 iterations the browser executes for new pre-hashes.
+        """
+
+        self.migrate: bool = migrate
+        """
+        Whether users with a server-side password hash can still log in, in which case
+        the browser sends the plain password besides the client hash.
+        """
+
+        self._secret_key: bytes = secret_key.encode("utf-8")
+        """
+        The secret key of the keyed hash of the client hashes.
+        """
+
+    # Methods
+    # ------------------------------------------------------------
+
+    def create_dummy_hash(self) -> str:
+        """
+        Returns a stored hash with a random keyed hash that no client hash matches. Unknown
+        users are verified against it, so their logins cost the same as the logins of users
+        who have a pre-hash.
+        """
+        return f"{PREHASH_PREFIX}i={self.iterations}${_encode(token_bytes(16))}${_encode(token_bytes(32))}"
+
+    def get_parameters(self, identifier: str, password_hash: Optional[str]) -> Tuple[str, int]:
+        """
+        Returns the salt and iteration count the browser must use to compute the client
+        hash of the user with the given canonical identifier.
+
+        Arguments:
+            identifier (str): The canonical identifier (username) of the user, or the entered
+                              identifier if there is no such user.
+            password_hash (Optional[str]): The stored hash of the user or `None` if there
+                                           is no such user.
+
+        Returns:
+            The salt and the iteration count.
+        """
+        parsed: Optional[Tuple[int, str, str]] = self._parse(password_hash)
+        return self.get_salt(identifier), self.iterations if parsed is None else parsed[0]
+
+    def get_salt(self, identifier: str) -> str:
+        """
+        Returns the salt of the user with the given canonical identifier.
+
+        Arguments:
+            identifier (str): The canonical identifier (username) of the user.
+        """
+        digest: bytes = new_hmac(self._secret_key, f"salt:{identifier.lower()}".encode("utf-8"), sha256).digest()
+        return _encode(digest[:16])
+
+    def hash(self, client_hash: str, salt: str) -> str:
+        """
+        Returns the hash to store for the given client hash.
+
+        Arguments:
+            client_hash (str): The client hash the browser computed.
+            salt (str): The salt the browser used to compute the client hash.
+
+        Returns:
+            The hash to store.
+
+        Raises:
+            ValueError: If the client hash or the salt is malformed.
+        """
+        if _client_hash_pattern.fullmatch(client_hash) is None or _salt_pattern.fullmatch(salt) is None:
+            raise ValueError("Malformed client hash or salt.")
+
+        return f"{PREHASH_PREFIX}i={self.iterations}${salt}${self._mac(client_hash, salt)}"
+
+    def is_prehash(self, password_hash: Optional[str]) -> bool:
+        """
+        Returns whether the given stored hash is a hash of the pre-hashing protocol.
+
+        Arguments:
+            password_hash (Optional[str]): The stored hash to check.
+        """
+        return password_hash is not None and password_hash.startswith(PREHASH_PREFIX)
+
+    def verify(self, client_hash: str, password_hash: str) -> bool:
+        """
+        Returns whether the given client hash matches the given stored hash.
+
+        Arguments:
+            client_hash (str): The client hash the browser computed.
+            password_hash (str): The stored hash to verify the client hash against.
+
+        Returns:
+            `True` if the client hash matches the stored hash, `False` otherwise (including
+            the case when the stored hash is malformed).
+        """
+        parsed: Optional[Tuple[int, str, str]] = self._parse(password_hash)
+        if parsed is None or _client_hash_pattern.fullmatch(client_hash or "") is None:
+            return False
+
+        return compare_digest(self._mac(client_hash, parsed[1]), parsed[2])
+
+    # Protected methods
+    # ------------------------------------------------------------
+
+    def _mac(self, client_hash: str, salt: str) -> str:
+        """
+        Returns the keyed hash of the given client hash and salt.
+        """
+        return _encode(new_hmac(self._secret_key, f"{salt}${client_hash}".encode("ascii"), sha256).digest())
+
+    def _parse(self, password_hash: Optional[str]) -> Optional[Tuple[int, str, str]]:
+        """
+        Returns the iteration count, the salt and the keyed hash of the given stored hash
+        or `None` if it is not a valid hash of the pre-hashing protocol.
+        """
+        if not self.is_prehash(password_hash):
+            return None
+
+        try:
+            iterations, salt, mac = password_hash[len(PREHASH_PREFIX):].split("$")
+            if not iterations.startswith("i=") or _salt_pattern.fullmatch(salt) is None:
+                return None
+            return int(iterations[2:]), salt, mac
+        except ValueError:
+            return None
+
+
+# Methods
+# ------------------------------------------------------------
+
+
+def compute_client_hash(password: str, salt: str, iterations: int) -> str:
+    """
+    Computes the client hash of the given password the same way the browser does.
+    The method is meant for testing and for non-browser clients.
+
+    Arguments:
+        password (str): The password to compute the client hash of.
+        salt (str): The salt of the user.
+        iterations (int): The number of PBKDF2 iterations.
+
+    Returns:
+        The hex encoded client hash.
+    """
+    return pbkdf2_hmac("sha256", password.encode("utf-8"), salt.encode("ascii"), iterations).hex()
+
+
+def _encode(data: bytes) -> str:
+    """
+    Returns the unpadded URL-safe base64 encoding of the given bytes.
+    """
+    return urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
@@ -0,0 +1,580 @@
+"""
+SMTP email sender that keeps a pool of open (and authenticated) connections and sends
+multiple messages on each connection, instead of connecting to the mail server for
+every email.
+
+The sender can be benchmarked against a local stand-in SMTP server with:
+
+    python -m user_blueprint.smtp
+"""
+
+
+# Imports
+# ----------------------------------------
+
+
+from email.message import EmailMessage
+
+from smtplib import SMTP, SMTP_SSL, SMTPDataError, SMTPException, SMTPRecipientsRefused, SMTPSenderRefused
+
+from socketserver import StreamRequestHandler, ThreadingTCPServer
+
+from ssl import create_default_context
+
+from threading import BoundedSemaphore, Lock, Thread
+
+from time import monotonic, perf_counter, sleep
+
+from user_blueprint.emails import EmailTemplates, RenderedEmail
+from user_blueprint.outbox import LOGIN_LINK_EMAIL, PASSWORD_RESET_EMAIL, VERIFICATION_EMAIL
+
+
+# Typing imports
+# ----------------------------------------
+
+
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+
+# Metadata
+# ------------------------------------------------------------
+
+
+__author__ = "Peter Volf"
+
+
+# Global properties
+# ------------------------------------------------------------
+
+
+SECURITY_MODES: Tuple[Optional[str], ...] = ("starttls", "ssl", None)
+"""
+The supported connection security modes: STARTTLS on a plain connection, implicit TLS,
+or no encryption (only for local relays).
+"""
+
+
+# Classes
+# ------------------------------------------------------------
+
+
+class SMTPEmailSender(object):
+    """
+    Email sender that sends the emails of the user handler through an SMTP server using
+    a pool of reusable connections.
+
+    At most `pool_size` connections are open at the same time, and callers wait (for at
+    most `timeout` seconds) for a connection if all of them are in use. Idle connections
+    are reused in LIFO order, connections that have been idle for more than `max_idle_time`
+    seconds are closed instead of being reused, and connections are closed after sending
+    `max_messages_per_connection` messages. If a reused connection turns out to be closed
+    by the server, the message is retried once on a new connection.
+
+    The `verification_email_sender()`, `password_reset_email_sender()` and
+    `login_link_email_sender()` methods can be registered with the corresponding decorators
+    of `UserHandler`. They render multipart (plain text and HTML) emails with the sender's
+    `templates` or - if it is not set - with the `email_templates` of the blueprint's user
+    handler (see `user_blueprint.emails`), and they assume that users have a `username`
+    and an `email` property.
+
+    The class is thread-safe.
+    """
+
+    # Initialization
+    # ------------------------------------------------------------
+
+    def __init__(self,
+                 host: str,
+                 sender: str,
+                 port: int = 587,
+                 username: Optional[str] = None,
+                 password: Optional[str] = None,
+                 security: Optional[str] = "starttls",
+                 pool_size: int = 4,
+                 max_messages_per_connection: int = 100,
+                 max_idle_time: float = 30,
+                 timeout: float = 10,
+                 templates: Optional[EmailTemplates] = None) -> None:
+        """
+        Initialization.
+
+        Arguments:
+            host (str): The host name of the SMTP server.
+            sender (str): The address to send the emails from.
+            port (int): The port of the SMTP server.
+            username (Optional[str]): The username to log in with, `None` means no authentication.
+            password (Optional[str]): The password to log in with.
+            security (Optional[str]): The connection security mode, one of `SECURITY_MODES`.
+            pool_size (int): The maximum number of open connections.
+            max_messages_per_connection (int): The number of messages after which a connection is closed.
+            max_idle_time (float): The number of seconds after which an idle connection is not reused.
+            timeout (float): The timeout (in seconds) of the network operations and of waiting
+                             for a free connection.
+            templates (Optional[EmailTemplates]): The templates to render the emails with,
+                                                  `None` means the `email_templates` of the
+                                                  blueprint's user handler.
+        """
+        if security not in SECURITY_MODES:
+            raise ValueError(f"security must be one of {SECURITY_MODES}.")
+        if pool_size < 1 or max_messages_per_connection < 1:
+            raise ValueError("pool_size and max_messages_per_connection must be at least 1.")
+
+        self.host: str = host
+        """
+        The host name of the SMTP server.
+        """
+
+        self.port: int = port
+        """
+        The port of the SMTP server.
+        """
+
+        self.sender: str = sender
+        """
+        The address to send the emails from.
+        """
+
+        self.username: Optional[str] = username
+        """
+        The username to log in with, `None` means no authentication.
+        """
+
+        self.security: Optional[str] = security
+        """
+        The connection security mode, one of `SECURITY_MODES`.
+        """
+
+        self.max_messages_per_connection: int = max_messages_per_connection
+        """
+        The number of messages after which a connection is closed.
+        """
+
+        self.max_idle_time: float = max_idle_time
+        """
+        The number of seconds after which an idle connection is not reused.
+        """
+
+        self.timeout: float = timeout
+        """
+        The timeout (in seconds) of the network operations and of waiting for a free connection.
+        """
+
+        self.templates: Optional[EmailTemplates] = templates
+        """
+        The templates to render the emails with, `None` means the `email_templates` of the
+        blueprint's user handler.
+        """
+
+        self._idle: List[Tuple[SMTP, int, float]] = []
+        """
+        The idle connections with the number of messages they have sent and the time
+        they were released, in release order.
+        """
+
+        self._lock: Lock = Lock()
+        """
+        Lock that protects the idle connections.
+        """
+
+        self._password: Optional[str] = password
+        """
+        The password to log in with.
+        """
+
+        self._slots: BoundedSemaphore = BoundedSemaphore(pool_size)
+        """
+        Semaphore that limits the number of open connections.
+        """
+
+    # Methods
+    # ------------------------------------------------------------
+
+    def close(self) -> None:
+        """
+        Closes the idle connections of the pool.
+        """
+        with self._lock:
+            idle, self._idle = self._idle, []
+
+        for connection, _, _ in idle:
+            _close(connection)
+
+    def create_message(self, recipient: str, subject: str, text: str, html: Optional[str] = None) -> EmailMessage:
+        """
+        Creates an email message.
+
+        Arguments:
+            recipient (str): The address to send the message to.
+            subject (str): The subject of the message.
+            text (str): The plain text body of the message.
+            html (Optional[str]): The HTML alternative of the body, `None` means a plain text message.
+
+        Returns:
+            The created message.
+        """
+        message: EmailMessage = EmailMessage()
+        message["From"] = self.sender
+        message["To"] = recipient
+        message["Subject"] = subject
+        message.set_content(text)
+        if html is not None:
+            message.add_alternative(html, subtype="html")
+        return message
+
+    def login_link_email_sender(self, user: Any, login_link: str) -> bool:
+        """
+        Sends the login link email with the given login link to the user.
+
+        Arguments:
+            user (Any): The user to send the login link email to. The user is assumed to have
+                        a `username` and an `email` property.
+            login_link (str): The user's login link.
+
+        Returns:
+            Whether the login link email has been sent successfully.
+        """
+        return self._send_email(LOGIN_LINK_EMAIL, user, login_link)
+
+    def password_reset_email_sender(self, user: Any, reset_link: str) -> bool:
+        """
+        Sends the password reset email with the given reset link to the user.
+
+        Arguments:
+            user (Any): The user to send tha password reset email to. The user is assumed to have
+                        a `username` and an `email` property.
+            reset_link (str): The user's password reset link.
+
+        Returns:
+            Whether the reset email has been sent successfully.
+        """
+        return self._send_email(PASSWORD_RESET_EMAIL, user, reset_link)
+
+    def send(self, messages: Iterable[EmailMessage]) -> int:
+        """
+        Sends the given messages on as few connections as possible.
+
+        Arguments:
+            messages (Iterable[EmailMessage]): The messages to send.
+
+        Returns:
+            The number of messages that have been sent successfully. Messages that are
+            rejected by the server are skipped, while a connection failure stops sending
+            the rest of the messages.
+        """
+        if not self._slots.acquire(timeout=self.timeout):
+            return 0
+
+        sent: int = 0
+        connection: Optional[SMTP] = None
+        count: int = 0
+        try:
+            for message in messages:
+                reused: bool = True
+                while True:
+                    if connection is None:
+                        connection, count, reused = self._acquire()
+
+                    try:
+                        connection.send_message(message)
+                        count += 1
+                        sent += 1
+                    except (SMTPRecipientsRefused, SMTPSenderRefused, SMTPDataError):
+                        # The message has been rejected, the connection is still usable.
+                        pass
+                    except OSError:
+                        # Every other SMTPException (including SMTPServerDisconnected) is an OSError.
+                        _close(connection)
+                        connection = None
+                        if reused:
+                            # The server may have closed the idle connection, try again on a new one.
+                            continue
+                        return sent
+                    break
+
+                if count >= self.max_messages_per_connection:
+                    _close(connection)
+                    connection = None
+        except (SMTPException, OSError):
+            # Connecting to the server failed.
+            pass
+        finally:
+            if connection is not None:
+                with self._lock:
+                    self._idle.append((connection, count, monotonic()))
+            self._slots.release()
+
+        return sent
+
+    def send_message(self, message: EmailMessage) -> bool:
+        """
+        Sends the given message.
+
+        Arguments:
+            message (EmailMessage): The message to send.
+
+        Returns:
+            Whether the message has been sent successfully.
+        """
+        return self.send((message,)) == 1
+
+    def verification_email_sender(self, user: Any, verification_link: str) -> None:
+        """
+        Sends the registration verification email with the given verification link to the user.
+
+        Arguments:
+            user (Any): The user to send the verification email to. The user is assumed to have a
+                        `username` and an `email` property.
+            verification_link (str): The user's verification link.
+        """
+        self._send_email(VERIFICATION_EMAIL, user, verification_link)
+
+    # Protected methods
+    # ------------------------------------------------------------
+
+    def _acquire(self) -> Tuple[SMTP, int, bool]:
+        """
+        Returns an idle connection or a new one if there is no reusable idle connection,
+        together with the number of messages it has sent and whether it has been reused.
+
+        The caller must hold a slot of the pool.
+
+        Raises:
+            SMTPException: If connecting to the server fails.
+            OSError: If connecting to the server fails.
+        """
+        expired: List[SMTP] = []
+        connection: Optional[Tuple[SMTP, int, float]] = None
+        with self._lock:
+            now: float = monotonic()
+            while self._idle:
+                candidate: Tuple[SMTP, int, float] = self._idle.pop()
+                if now - candidate[2] <= self.max_idle_time:
+                    connection = candidate
+                    break
+                expired.append(candidate[0])
+
+        for smtp in expired:
+            _close(smtp)
+
+        if connection is not None:
+            return connection[0], connection[1], True
+
+        return self._connect(), 0, False
+
+    def _send_email(self, kind: str, user: Any, link: str) -> bool:
+        """
+        Renders and sends the email of the given kind to the given user.
+
+        Arguments:
+            kind (str): The kind of the email, see `user_blueprint.outbox`.
+            user (Any): The user to send the email to.
+            link (str): The link the email contains.
+
+        Returns:
+            Whether the email has been sent successfully.
+        """
+        templates: Optional[EmailTemplates] = self.templates
+        if templates is None:
+            from user_blueprint.blueprint import user_handler
+            templates = user_handler.email_templates
+
+        email: RenderedEmail = templates.render(kind, user, link)
+        return self.send_message(self.create_message(user.email, email.subject, email.text, email.html))
+
+    def _connect(self) -> SMTP:
+        """
+        Opens and authenticates a new connection.
+
+        Raises:
+            SMTPException: If connecting to the server fails.
+            OSError: If connecting to the server fails.
+        """
+        if self.security == "ssl":
+            connection: SMTP = SMTP_SSL(self.host, self.port, timeout=self.timeout, context=create_default_context())
+        else:
+            connection = SMTP(self.host, self.port, timeout=self.timeout)
+
+        try:
+            if self.security == "starttls":
+                connection.starttls(context=create_default_context())
+            if self.username is not None:
+                connection.login(self.username, self._password or "")
+        except BaseException:
+            _close(connection)
+            raise
+
+        return connection
+
+
+class _StandInSMTPHandler(StreamRequestHandler):
+    """
+    Request handler of the stand-in SMTP server of the benchmark that accepts every message.
+    """
+
+    # Methods
+    # ------------------------------------------------------------
+
+    def handle(self) -> None:
+        """
+        Serves an SMTP session.
+        """
+        sleep(self.server.handshake_delay)
+        self._reply(b"220 stand-in ESMTP")
+        while True:
+            line: bytes = self.rfile.readline()
+            if not line:
+                return
+
+            command: bytes = line[:4].upper()
+            if command == b"EHLO" or command == b"HELO":
+                self._reply(b"250 stand-in")
+            elif command == b"DATA":
+                self._reply(b"354 End data with <CR><LF>.<CR><LF>")
+                while self.rfile.readline() not in (b".\r\n", b""):
+                    pass
+                sleep(self.server.message_delay)
+                self._reply(b"250 OK")
+            elif command == b"QUIT":
+                self._reply(b"221 Bye")
+                return
+            elif command in (b"MAIL", b"RCPT", b"RSET", b"NOOP"):
+                self._reply(b"250 OK")
+            else:
+                self._reply(b"502 Command not implemented")
+
+    # Protected methods
+    # ------------------------------------------------------------
+
+    def _reply(self, reply: bytes) -> None:
+        """
+        Sends the given reply line to the client.
+        """
+        self.wfile.write(reply + b"\r\n")
+
+
+class SMTPBenchmarkResult(NamedTuple):
+    """
+    The result of an SMTP sender benchmark.
+    """
+
+    # Properties
+    # ------------------------------------------------------------
+
+    messages_per_second: float
+    """
+    The number of messages sent per second.
+    """
+
+    connections: int
+    """
+    The number of connections the sender opened.
+    """
+
+
+# Methods
+# ------------------------------------------------------------
+
+
+def _close(connection: SMTP) -> None:
+    """
+    Closes the given connection, ignoring the errors of the already broken connections.
+    """
+    try:
+        connection.quit()
+    except (SMTPException, OSError):
+        connection.close()
+
+
+def benchmark_smtp(messages: int = 400,
+                   concurrency: int = 4,
+                   batch_size: int = 10,
+                   handshake_delay: float = 0.02,
+                   message_delay: float = 0.001) -> Dict[str, SMTPBenchmarkResult]:
+    """
+    Measures the throughput of `SMTPEmailSender` against a local stand-in SMTP server with
+    a new connection per message, with pooled connections, and with pooled connections
+    and batches of messages.
+
+    Arguments:
+        messages (int): The number of messages to send per configuration.
+        concurrency (int): The number of threads that send the messages (and the pool size).
+        batch_size (int): The number of messages per `send()` call in the batched configuration.
+        handshake_delay (float): The number of seconds the stand-in server waits before
+                                 greeting new connections, simulating the TLS handshake
+                                 and the authentication of real servers.
+        message_delay (float): The number of seconds the stand-in server takes to accept a message.
+
+    Returns:
+        The benchmark results by configuration name.
+    """
+    server: ThreadingTCPServer = ThreadingTCPServer(("127.0.0.1", 0), _StandInSMTPHandler)
+    server.daemon_threads = True
+    server.handshake_delay = handshake_delay
+    server.message_delay = message_delay
+    Thread(target=server.serve_forever, daemon=True).start()
+
+    configurations: Dict[str, Tuple[int, int]] = {
+        "connection per message": (1, 1),
+        "pooled connections": (messages, 1),
+        f"pooled, batches of {batch_size}": (messages, batch_size)
+    }
+
+    results: Dict[str, SMTPBenchmarkResult] = {}
+    try:
+        for name, (max_messages_per_connection, batch) in configurations.items():
+            sender: SMTPEmailSender = SMTPEmailSender(
+                "127.0.0.1",
+                "benchmark@example.com",
+                port=server.server_address[1],
+                security=None,
+                pool_size=concurrency,
+                max_messages_per_connection=max_messages_per_connection
+            )
+            message: EmailMessage = sender.create_message("user@example.com", "Benchmark", "Benchmark message.")
+            connect: Any = sender._connect
+            connections: List[int] = []
+
+            def counting_connect() -> SMTP:
+                connections.append(1)
+                return connect()
+
+            sender._connect = counting_connect
+
+            def work(count: int) -> None:
+                for _ in range(count // batch):
+                    sender.send([message] * batch)
+
+            threads: List[Thread] = [Thread(target=work, args=(messages // concurrency,)) for _ in range(concurrency)]
+            start: float = perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            duration: float = perf_counter() - start
+            sender.close()
+
+            results[name] = SMTPBenchmarkResult(
+                messages_per_second=(messages // concurrency // batch * batch * concurrency) / duration,
+                connections=len(connections)
+            )
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    return results
+
+
+def main() -> None:
+    """
+    Command line entry point that benchmarks `SMTPEmailSender` against a local stand-in SMTP server.
+    """
+    for name, result in benchmark_smtp().items():
+        print(f"{name:<28} {result.messages_per_second:10.1f} messages/s   connections: {result.connections:4d}")
+
+
+# Entry
+# ------------------------------------------------------------
+
+
+if __name__ == "__main__":
+    main()
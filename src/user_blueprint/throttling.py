@@ -0,0 +1,360 @@
+"""
+Memory-bounded failed login throttling based on time-decayed count-min sketches.
+"""
+
+
+# Imports
+# ----------------------------------------
+
+
+from array import array
+
+from hashlib import blake2b
+
+from threading import Lock
+
+from time import monotonic
+
+
+# Typing imports
+# ----------------------------------------
+
+
+from typing import Callable, List, Optional
+
+
+# Metadata
+# ------------------------------------------------------------
+
+
+__author__ = "Peter Volf"
+
+
+# Classes
+# ------------------------------------------------------------
+
+
+class CountMinSketch(object):
+    """
+    Fixed-size probabilistic counter of string keys.
+
+    The sketch never underestimates the count of a key, and it overestimates it by at
+    most `e / width` times the total count with a probability of `1 - exp(-depth)`.
+    The memory usage is `4 * width * depth` bytes regardless of the number of keys.
+
+    The sketch uses conservative update: adding to a key only raises the counters of the
+    key that are below its new estimate, which considerably reduces the overestimation
+    caused by the other keys, especially when a few keys receive most of the updates.
+
+    The class is not thread-safe.
+    """
+
+    # Initialization
+    # ------------------------------------------------------------
+
+    def __init__(self, width: int = 2 ** 14, depth: int = 4) -> None:
+        """
+        Initialization.
+
+        Arguments:
+            width (int): The number of counters per row.
+            depth (int): The number of rows (independent hash functions).
+        """
+        if width < 1 or depth < 1:
+            raise ValueError("width and depth must be at least 1.")
+        if depth > 8:
+            raise ValueError("depth must be at most 8.")
+
+        self.width: int = width
+        """
+        The number of counters per row.
+        """
+
+        self.depth: int = depth
+        """
+        The number of rows (independent hash functions).
+        """
+
+        self._rows: List[array] = [array("I", bytes(4 * width)) for _ in range(depth)]
+        """
+        The counters of the sketch.
+        """
+
+    # Methods
+    # ------------------------------------------------------------
+
+    def add(self, key: str, count: int = 1) -> int:
+        """
+        Adds the given count to the counter of the given key.
+
+        Arguments:
+            key (str): The key to increment the counter of.
+            count (int): The value to add to the counter.
+
+        Returns:
+            The estimated count of the key after the update.
+        """
+        indexes: List[int] = self._indexes(key)
+        result: int = min(min(row[index] for row, index in zip(self._rows, indexes)) + count, 0xFFFFFFFF)
+        for row, index in zip(self._rows, indexes):
+            if row[index] < result:
+                row[index] = result
+
+        return result
+
+    def clear(self) -> None:
+        """
+        Resets all counters of the sketch to zero.
+        """
+        for row in self._rows:
+            row[:] = array("I", bytes(4 * self.width))
+
+    def estimate(self, key: str) -> int:
+        """
+        Returns the estimated count of the given key.
+
+        Arguments:
+            key (str): The key to get the estimated count of.
+        """
+        return min(row[index] for row, index in zip(self._rows, self._indexes(key)))
+
+    # Protected methods
+    # ------------------------------------------------------------
+
+    def _indexes(self, key: str) -> List[int]:
+        """
+        Returns the counter index of the given key in each row of the sketch.
+        """
+        digest: bytes = blake2b(key.encode("utf-8"), digest_size=8 * self.depth).digest()
+        return [int.from_bytes(digest[i:i + 8], "little") % self.width for i in range(0, 8 * self.depth, 8)]
+
+
+class DecayingCountMinSketch(object):
+    """
+    Count-min sketch that estimates the counts of keys in a sliding time window.
+
+    The sketch maintains a count-min sketch for the current and one for the previous
+    window. The estimated count of a key is its count in the current window plus its
+    count in the previous window weighted by the part of the previous window that is
+    still within the sliding window.
+
+    The class is not thread-safe.
+    """
+
+    # Initialization
+    # ------------------------------------------------------------
+
+    def __init__(self,
+                 window: float,
+                 width: int = 2 ** 14,
+                 depth: int = 4,
+                 clock: Callable[[], float] = monotonic) -> None:
+        """
+        Initialization.
+
+        Arguments:
+            window (float): The length of the sliding window in seconds.
+            width (int): The number of counters per row of the underlying sketches.
+            depth (int): The number of rows of the underlying sketches.
+            clock (Callable[[], float]): Function that returns the current time in seconds.
+        """
+        if window <= 0:
+            raise ValueError("window must be positive.")
+
+        self.window: float = window
+        """
+        The length of the sliding window in seconds.
+        """
+
+        self._clock: Callable[[], float] = clock
+        """
+        Function that returns the current time in seconds.
+        """
+
+        self._current: CountMinSketch = CountMinSketch(width, depth)
+        """
+        The sketch of the current window.
+        """
+
+        self._previous: CountMinSketch = CountMinSketch(width, depth)
+        """
+        The sketch of the previous window.
+        """
+
+        self._window_start: float = clock()
+        """
+        The start time of the current window.
+        """
+
+    # Methods
+    # ------------------------------------------------------------
+
+    def add(self, key: str, count: int = 1) -> float:
+        """
+        Adds the given count to the counter of the given key.
+
+        Arguments:
+            key (str): The key to increment the counter of.
+            count (int): The value to add to the counter.
+
+        Returns:
+            The estimated count of the key in the sliding window after the update.
+        """
+        self._rotate()
+        self._current.add(key, count)
+        return self._estimate(key)
+
+    def estimate(self, key: str) -> float:
+        """
+        Returns the estimated count of the given key in the sliding window.
+
+        Arguments:
+            key (str): The key to get the estimated count of.
+        """
+        self._rotate()
+        return self._estimate(key)
+
+    # Protected methods
+    # ------------------------------------------------------------
+
+    def _estimate(self, key: str) -> float:
+        """
+        Returns the estimated count of the given key without rotating the windows.
+        """
+        elapsed: float = (self._clock() - self._window_start) / self.window
+        return self._current.estimate(key) + self._previous.estimate(key) * max(0.0, 1 - elapsed)
+
+    def _rotate(self) -> None:
+        """
+        Starts a new window if the current one has elapsed.
+        """
+        now: float = self._clock()
+        elapsed_windows: int = int((now - self._window_start) // self.window)
+        if elapsed_windows < 1:
+            return
+
+        self._previous, self._current = self._current, self._previous
+        self._current.clear()
+        if elapsed_windows > 1:
+            # Nothing happened in the last window.
+            self._previous.clear()
+
+        self._window_start += elapsed_windows * self.window
+
+
+class LoginThrottle(object):
+    """
+    Failed login throttling per client (e.g. IP address) and per username.
+
+    Failed login attempts are counted in time-decayed count-min sketches, so the memory
+    usage of the throttle is constant regardless of how many distinct clients and
+    usernames are seen. Due to the nature of count-min sketches, hash collisions may
+    cause keys to be throttled somewhat earlier than their limit, but never later.
+
+    To keep the collisions rare, `width` should be well above the number of distinct keys
+    that reach their limit within a window (the number of failures in a window divided by
+    the limit). `UserHandler` only records username failures for existing users, and it
+    records them under the reset key of the user, so attempts with random usernames can
+    not flood the username sketch and the username and the email address of a user share
+    one counter.
+
+    The per-username limit is a trade-off: it stops distributed guessing against a single
+    account, but anyone who knows a username can lock its owner out for the length of the
+    window by entering wrong passwords (from as many clients as needed), because a locked
+    account is rejected before its password is verified. Raise `max_failures_per_username`
+    (or set it to a very large value to rely on the per-client limit only) if lockouts are
+    a bigger concern than distributed guessing.
+
+    The class is thread-safe, but checking and recording are separate operations: `is_allowed()`
+    followed by `record_failure()` is not atomic, so concurrent attempts that were all allowed
+    can push a key somewhat over its limit (by at most the number of concurrent attempts).
+    """
+
+    # Initialization
+    # ------------------------------------------------------------
+
+    def __init__(self,
+                 max_failures_per_client: int = 50,
+                 max_failures_per_username: int = 10,
+                 window: float = 900,
+                 width: int = 2 ** 14,
+                 depth: int = 4) -> None:
+        """
+        Initialization.
+
+        Arguments:
+            max_failures_per_client (int): The number of failed logins a client may have in
+                                           the sliding window before it is throttled.
+            max_failures_per_username (int): The number of failed logins a username may have
+                                             in the sliding window before it is throttled.
+            window (float): The length of the sliding window in seconds.
+            width (int): The number of counters per row of the underlying sketches.
+            depth (int): The number of rows of the underlying sketches.
+        """
+
+        self.max_failures_per_client: int = max_failures_per_client
+        """
+        The number of failed logins a client may have in the sliding window before it is throttled.
+        """
+
+        self.max_failures_per_username: int = max_failures_per_username
+        """
+        The number of failed logins a username may have in the sliding window before it is throttled.
+        """
+
+        self._clients: DecayingCountMinSketch = DecayingCountMinSketch(window, width, depth)
+        """
+        The failed login counters of the clients.
+        """
+
+        self._lock: Lock = Lock()
+        """
+        Lock that protects the sketches of the throttle.
+        """
+
+        self._usernames: DecayingCountMinSketch = DecayingCountMinSketch(window, width, depth)
+        """
+        The failed login counters of the usernames.
+        """
+
+    # Properties
+    # ------------------------------------------------------------
+
+    @property
+    def window(self) -> float:
+        """
+        The length of the sliding window in seconds.
+        """
+        return self._clients.window
+
+    # Methods
+    # ------------------------------------------------------------
+
+    def is_allowed(self, client: Optional[str], username: Optional[str] = None) -> bool:
+        """
+        Returns whether a login attempt of the given client with the given username is allowed.
+
+        Arguments:
+            client (Optional[str]): The key of the client, `None` if unknown.
+            username (Optional[str]): The username (or other key) of the account, `None` if
+                                      only the client should be checked.
+        """
+        with self._lock:
+            if client is not None and self._clients.estimate(client) >= self.max_failures_per_client:
+                return False
+            return username is None or self._usernames.estimate(username) < self.max_failures_per_username
+
+    def record_failure(self, client: Optional[str], username: Optional[str]) -> None:
+        """
+        Records a failed login attempt of the given client with the given username.
+
+        Arguments:
+            client (Optional[str]): The key of the client, `None` if unknown.
+            username (Optional[str]): The username (or other key) of the account, `None` if
+                                      the failure should only be counted for the client.
+        """
+        with self._lock:
+            if client is not None:
+                self._clients.add(client)
+            if username is not None:
+                self._usernames.add(username)
@@ -0,0 +1,696 @@
+"""
+Stores of consumed single-use tokens (password reset and login links) and a cache of
+decoded tokens.
+
+A consumed token only has to be remembered until it expires, because expired tokens are
+rejected anyway. `MemoryConsumedTokenStore` forgets the consumed tokens of a process
+with a hashed timing wheel as they expire, `RedisConsumedTokenStore` shares the consumed
+tokens between processes and hosts using Redis key expiration.
+
+`DecodedTokenCache` remembers the verified claims of recently decoded tokens, so a token
+that is used in multiple requests (like the password reset token that is used both by the
+GET request that renders the form and by the POST request that submits it) is only
+verified once.
+
+`ResetRequestCooldown` remembers the recent password reset requests by email address, so
+repeated requests within a short window do not trigger new lookups, tokens and emails.
+"""
+
+
+# Imports
+# ----------------------------------------
+
+
+from collections import OrderedDict
+
+from hashlib import sha256
+
+from math import ceil
+
+from threading import Lock
+
+from time import time
+
+
+# Typing imports
+# ----------------------------------------
+
+
+from typing import Any, Callable, Dict, List, Mapping, NamedTuple, Optional, Set
+
+
+# Metadata
+# ------------------------------------------------------------
+
+
+__author__ = "Peter Volf"
+
+
+# Classes
+# ------------------------------------------------------------
+
+
+class ConsumedTokenStore(object):
+    """
+    Base class of the stores that remember the consumed single-use tokens until they expire.
+    """
+
+    # Methods
+    # ------------------------------------------------------------
+
+    def consume(self, token_id: str, expires_at: float) -> bool:
+        """
+        Marks the token with the given ID as consumed if it has not been consumed yet.
+
+        The check and the update are atomic, so if the same token is consumed concurrently,
+        exactly one of the calls succeeds.
+
+        Arguments:
+            token_id (str): The ID of the token, see `get_token_id()`.
+            expires_at (float): The expiration time of the token in seconds since the epoch.
+
+        Returns:
+            `True` if the token has been consumed by this call, `False` if it
+            had already been consumed.
+        """
+        raise NotImplementedError()
+
+    def is_consumed(self, token_id: str) -> bool:
+        """
+        Returns whether the token with the given ID has already been consumed.
+
+        Arguments:
+            token_id (str): The ID of the token, see `get_token_id()`.
+        """
+        raise NotImplementedError()
+
+
+class MemoryConsumedTokenStore(ConsumedTokenStore):
+    """
+    In-memory consumed token store that forgets the tokens as they expire using a hashed
+    timing wheel.
+
+    Every token is put into the slot of the wheel that corresponds to the first tick after
+    its expiration time. As time passes, the wheel is advanced (lazily, when the store is
+    used) and the expired tokens of the passed slots are forgotten, so the cost of expiration
+    is constant per token and memory is reclaimed within a tick of the expiration time.
+    Tokens that expire more than a full turn of the wheel later stay in their slot until
+    the wheel reaches it for the last time.
+
+    The store is only shared by the threads of a process, use a shared store like
+    `RedisConsumedTokenStore` if the application has multiple worker processes.
+
+    The class is thread-safe.
+    """
+
+    # Initialization
+    # ------------------------------------------------------------
+
+    def __init__(self,
+                 tick: float = 1,
+                 wheel_size: int = 4096,
+                 clock: Callable[[], float] = time) -> None:
+        """
+        Initialization.
+
+        Arguments:
+            tick (float): The length of a tick (the time a slot covers) in seconds.
+            wheel_size (int): The number of slots of the wheel.
+            clock (Callable[[], float]): Function that returns the current time in seconds
+                                         since the epoch.
+        """
+        if tick <= 0 or wheel_size < 1:
+            raise ValueError("tick must be positive and wheel_size must be at least 1.")
+
+        self.tick: float = tick
+        """
+        The length of a tick in seconds.
+        """
+
+        self._clock: Callable[[], float] = clock
+        """
+        Function that returns the current time in seconds since the epoch.
+        """
+
+        self._current_tick: int = int(clock() // tick)
+        """
+        The last tick the wheel has been advanced to.
+        """
+
+        self._expirations: Dict[str, float] = {}
+        """
+        The expiration times of the consumed tokens by token ID.
+        """
+
+        self._lock: Lock = Lock()
+        """
+        Lock that protects the wheel.
+        """
+
+        self._slots: List[Set[str]] = [set() for _ in range(wheel_size)]
+        """
+        The slots of the wheel with the IDs of the tokens that expire in them.
+        """
+
+    # Special methods
+    # ------------------------------------------------------------
+
+    def __len__(self) -> int:
+        """
+        Returns the number of tokens the store remembers.
+        """
+        return len(self._expirations)
+
+    # Methods
+    # ------------------------------------------------------------
+
+    def consume(self, token_id: str, expires_at: float) -> bool:
+        """
+        Marks the token with the given ID as consumed if it has not been consumed yet.
+
+        The check and the update are atomic, so if the same token is consumed concurrently,
+        exactly one of the calls succeeds.
+
+        Arguments:
+            token_id (str): The ID of the token, see `get_token_id()`.
+            expires_at (float): The expiration time of the token in seconds since the epoch.
+
+        Returns:
+            `True` if the token has been consumed by this call, `False` if it
+            had already been consumed.
+        """
+        now: float = self._clock()
+        with self._lock:
+            self._advance(now)
+            if token_id in self._expirations:
+                return False
+
+            if expires_at > now:
+                self._expirations[token_id] = expires_at
+                self._slots[ceil(expires_at / self.tick) % len(self._slots)].add(token_id)
+
+            return True
+
+    def is_consumed(self, token_id: str) -> bool:
+        """
+        Returns whether the token with the given ID has already been consumed.
+
+        Arguments:
+            token_id (str): The ID of the token, see `get_token_id()`.
+        """
+        now: float = self._clock()
+        with self._lock:
+            self._advance(now)
+            return token_id in self._expirations
+
+    # Protected methods
+    # ------------------------------------------------------------
+
+    def _advance(self, now: float) -> None:
+        """
+        Advances the wheel to the given time, forgetting the tokens that have expired.
+
+        The method must be called while holding the lock of the store.
+        """
+        now_tick: int = int(now // self.tick)
+        if now_tick <= self._current_tick:
+            return
+
+        wheel_size: int = len(self._slots)
+        # One full turn visits every slot, there is no need to go around more than once.
+        for tick in range(max(self._current_tick + 1, now_tick - wheel_size + 1), now_tick + 1):
+            slot: Set[str] = self._slots[tick % wheel_size]
+            if not slot:
+                continue
+
+            expired: List[str] = [token_id for token_id in slot if self._expirations[token_id] <= now]
+            for token_id in expired:
+                slot.discard(token_id)
+                del self._expirations[token_id]
+
+        self._current_tick = now_tick
+
+
+class RedisConsumedTokenStore(ConsumedTokenStore):
+    """
+    Consumed token store that is shared between processes and hosts through Redis.
+
+    Every consumed token is stored as a Redis key that expires together with the token,
+    and consuming a token is a single atomic `SET NX` command.
+    """
+
+    # Initialization
+    # ------------------------------------------------------------
+
+    def __init__(self, client: Any, prefix: str = "user-blueprint:consumed-token:") -> None:
+        """
+        Initialization.
+
+        Arguments:
+            client (Any): The Redis client to use, for example a `redis.Redis` instance.
+            prefix (str): The prefix of the keys of the consumed tokens.
+        """
+
+        self.client: Any = client
+        """
+        The Redis client to use.
+        """
+
+        self.prefix: str = prefix
+        """
+        The prefix of the keys of the consumed tokens.
+        """
+
+    # Methods
+    # ------------------------------------------------------------
+
+    def consume(self, token_id: str, expires_at: float) -> bool:
+        """
+        Marks the token with the given ID as consumed if it has not been consumed yet.
+
+        The check and the update are atomic, so if the same token is consumed concurrently,
+        exactly one of the calls succeeds.
+
+        Arguments:
+            token_id (str): The ID of the token, see `get_token_id()`.
+            expires_at (float): The expiration time of the token in seconds since the epoch.
+
+        Returns:
+            `True` if the token has been consumed by this call, `False` if it
+            had already been consumed.
+        """
+        ttl: int = ceil(expires_at - time())
+        if ttl <= 0:
+            return True
+
+        return bool(self.client.set(self.prefix + token_id, b"1", nx=True, ex=ttl))
+
+    def is_consumed(self, token_id: str) -> bool:
+        """
+        Returns whether the token with the given ID has already been consumed.
+
+        Arguments:
+            token_id (str): The ID of the token, see `get_token_id()`.
+        """
+        return self.client.exists(self.prefix + token_id) > 0
+
+
+class CachedToken(NamedTuple):
+    """
+    A decoded token in a `DecodedTokenCache`.
+    """
+
+    # Properties
+    # ------------------------------------------------------------
+
+    key: str
+    """
+    The key of the user the token belongs to (for example the reset key).
+    """
+
+    claims: Mapping[str, Any]
+    """
+    The verified claims of the token.
+    """
+
+    expires_at: float
+    """
+    The time (in seconds since the epoch) when the entry expires.
+    """
+
+
+class DecodedTokenCache(object):
+    """
+    Size and time limited LRU cache of decoded and verified tokens by token ID.
+
+    Entries expire after `ttl` seconds or when the token itself expires, whichever
+    comes first. The entries of a user can be invalidated by the user's key, which
+    must be done when the user's password changes.
+
+    Only the claims and the user key of the tokens are cached, users must be looked up
+    (and checked against the claims) by the caller on every use.
+
+    The class is thread-safe.
+    """
+
+    # Initialization
+    # ------------------------------------------------------------
+
+    def __init__(self,
+                 max_size: int = 1024,
+                 ttl: float = 300,
+                 clock: Callable[[], float] = time) -> None:
+        """
+        Initialization.
+
+        Arguments:
+            max_size (int): The maximum number of cached tokens.
+            ttl (float): The maximum number of seconds a token is cached for.
+            clock (Callable[[], float]): Function that returns the current time in seconds
+                                         since the epoch.
+        """
+        if max_size < 1 or ttl <= 0:
+            raise ValueError("max_size must be at least 1 and ttl must be positive.")
+
+        self.max_size: int = max_size
+        """
+        The maximum number of cached tokens.
+        """
+
+        self.ttl: float = ttl
+        """
+        The maximum number of seconds a token is cached for.
+        """
+
+        self._clock: Callable[[], float] = clock
+        """
+        Function that returns the current time in seconds since the epoch.
+        """
+
+        self._entries: "OrderedDict[str, CachedToken]" = OrderedDict()
+        """
+        The cached tokens by token ID in least recently used first order.
+        """
+
+        self._keys: Dict[str, Set[str]] = {}
+        """
+        The IDs of the cached tokens by user key.
+        """
+
+        self._lock: Lock = Lock()
+        """
+        Lock that protects the cache.
+        """
+
+    # Special methods
+    # ------------------------------------------------------------
+
+    def __len__(self) -> int:
+        """
+        Returns the number of cached tokens (including the expired ones that
+        have not been evicted yet).
+        """
+        return len(self._entries)
+
+    # Methods
+    # ------------------------------------------------------------
+
+    def get(self, token_id: str) -> Optional[CachedToken]:
+        """
+        Returns the cached token with the given ID.
+
+        Arguments:
+            token_id (str): The ID of the token, see `get_token_id()`.
+
+        Returns:
+            The cached token or `None` if the token is not cached or its entry has expired.
+        """
+        with self._lock:
+            entry: Optional[CachedToken] = self._entries.get(token_id)
+            if entry is None:
+                return None
+
+            if entry.expires_at <= self._clock():
+                self._remove(token_id)
+                return None
+
+            self._entries.move_to_end(token_id)
+            return entry
+
+    def invalidate(self, token_id: str) -> None:
+        """
+        Removes the token with the given ID from the cache.
+
+        Arguments:
+            token_id (str): The ID of the token, see `get_token_id()`.
+        """
+        with self._lock:
+            self._remove(token_id)
+
+    def invalidate_key(self, key: str) -> None:
+        """
+        Removes every token of the user with the given key from the cache.
+
+        Arguments:
+            key (str): The key of the user.
+        """
+        with self._lock:
+            for token_id in tuple(self._keys.get(key, ())):
+                self._remove(token_id)
+
+    def put(self, token_id: str, key: str, claims: Mapping[str, Any]) -> None:
+        """
+        Caches the given decoded token.
+
+        Arguments:
+            token_id (str): The ID of the token, see `get_token_id()`.
+            key (str): The key of the user the token belongs to.
+            claims (Mapping[str, Any]): The verified claims of the token.
+        """
+        expires_at: float = self._clock() + self.ttl
+        exp: Any = claims.get("exp")
+        if isinstance(exp, (int, float)):
+            expires_at = min(expires_at, exp)
+
+        with self._lock:
+            self._remove(token_id)
+            self._entries[token_id] = CachedToken(key=key, claims=claims, expires_at=expires_at)
+            self._keys.setdefault(key, set()).add(token_id)
+
+            while len(self._entries) > self.max_size:
+                self._remove(next(iter(self._entries)))
+
+    # Protected methods
+    # ------------------------------------------------------------
+
+    def _remove(self, token_id: str) -> None:
+        """
+        Removes the token with the given ID from the cache if it is cached.
+
+        The method must be called while holding the lock of the cache.
+        """
+        entry: Optional[CachedToken] = self._entries.pop(token_id, None)
+        if entry is None:
+            return
+
+        token_ids: Set[str] = self._keys[entry.key]
+        token_ids.discard(token_id)
+        if not token_ids:
+            del self._keys[entry.key]
+
+
+class RecentResetRequest(NamedTuple):
+    """
+    A recent password reset request in a `ResetRequestCooldown`.
+    """
+
+    # Properties
+    # ------------------------------------------------------------
+
+    sent: bool
+    """
+    Whether the password reset email has been sent.
+    """
+
+    key: Optional[str]
+    """
+    The reset key of the user the request belongs to or `None` if there is no such user.
+    """
+
+    token: Optional[str]
+    """
+    The reset token that has been sent to the user or `None` if no email has been sent.
+    """
+
+    expires_at: float
+    """
+    The time (in seconds since the epoch) when the cooldown of the address ends.
+    """
+
+
+class ResetRequestCooldown(object):
+    """
+    Size limited LRU cache of the recent password reset requests by email address.
+
+    Entries expire after `window` seconds or when the sent token expires, whichever comes
+    first. Requests for an address that is in the cache are either suppressed, i.e. they
+    return the result of the first request without a user lookup or a new email (the
+    default), or they resend the email with the already issued token if `resend` is enabled,
+    which requires looking up the user by its key. The entries of a user can be invalidated
+    by the user's key, which must be done when the user's password changes.
+
+    `UserHandler` only remembers requests for which an email has been sent. Requests for
+    unknown addresses are not remembered, so a user who registers with the address can
+    request a password reset right away.
+
+    The class is thread-safe.
+    """
+
+    # Initialization
+    # ------------------------------------------------------------
+
+    def __init__(self,
+                 window: float = 60,
+                 max_size: int = 4096,
+                 resend: bool = False,
+                 clock: Callable[[], float] = time) -> None:
+        """
+        Initialization.
+
+        Arguments:
+            window (float): The number of seconds requests for the same address are deduplicated for.
+            max_size (int): The maximum number of remembered addresses.
+            resend (bool): Whether repeated requests resend the email with the already issued
+                           token instead of being suppressed.
+            clock (Callable[[], float]): Function that returns the current time in seconds
+                                         since the epoch.
+        """
+        if max_size < 1 or window <= 0:
+            raise ValueError("max_size must be at least 1 and window must be positive.")
+
+        self.max_size: int = max_size
+        """
+        The maximum number of remembered addresses.
+        """
+
+        self.resend: bool = resend
+        """
+        Whether repeated requests resend the email with the already issued token instead
+        of being suppressed.
+        """
+
+        self.window: float = window
+        """
+        The number of seconds requests for the same address are deduplicated for.
+        """
+
+        self._clock: Callable[[], float] = clock
+        """
+        Function that returns the current time in seconds since the epoch.
+        """
+
+        self._entries: "OrderedDict[str, RecentResetRequest]" = OrderedDict()
+        """
+        The recent requests by address in least recently used first order.
+        """
+
+        self._keys: Dict[str, Set[str]] = {}
+        """
+        The addresses of the recent requests by user key.
+        """
+
+        self._lock: Lock = Lock()
+        """
+        Lock that protects the cache.
+        """
+
+    # Special methods
+    # ------------------------------------------------------------
+
+    def __len__(self) -> int:
+        """
+        Returns the number of remembered addresses (including the expired ones that
+        have not been evicted yet).
+        """
+        return len(self._entries)
+
+    # Methods
+    # ------------------------------------------------------------
+
+    def get(self, address: str) -> Optional[RecentResetRequest]:
+        """
+        Returns the recent request for the given address.
+
+        Arguments:
+            address (str): The email address the password reset was requested for.
+
+        Returns:
+            The recent request or `None` if there is no recent request for the address.
+        """
+        address = address.lower()
+        with self._lock:
+            entry: Optional[RecentResetRequest] = self._entries.get(address)
+            if entry is None:
+                return None
+
+            if entry.expires_at <= self._clock():
+                self._remove(address)
+                return None
+
+            self._entries.move_to_end(address)
+            return entry
+
+    def invalidate_key(self, key: str) -> None:
+        """
+        Removes every request of the user with the given key from the cache.
+
+        Arguments:
+            key (str): The key of the user.
+        """
+        with self._lock:
+            for address in tuple(self._keys.get(key, ())):
+                self._remove(address)
+
+    def put(self,
+            address: str,
+            sent: bool,
+            key: Optional[str] = None,
+            token: Optional[str] = None,
+            token_expires_at: Optional[float] = None) -> None:
+        """
+        Remembers the given password reset request.
+
+        Arguments:
+            address (str): The email address the password reset was requested for.
+            sent (bool): Whether the password reset email has been sent.
+            key (Optional[str]): The reset key of the user or `None` if there is no such user.
+            token (Optional[str]): The reset token that has been sent to the user.
+            token_expires_at (Optional[float]): The time (in seconds since the epoch) when the token expires.
+        """
+        address = address.lower()
+        expires_at: float = self._clock() + self.window
+        if token_expires_at is not None:
+            expires_at = min(expires_at, token_expires_at)
+
+        with self._lock:
+            self._remove(address)
+            self._entries[address] = RecentResetRequest(sent=sent, key=key, token=token, expires_at=expires_at)
+            if key is not None:
+                self._keys.setdefault(key, set()).add(address)
+
+            while len(self._entries) > self.max_size:
+                self._remove(next(iter(self._entries)))
+
+    # Protected methods
+    # ------------------------------------------------------------
+
+    def _remove(self, address: str) -> None:
+        """
+        Removes the request for the given address from the cache if it is cached.
+
+        The method must be called while holding the lock of the cache.
+        """
+        entry: Optional[RecentResetRequest] = self._entries.pop(address, None)
+        if entry is None or entry.key is None:
+            return
+
+        addresses: Set[str] = self._keys[entry.key]
+        addresses.discard(address)
+        if not addresses:
+            del self._keys[entry.key]
+
+
+# Methods
+# ------------------------------------------------------------
+
+
+def get_token_id(token: str) -> str:
+    """
+    Returns the ID of the given token that is used as its key in consumed token stores.
+
+    The ID is a hash of the token, so the stores do not keep usable tokens in memory.
+
+    Arguments:
+        token (str): The encoded token.
+    """
+    return sha256(token.encode("utf-8")).hexdigest()[:32]
@@ -0,0 +1,1054 @@
+"""
+Token codecs with a preprocessed signing key.
+
+`TokenCodec` creates standard HS256 JWTs that PyJWT can decode and vice versa, but it
+prepares the HMAC key (the inner and outer hash states) and the encoded header only once
+instead of on every call.
+
+`CompactTokenCodec` creates much shorter tokens for the links that are sent in emails:
+the purpose, the expiration time and the user key are packed into fixed-width binary
+fields and signed with a truncated MAC.
+
+`AsymmetricTokenCodec` creates EdDSA (Ed25519) or ES256 (ECDSA P-256) signed JWTs, so
+only the nodes that issue tokens need the private key, while the nodes that only verify
+tokens hold the public keys. It requires the `cryptography` package.
+
+The codecs can sign tokens with the current key of a `TokenKeyring` (or a hot-reloaded
+`FileTokenKeyring`) and embed the ID of the key in the tokens, so signing keys can be
+rotated without invalidating the outstanding tokens.
+
+The per-call overhead of the codecs and PyJWT can be compared with:
+
+    python -m user_blueprint.tokens
+"""
+
+
+# Imports
+# ----------------------------------------
+
+
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+
+from hashlib import sha256
+
+from hmac import compare_digest, new as new_hmac
+
+from json import dumps, load, loads
+
+from os import stat
+
+from struct import Struct
+
+from time import monotonic, perf_counter, time
+
+
+# Typing imports
+# ----------------------------------------
+
+
+from typing import Any, Dict, Mapping, NamedTuple, Optional, Tuple, Union
+
+
+# Metadata
+# ------------------------------------------------------------
+
+
+__author__ = "Peter Volf"
+
+
+# Global properties
+# ------------------------------------------------------------
+
+
+COMPACT_TOKEN_CLAIMS: Tuple[str, ...] = ("reset_key", "verification_key", "login_key")
+"""
+The claims `CompactTokenCodec` can encode. A compact token carries exactly one of these
+claims and its index is the purpose of the token, so a token that was issued for one
+purpose can not be used for another.
+"""
+
+ASYMMETRIC_TOKEN_ALGORITHMS: Tuple[str, ...] = ("EdDSA", "ES256")
+"""
+The JWS algorithms `AsymmetricTokenCodec` supports.
+"""
+
+_compact_header: Struct = Struct(">BI")
+"""
+The fixed-width fields of compact tokens: format version and purpose (4 bits each)
+and the expiration time in seconds since the epoch.
+
+The format version is one plus the flags of the optional fields the token contains.
+"""
+
+_compact_kid_flag: int = 1
+"""
+Format version flag of compact tokens that carry the ID of their (named) signing key.
+"""
+
+_compact_cv_flag: int = 2
+"""
+Format version flag of compact tokens that carry a credential version (`cv` claim).
+"""
+
+_p256_order: int = 0xFFFFFFFF00000000FFFFFFFFFFFFFFFFBCE6FAADA7179E84F3B9CAC2FC632551
+"""
+The order of the P-256 curve. ES256 signatures are issued and accepted only in their
+low-S form (`s <= _p256_order // 2`), because `(r, n - s)` would be another valid
+signature of the same token.
+"""
+
+
+# Classes
+# ------------------------------------------------------------
+
+
+class TokenKeyring(object):
+    """
+    Named token signing keys, one of which is used to sign new tokens.
+
+    Tokens carry the ID of the key they were signed with, so keys can be rotated without
+    invalidating the outstanding tokens: add the new key, make it the current one, and
+    remove the old key once the tokens that were signed with it have expired.
+
+    The key with the empty ID is special: tokens signed with it do not carry a key ID,
+    so they are compatible with tokens that were created before the keyring was used.
+    """
+
+    # Initialization
+    # ------------------------------------------------------------
+
+    def __init__(self, keys: Mapping[str, str], current_kid: str) -> None:
+        """
+        Initialization.
+
+        Arguments:
+            keys (Mapping[str, str]): The signing keys by key ID.
+            current_kid (str): The ID of the key to sign new tokens with.
+
+        Raises:
+            ValueError: If the keys are invalid.
+        """
+
+        self._state: Tuple[Dict[str, str], str] = self._validate(keys, current_kid)
+        """
+        The keys by key ID and the current key ID. They are replaced together,
+        so readers always see a consistent state without locking.
+        """
+
+    # Properties
+    # ------------------------------------------------------------
+
+    @property
+    def current_kid(self) -> str:
+        """
+        The ID of the key to sign new tokens with.
+        """
+        return self._state[1]
+
+    # Methods
+    # ------------------------------------------------------------
+
+    def get(self, kid: str) -> Optional[str]:
+        """
+        Returns the key with the given ID.
+
+        Arguments:
+            kid (str): The ID of the key.
+
+        Returns:
+            The key or `None` if the keyring has no key with the given ID.
+        """
+        return self._state[0].get(kid)
+
+    def get_current(self) -> Tuple[str, str]:
+        """
+        Returns the ID and the value of the key to sign new tokens with.
+        """
+        keys, current_kid = self._state
+        return current_kid, keys[current_kid]
+
+    # Static methods
+    # ------------------------------------------------------------
+
+    @staticmethod
+    def _validate(keys: Mapping[str, str], current_kid: str) -> Tuple[Dict[str, str], str]:
+        """
+        Returns a copy of the given keys and the current key ID if they are valid.
+
+        Raises:
+            ValueError: If the keys are invalid.
+        """
+        if current_kid not in keys:
+            raise ValueError(f"The keyring has no key with the current key ID ({current_kid!r}).")
+        if any(len(kid.encode("utf-8")) > 255 or not key for kid, key in keys.items()):
+            raise ValueError("Key IDs must be at most 255 bytes long and keys must not be empty.")
+
+        return dict(keys), current_kid
+
+
+class FileTokenKeyring(TokenKeyring):
+    """
+    Token keyring that is loaded from a JSON file and reloaded when the file changes,
+    so keys can be rotated without restarting the application's workers.
+
+    The file must contain a JSON object with a `keys` object (the signing keys by key ID)
+    and a `current` string (the ID of the key to sign new tokens with):
+
+        {"current": "2024-06", "keys": {"2024-05": "...", "2024-06": "..."}}
+
+    The modification time of the file is checked at most every `reload_interval`
+    seconds. If the changed file is invalid, the previous keys are kept.
+    """
+
+    # Initialization
+    # ------------------------------------------------------------
+
+    def __init__(self, path: str, reload_interval: float = 5) -> None:
+        """
+        Initialization.
+
+        Arguments:
+            path (str): The path of the keyring file.
+            reload_interval (float): The minimum number of seconds between two checks
+                                     of the modification time of the file.
+
+        Raises:
+            OSError: If the file can not be read.
+            ValueError: If the file is invalid.
+        """
+
+        self.path: str = path
+        """
+        The path of the keyring file.
+        """
+
+        self.reload_interval: float = reload_interval
+        """
+        The minimum number of seconds between two checks of the modification time of the file.
+        """
+
+        self._checked_at: float = monotonic()
+        """
+        The time of the last modification time check.
+        """
+
+        self._mtime: float = stat(path).st_mtime
+        """
+        The modification time of the file when it was last loaded.
+        """
+
+        super(FileTokenKeyring, self).__init__(*self._load())
+
+    # Properties
+    # ------------------------------------------------------------
+
+    @property
+    def current_kid(self) -> str:
+        """
+        The ID of the key to sign new tokens with.
+        """
+        self.reload_if_changed()
+        return self._state[1]
+
+    # Methods
+    # ------------------------------------------------------------
+
+    def get(self, kid: str) -> Optional[str]:
+        """
+        Returns the key with the given ID.
+
+        Arguments:
+            kid (str): The ID of the key.
+
+        Returns:
+            The key or `None` if the keyring has no key with the given ID.
+        """
+        self.reload_if_changed()
+        return self._state[0].get(kid)
+
+    def get_current(self) -> Tuple[str, str]:
+        """
+        Returns the ID and the value of the key to sign new tokens with.
+        """
+        self.reload_if_changed()
+        return super(FileTokenKeyring, self).get_current()
+
+    def reload_if_changed(self, force: bool = False) -> bool:
+        """
+        Reloads the keyring if its file has changed since it was last loaded.
+
+        Arguments:
+            force (bool): Whether to check the file even if `reload_interval`
+                          has not elapsed since the last check.
+
+        Returns:
+            Whether the keys have been reloaded.
+        """
+        now: float = monotonic()
+        if not force and now - self._checked_at < self.reload_interval:
+            return False
+
+        self._checked_at = now
+        try:
+            mtime: float = stat(self.path).st_mtime
+            if mtime == self._mtime:
+                return False
+            self._state = self._validate(*self._load())
+        except (OSError, ValueError):
+            # Keep the previous keys, the file may be in the middle of being replaced.
+            return False
+
+        self._mtime = mtime
+        return True
+
+    # Protected methods
+    # ------------------------------------------------------------
+
+    def _load(self) -> Tuple[Dict[str, str], str]:
+        """
+        Returns the keys and the current key ID from the keyring file.
+
+        Raises:
+            OSError: If the file can not be read.
+            ValueError: If the file is invalid.
+        """
+        with open(self.path, encoding="utf-8") as file:
+            data: Any = load(file)
+
+        if not isinstance(data, dict) or not isinstance(data.get("keys"), dict) or\
+           not isinstance(data.get("current"), str) or\
+           not all(isinstance(key, str) for key in data["keys"].values()):
+            raise ValueError("Invalid keyring file.")
+
+        return data["keys"], data["current"]
+
+
+class _KeyringCodec(object):
+    """
+    Base class of the token codecs that prepares the HMAC objects of the keys of a keyring.
+
+    The class is thread-safe.
+    """
+
+    # Initialization
+    # ------------------------------------------------------------
+
+    def __init__(self, key: Union[str, TokenKeyring], prefix: bytes = b"") -> None:
+        """
+        Initialization.
+
+        Arguments:
+            key (Union[str, TokenKeyring]): The secret key or the keyring to sign the tokens with.
+            prefix (bytes): Data to feed the HMAC objects with right after the key.
+        """
+
+        self.keyring: TokenKeyring = TokenKeyring({"": key}, "") if isinstance(key, str) else key
+        """
+        The keyring to sign the tokens with.
+        """
+
+        self._hmacs: Dict[str, Tuple[str, Any]] = {}
+        """
+        The keys and the HMAC objects that have already processed them (and the prefix) by key ID.
+        """
+
+        self._prefix: bytes = prefix
+        """
+        Data to feed the HMAC objects with right after the key.
+        """
+
+    # Protected methods
+    # ------------------------------------------------------------
+
+    def _get_hmac(self, kid: str, key: Optional[str] = None) -> Any:
+        """
+        Returns a copy of the prepared HMAC object of the key with the given ID,
+        or `None` if there is no such key.
+
+        Arguments:
+            kid (str): The ID of the key.
+            key (Optional[str]): The value of the key if the caller already knows it.
+        """
+        if key is None:
+            key = self.keyring.get(kid)
+            if key is None:
+                return None
+
+        prepared: Optional[Tuple[str, Any]] = self._hmacs.get(kid)
+        if prepared is None or prepared[0] != key:
+            # The key is new or it has been replaced by a keyring reload.
+            prepared = (key, new_hmac(key.encode("utf-8"), self._prefix, sha256))
+            self._hmacs[kid] = prepared
+
+        return prepared[1].copy()
+
+
+class TokenCodec(_KeyringCodec):
+    """
+    Encodes and decodes HS256-signed JSON Web Tokens with preprocessed keys.
+
+    Tokens that are signed with a named key of the keyring have the key ID in the
+    `kid` header parameter, so decoding looks up the key in constant time.
+
+    Decoding verifies the signature and the `exp` claim (if present), and only
+    accepts tokens that are signed with the algorithm of the codec.
+
+    The class is thread-safe.
+    """
+
+    # Initialization
+    # ------------------------------------------------------------
+
+    def __init__(self, key: Union[str, TokenKeyring]) -> None:
+        """
+        Initialization.
+
+        Arguments:
+            key (Union[str, TokenKeyring]): The secret key or the keyring to sign the tokens with.
+        """
+        super(TokenCodec, self).__init__(key)
+
+        self.algorithm: str = "HS256"
+        """
+        The JWS algorithm of the tokens.
+        """
+
+        self._headers: Dict[str, bytes] = {}
+        """
+        The encoded header segments by key ID.
+        """
+
+        self._kids: Dict[bytes, str] = {}
+        """
+        The key IDs by encoded header segment.
+        """
+
+    # Methods
+    # ------------------------------------------------------------
+
+    def decode(self, token: str) -> Optional[Dict[str, Any]]:
+        """
+        Decodes the given token.
+
+        Arguments:
+            token (str): The token to decode.
+
+        Returns:
+            The payload of the token or `None` if the token is malformed, its signature
+            is invalid, its key is not in the keyring or it has expired.
+        """
+        try:
+            token_bytes: bytes = token.encode("ascii")
+            signing_input, signature = token_bytes.rsplit(b".", 1)
+            header, payload = signing_input.split(b".")
+            kid: Optional[str] = self._kids.get(header)
+            if kid is None:
+                header_data: Any = _decode_segment(header)
+                kid = header_data.get("kid", "")
+                if header_data.get("alg") != self.algorithm or not isinstance(kid, str):
+                    return None
+
+            if not self._verify(kid, signing_input, signature):
+                return None
+
+            data: Any = _decode_segment(payload)
+        except (AttributeError, TypeError, ValueError):
+            # ValueError covers the base64, JSON and unicode decoding errors.
+            return None
+
+        if not isinstance(data, dict):
+            return None
+
+        exp: Any = data.get("exp")
+        if exp is not None and (not isinstance(exp, (int, float)) or exp <= time()):
+            return None
+
+        return data
+
+    def encode(self, payload: Mapping[str, Any]) -> str:
+        """
+        Encodes the given payload into a token that is signed with the current key of the keyring.
+
+        Arguments:
+            payload (Mapping[str, Any]): The JSON-serializable payload of the token.
+
+        Returns:
+            The encoded token.
+        """
+        kid, key = self.keyring.get_current()
+        signing_input: bytes = self._get_header(kid) + b"." +\
+            urlsafe_b64encode(dumps(payload, separators=(",", ":")).encode("utf-8")).rstrip(b"=")
+
+        return (signing_input + b"." + self._sign(kid, key, signing_input)).decode("ascii")
+
+    # Protected methods
+    # ------------------------------------------------------------
+
+    def _get_header(self, kid: str) -> bytes:
+        """
+        Returns the encoded header segment of the tokens that are signed with the given key.
+        """
+        header: Optional[bytes] = self._headers.get(kid)
+        if header is None:
+            data: Dict[str, str] = {"alg": self.algorithm, "kid": kid, "typ": "JWT"} if kid else\
+                {"alg": self.algorithm, "typ": "JWT"}
+            header = urlsafe_b64encode(dumps(data, separators=(",", ":")).encode("utf-8")).rstrip(b"=")
+            self._headers[kid] = header
+            self._kids[header] = kid
+
+        return header
+
+    def _sign(self, kid: str, key: str, signing_input: bytes) -> bytes:
+        """
+        Returns the encoded signature segment of the given signing input.
+
+        Arguments:
+            kid (str): The ID of the key to sign with.
+            key (str): The value of the key to sign with.
+            signing_input (bytes): The encoded header and payload segments of the token.
+        """
+        mac: Any = self._get_hmac(kid, key)
+        mac.update(signing_input)
+        return urlsafe_b64encode(mac.digest()).rstrip(b"=")
+
+    def _verify(self, kid: str, signing_input: bytes, signature: bytes) -> bool:
+        """
+        Returns whether the given encoded signature segment is a valid signature of the
+        given signing input with the key with the given ID.
+
+        Arguments:
+            kid (str): The ID of the key the token claims to be signed with.
+            signing_input (bytes): The encoded header and payload segments of the token.
+            signature (bytes): The encoded signature segment of the token.
+        """
+        mac: Any = self._get_hmac(kid)
+        if mac is None:
+            return False
+
+        mac.update(signing_input)
+        return compare_digest(urlsafe_b64encode(mac.digest()).rstrip(b"="), signature)
+
+
+class AsymmetricTokenCodec(TokenCodec):
+    """
+    Encodes and decodes EdDSA (Ed25519) or ES256 (ECDSA P-256 with SHA-256) signed JSON
+    Web Tokens.
+
+    The keyring of the codec contains the PEM encoded public keys that tokens are verified
+    with, and the optional private key must belong to the current public key of the keyring.
+    Nodes that only verify tokens do not need the private key, so it can be kept on the
+    nodes that issue tokens. Public keys are parsed only once (and whenever the keyring
+    changes them), and decoding only accepts tokens that are signed with the algorithm
+    of the codec. ES256 signatures are normalized to their low-S form, so every token has
+    exactly one valid encoding and consumed single-use tokens can not be replayed with a
+    modified signature.
+
+    The codec requires the `cryptography` package.
+
+    The class is thread-safe.
+    """
+
+    # Initialization
+    # ------------------------------------------------------------
+
+    def __init__(self,
+                 key: Union[str, TokenKeyring],
+                 private_key: Optional[str] = None,
+                 algorithm: str = "EdDSA") -> None:
+        """
+        Initialization.
+
+        Arguments:
+            key (Union[str, TokenKeyring]): The PEM encoded public key or the keyring of
+                                            public keys to verify the tokens with.
+            private_key (Optional[str]): The PEM encoded private key to sign the tokens with,
+                                         `None` if the codec is only used to verify tokens.
+            algorithm (str): The JWS algorithm of the tokens, one of `ASYMMETRIC_TOKEN_ALGORITHMS`.
+
+        Raises:
+            ValueError: If the algorithm is not supported or the private key is invalid.
+        """
+        if algorithm not in ASYMMETRIC_TOKEN_ALGORITHMS:
+            raise ValueError(f"The algorithm must be one of {ASYMMETRIC_TOKEN_ALGORITHMS}.")
+
+        super(AsymmetricTokenCodec, self).__init__(key)
+
+        self.algorithm = algorithm
+
+        self._private_key: Any = None
+        """
+        The private key object to sign the tokens with.
+        """
+
+        self._public_keys: Dict[str, Tuple[str, Any]] = {}
+        """
+        The PEM encoded public keys and the corresponding public key objects by key ID.
+        """
+
+        self._signing_key: Optional[Tuple[str, str]] = None
+        """
+        The ID and the value of the public key the private key was last checked against.
+        """
+
+        if private_key is not None:
+            from cryptography.hazmat.primitives.serialization import load_pem_private_key
+
+            try:
+                self._private_key = load_pem_private_key(private_key.encode("utf-8"), password=None)
+            except (TypeError, ValueError) as e:
+                raise ValueError("Invalid private key.") from e
+
+            self._check_key_type(self._private_key.public_key())
+
+    # Protected methods
+    # ------------------------------------------------------------
+
+    def _check_key_type(self, public_key: Any) -> None:
+        """
+        Checks whether the given public key object can be used with the algorithm of the codec.
+
+        Raises:
+            ValueError: If the key can not be used with the algorithm of the codec.
+        """
+        from cryptography.hazmat.primitives.asymmetric.ec import EllipticCurvePublicKey, SECP256R1
+        from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PublicKey
+
+        if self.algorithm == "EdDSA":
+            valid: bool = isinstance(public_key, Ed25519PublicKey)
+        else:
+            valid = isinstance(public_key, EllipticCurvePublicKey) and isinstance(public_key.curve, SECP256R1)
+
+        if not valid:
+            raise ValueError(f"The key can not be used with the {self.algorithm} algorithm.")
+
+    def _get_public_key(self, kid: str, key: Optional[str] = None) -> Any:
+        """
+        Returns the public key object of the key with the given ID, or `None` if there
+        is no such key or the key is invalid.
+
+        Arguments:
+            kid (str): The ID of the key.
+            key (Optional[str]): The PEM encoded public key if the caller already knows it.
+        """
+        if key is None:
+            key = self.keyring.get(kid)
+            if key is None:
+                return None
+
+        loaded: Optional[Tuple[str, Any]] = self._public_keys.get(kid)
+        if loaded is None or loaded[0] != key:
+            # The key is new or it has been replaced by a keyring reload.
+            from cryptography.hazmat.primitives.serialization import load_pem_public_key
+
+            try:
+                public_key: Any = load_pem_public_key(key.encode("utf-8"))
+                self._check_key_type(public_key)
+            except (TypeError, ValueError):
+                public_key = None
+
+            loaded = (key, public_key)
+            self._public_keys[kid] = loaded
+
+        return loaded[1]
+
+    def _sign(self, kid: str, key: str, signing_input: bytes) -> bytes:
+        """
+        Returns the encoded signature segment of the given signing input.
+
+        Arguments:
+            kid (str): The ID of the public key that belongs to the private key.
+            key (str): The PEM encoded public key that belongs to the private key.
+            signing_input (bytes): The encoded header and payload segments of the token.
+
+        Raises:
+            ValueError: If the codec has no private key or the private key does not belong
+                        to the current public key of the keyring.
+        """
+        if self._private_key is None:
+            raise ValueError("The codec has no private key, it can only verify tokens.")
+
+        if self._signing_key != (kid, key):
+            # The current key is new or it has been replaced by a keyring reload.
+            from cryptography.hazmat.primitives.serialization import Encoding, PublicFormat
+
+            public_key: Any = self._get_public_key(kid, key)
+            if public_key is None or public_key.public_bytes(Encoding.DER, PublicFormat.SubjectPublicKeyInfo) !=\
+               self._private_key.public_key().public_bytes(Encoding.DER, PublicFormat.SubjectPublicKeyInfo):
+                raise ValueError(f"The private key does not belong to the current public key ({kid!r}).")
+            self._signing_key = (kid, key)
+
+        if self.algorithm == "EdDSA":
+            signature: bytes = self._private_key.sign(signing_input)
+        else:
+            from cryptography.hazmat.primitives.asymmetric.ec import ECDSA
+            from cryptography.hazmat.primitives.asymmetric.utils import decode_dss_signature
+            from cryptography.hazmat.primitives.hashes import SHA256
+
+            # JWS uses the fixed-width r || s form of ECDSA signatures instead of DER.
+            r, s = decode_dss_signature(self._private_key.sign(signing_input, ECDSA(SHA256())))
+            if s > _p256_order // 2:
+                s = _p256_order - s
+            signature = r.to_bytes(32, "big") + s.to_bytes(32, "big")
+
+        return urlsafe_b64encode(signature).rstrip(b"=")
+
+    def _verify(self, kid: str, signing_input: bytes, signature: bytes) -> bool:
+        """
+        Returns whether the given encoded signature segment is a valid signature of the
+        given signing input with the key with the given ID.
+
+        Arguments:
+            kid (str): The ID of the key the token claims to be signed with.
+            signing_input (bytes): The encoded header and payload segments of the token.
+            signature (bytes): The encoded signature segment of the token.
+        """
+        from cryptography.exceptions import InvalidSignature
+
+        public_key: Any = self._get_public_key(kid)
+        if public_key is None:
+            return False
+
+        try:
+            raw_signature: bytes = _decode_canonical(signature)
+        except ValueError:
+            return False
+
+        if len(raw_signature) != 64:
+            return False
+
+        try:
+            if self.algorithm == "EdDSA":
+                public_key.verify(raw_signature, signing_input)
+            else:
+                from cryptography.hazmat.primitives.asymmetric.ec import ECDSA
+                from cryptography.hazmat.primitives.asymmetric.utils import encode_dss_signature
+                from cryptography.hazmat.primitives.hashes import SHA256
+
+                r: int = int.from_bytes(raw_signature[:32], "big")
+                s: int = int.from_bytes(raw_signature[32:], "big")
+                if s > _p256_order // 2:
+                    return False
+                public_key.verify(encode_dss_signature(r, s), signing_input, ECDSA(SHA256()))
+        except InvalidSignature:
+            return False
+
+        return True
+
+
+class CompactTokenCodec(_KeyringCodec):
+    """
+    Encodes and decodes compact binary tokens with preprocessed keys.
+
+    A compact token is the unpadded URL-safe base64 encoding of the format version and
+    purpose (one byte), the expiration time (four bytes), the length and the UTF-8 encoded
+    value of the ID of the signing key (only if the key is named), the length and the UTF-8
+    encoded value of the credential version (only if the payload has a `cv` claim), the
+    UTF-8 encoded value of the purpose claim, and the first `mac_size` bytes of the
+    HMAC-SHA256 of these fields. Decoding rejects every other (padded or non-canonical)
+    encoding of a token, so a consumed single-use token can not be replayed in another form.
+
+    The codec accepts and returns the same payloads as `TokenCodec`, as long as the
+    payload consists of exactly one of the `COMPACT_TOKEN_CLAIMS`, an `exp` and an
+    optional `cv` (string) claim.
+
+    The class is thread-safe.
+    """
+
+    # Initialization
+    # ------------------------------------------------------------
+
+    def __init__(self, key: Union[str, TokenKeyring], mac_size: int = 16) -> None:
+        """
+        Initialization.
+
+        Arguments:
+            key (Union[str, TokenKeyring]): The secret key or the keyring to sign the tokens with.
+            mac_size (int): The number of MAC bytes to keep, at least 10 (80 bits).
+        """
+        if not 10 <= mac_size <= 32:
+            raise ValueError("mac_size must be between 10 and 32.")
+
+        # The prefix separates compact token MACs from JWT signatures.
+        super(CompactTokenCodec, self).__init__(key, b"compact-token:")
+
+        self.mac_size: int = mac_size
+        """
+        The number of MAC bytes the tokens contain.
+        """
+
+    # Methods
+    # ------------------------------------------------------------
+
+    def decode(self, token: str) -> Optional[Dict[str, Any]]:
+        """
+        Decodes the given token.
+
+        Arguments:
+            token (str): The token to decode.
+
+        Returns:
+            The payload of the token or `None` if the token is malformed, its MAC
+            is invalid, its key is not in the keyring or it has expired.
+        """
+        try:
+            data: bytes = _decode_canonical(token.encode("ascii"))
+        except (AttributeError, TypeError, ValueError):
+            return None
+
+        body_size: int = len(data) - self.mac_size
+        if body_size < _compact_header.size:
+            return None
+
+        body: bytes = data[:body_size]
+        version_and_purpose, exp = _compact_header.unpack_from(body)
+        flags: int = (version_and_purpose >> 4) - 1
+        purpose: int = version_and_purpose & 0x0F
+        if not 0 <= flags <= _compact_kid_flag | _compact_cv_flag:
+            return None
+
+        offset: int = _compact_header.size
+        kid: str = ""
+        cv: Optional[str] = None
+        try:
+            if flags & _compact_kid_flag:
+                kid, offset = _read_compact_field(body, offset)
+            if flags & _compact_cv_flag:
+                cv, offset = _read_compact_field(body, offset)
+            value: str = body[offset:].decode("utf-8")
+        except (IndexError, ValueError):
+            return None
+
+        mac: Any = self._get_hmac(kid)
+        if mac is None:
+            return None
+
+        mac.update(body)
+        if not compare_digest(mac.digest()[:self.mac_size], data[body_size:]):
+            return None
+
+        if purpose >= len(COMPACT_TOKEN_CLAIMS) or exp <= time():
+            return None
+
+        result: Dict[str, Any] = {COMPACT_TOKEN_CLAIMS[purpose]: value, "exp": exp}
+        if cv is not None:
+            result["cv"] = cv
+
+        return result
+
+    def encode(self, payload: Mapping[str, Any]) -> str:
+        """
+        Encodes the given payload into a token that is signed with the current key of the keyring.
+
+        Arguments:
+            payload (Mapping[str, Any]): The payload of the token, see the class documentation.
+
+        Returns:
+            The encoded token.
+
+        Raises:
+            ValueError: If the payload can not be encoded into a compact token.
+        """
+        claims: Tuple[str, ...] = tuple(name for name in payload if name not in ("exp", "cv"))
+        if len(claims) != 1 or claims[0] not in COMPACT_TOKEN_CLAIMS or "exp" not in payload:
+            raise ValueError(f"Compact tokens must have an exp and one of the {COMPACT_TOKEN_CLAIMS} claims.")
+
+        kid, key = self.keyring.get_current()
+        flags: int = 0
+        fields: bytes = b""
+        if kid:
+            flags |= _compact_kid_flag
+            fields += _encode_compact_field(kid)
+        if "cv" in payload:
+            flags |= _compact_cv_flag
+            fields += _encode_compact_field(payload["cv"])
+
+        header: bytes = _compact_header.pack(
+            (flags + 1) << 4 | COMPACT_TOKEN_CLAIMS.index(claims[0]), int(payload["exp"])
+        )
+        body: bytes = header + fields + str(payload[claims[0]]).encode("utf-8")
+        mac: Any = self._get_hmac(kid, key)
+        mac.update(body)
+        return urlsafe_b64encode(body + mac.digest()[:self.mac_size]).rstrip(b"=").decode("ascii")
+
+
+class TokenBenchmarkResult(NamedTuple):
+    """
+    The result of a token codec benchmark.
+    """
+
+    # Properties
+    # ------------------------------------------------------------
+
+    encode_us: float
+    """
+    The average duration of encoding a token in microseconds.
+    """
+
+    decode_us: float
+    """
+    The average duration of decoding a token in microseconds.
+    """
+
+    length: int
+    """
+    The length of the encoded token.
+    """
+
+
+# Methods
+# ------------------------------------------------------------
+
+
+def _encode_compact_field(value: str) -> bytes:
+    """
+    Returns the length-prefixed UTF-8 encoding of the given optional compact token field.
+
+    Raises:
+        ValueError: If the value is not a string or it is longer than 255 bytes.
+    """
+    if not isinstance(value, str):
+        raise ValueError("Optional compact token fields must be strings.")
+
+    encoded: bytes = value.encode("utf-8")
+    if len(encoded) > 255:
+        raise ValueError("Optional compact token fields must be at most 255 bytes long.")
+
+    return bytes((len(encoded),)) + encoded
+
+
+def _read_compact_field(body: bytes, offset: int) -> Tuple[str, int]:
+    """
+    Returns the value of the length-prefixed optional compact token field at the given
+    offset of the given token body and the offset of the next field.
+
+    Raises:
+        IndexError: If the body is too short.
+        ValueError: If the body is too short or the field is not valid UTF-8.
+    """
+    end: int = offset + 1 + body[offset]
+    if end > len(body):
+        raise ValueError("Truncated compact token field.")
+
+    return body[offset + 1:end].decode("utf-8"), end
+
+
+def _decode_canonical(segment: bytes) -> bytes:
+    """
+    Decodes the given unpadded URL-safe base64 encoded segment of a token.
+
+    Raises:
+        ValueError: If the segment is not the canonical encoding of the decoded bytes,
+                    for example if it is padded or its unused trailing bits are not zero.
+    """
+    data: bytes = urlsafe_b64decode(segment + b"=" * (-len(segment) % 4))
+    if urlsafe_b64encode(data).rstrip(b"=") != segment:
+        raise ValueError("Non-canonical token encoding.")
+
+    return data
+
+
+def _decode_segment(segment: bytes) -> Any:
+    """
+    Decodes the given unpadded base64 encoded JSON segment of a token.
+    """
+    return loads(_decode_canonical(segment))
+
+
+def benchmark_tokens(key: str,
+                     payloads: Mapping[str, Mapping[str, Any]],
+                     rounds: int = 10000) -> Dict[str, TokenBenchmarkResult]:
+    """
+    Measures the average duration of encoding and decoding the given payloads with
+    `TokenCodec`, `CompactTokenCodec` and PyJWT, and the length of the tokens.
+
+    If the `cryptography` package is installed, `AsymmetricTokenCodec` is also measured
+    with both of its algorithms, using freshly generated keys.
+
+    Arguments:
+        key (str): The secret key to sign the tokens with.
+        payloads (Mapping[str, Mapping[str, Any]]): The payloads to encode by name.
+        rounds (int): The number of encode and decode calls to execute per payload and codec.
+
+    Returns:
+        The benchmark results by "<payload name> / <codec name>".
+    """
+    import jwt
+
+    codec: TokenCodec = TokenCodec(key)
+    compact_codec: CompactTokenCodec = CompactTokenCodec(key)
+    codecs: Dict[str, Any] = {
+        "TokenCodec": (codec.encode, codec.decode),
+        "CompactTokenCodec": (compact_codec.encode, compact_codec.decode),
+        "PyJWT": (
+            lambda payload: jwt.encode(payload, key, algorithm="HS256"),
+            lambda token: jwt.decode(token, key, algorithms=["HS256"])
+        )
+    }
+
+    try:
+        from cryptography.hazmat.primitives.asymmetric.ec import SECP256R1, generate_private_key
+        from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
+        from cryptography.hazmat.primitives.serialization import Encoding, NoEncryption, PrivateFormat, PublicFormat
+    except ImportError:
+        pass
+    else:
+        private_keys: Tuple[Tuple[str, Any], ...] = (
+            ("EdDSA", Ed25519PrivateKey.generate()), ("ES256", generate_private_key(SECP256R1()))
+        )
+        for algorithm, private_key in private_keys:
+            asymmetric_codec: AsymmetricTokenCodec = AsymmetricTokenCodec(
+                private_key.public_key().public_bytes(Encoding.PEM, PublicFormat.SubjectPublicKeyInfo).decode("ascii"),
+                private_key.private_bytes(Encoding.PEM, PrivateFormat.PKCS8, NoEncryption()).decode("ascii"),
+                algorithm
+            )
+            codecs[f"AsymmetricTokenCodec ({algorithm})"] = (asymmetric_codec.encode, asymmetric_codec.decode)
+
+    results: Dict[str, TokenBenchmarkResult] = {}
+    for payload_name, payload in payloads.items():
+        for codec_name, (encode, decode) in codecs.items():
+            token: str = encode(payload)
+            decode(token)  # Warm up.
+
+            start: float = perf_counter()
+            for _ in range(rounds):
+                encode(payload)
+            encode_us: float = (perf_counter() - start) * 1000000 / rounds
+
+            start = perf_counter()
+            for _ in range(rounds):
+                decode(token)
+            decode_us: float = (perf_counter() - start) * 1000000 / rounds
+
+            results[f"{payload_name} / {codec_name}"] = TokenBenchmarkResult(
+                encode_us=encode_us, decode_us=decode_us, length=len(token)
+            )
+
+    return results
+
+
+def main() -> None:
+    """
+    Command line entry point that benchmarks the token codecs against PyJWT with reset
+    and verification token payloads.
+    """
+    results: Dict[str, TokenBenchmarkResult] = benchmark_tokens(
+        "benchmark token signing key of 32+ bytes",
+        {
+            "reset": {"reset_key": "user@example.com", "exp": time() + 600},
+            "verification": {"verification_key": "user@example.com", "exp": time() + 6000}
+        }
+    )
+
+    for name, result in results.items():
+        print(
+            f"{name:<52} encode: {result.encode_us:8.3f} us   decode: {result.decode_us:8.3f} us   "
+            f"length: {result.length:4d}"
+        )
+
+
+# Entry
+# ------------------------------------------------------------
+
+
+if __name__ == "__main__":
+    main()
@@ -7,23 +7,43 @@ The components of the user blueprint.
 # ----------------------------------------
 
 
-from flask import url_for
+from concurrent.futures import Future
+
+from hmac import compare_digest
+
+from flask import current_app, has_app_context, url_for
 
 from flask_login import UserMixin
 
 from flask_wtf import FlaskForm
 
 from wtforms import BooleanField,\
+                    HiddenField,\
                     PasswordField,\
                     StringField
-from wtforms.validators import DataRequired, Email, EqualTo, Length, ValidationError
+from wtforms.validators import DataRequired, Email, EqualTo, Length, Regexp, ValidationError
+
+from user_blueprint.challenge import ProofOfWorkChallenge
+from user_blueprint.emails import EmailTemplates, RenderedEmail
+from user_blueprint.hashers import PasslibArgon2Hasher, PasswordHasher
+from user_blueprint.hashing import LOGIN, REGISTRATION, REHASH,\
+                                   HashingError, HashingExecutor
+from user_blueprint.outbox import LOGIN_LINK_EMAIL, PASSWORD_RESET_EMAIL, VERIFICATION_EMAIL,\
+                                  EmailOutbox, OutboxError
+from user_blueprint.prehashing import CLIENT_HASH_REGEX, SALT_REGEX,\
+                                      ClientPrehashing, compute_client_hash
+from user_blueprint.throttling import LoginThrottle
+from user_blueprint.token_store import CachedToken, ConsumedTokenStore, DecodedTokenCache, RecentResetRequest,\
+                                       ResetRequestCooldown, get_token_id
+from user_blueprint.tokens import ASYMMETRIC_TOKEN_ALGORITHMS, AsymmetricTokenCodec, CompactTokenCodec,\
+                                  TokenCodec, TokenKeyring
 
 
 # Typing imports
 # ----------------------------------------
 
 
-from typing import Any, Callable, Mapping, Optional, NamedTuple
+from typing import Any, Callable, Dict, List, Mapping, Optional, NamedTuple, Tuple, Union
 
 
 # Metadata
@@ -33,6 +53,21 @@ from typing import Any, Callable, Mapping, Optional, NamedTuple
 __author__ = "Peter Volf"
 
 
+# Global properties
+# ------------------------------------------------------------
+
+
+DEFAULT_LINK_TEMPLATES: Mapping[str, str] = {
+    "login_link": "/login_link/{token}",
+    "reset": "/reset/{token}",
+    "verify": "/verify/{token}"
+}
+"""
+The default link templates of the emailed links by blueprint endpoint, relative to the
+URL prefix of the blueprint.
+"""
+
+
 # Classes
 # ------------------------------------------------------------
 
@@ -46,7 +81,17 @@ class UserHandler(object):
     `user_getter`, `user_by_reset_key_getter`, `user_inserter`.
 
     Besides the aforementioned decorators, the `token_signing_key` property must be set
-    to the secret key you would like to sign tokens with.
+    to the secret key you would like to sign tokens with, or the `token_keyring` property
+    must be set to a keyring (see `user_blueprint.tokens`) if signing keys are rotated.
+    Set `token_algorithm` to `"EdDSA"` or `"ES256"` to sign tokens with a private key
+    (`token_private_key`) and verify them with the public key(s) of the token keyring,
+    so the nodes that only verify tokens do not need the signing key. Set `compact_tokens`
+    to `True` to use compact binary tokens instead of JWTs in the emailed links, set
+    `consumed_token_store` to make password reset and login links single-use, and set
+    `reset_token_cache` to verify password reset tokens only once for the request that
+    renders the password reset form and the one that submits it.
+    Set `reset_request_cooldown` to deduplicate repeated password reset requests for
+    the same email address.
 
     Optionally the user handler can be configured to send a verification email to a user
     after registration by using the following decorators on the methods that implement the
@@ -56,7 +101,38 @@ class UserHandler(object):
 
     You can further configure the user handler by using the following decorators
     on the application methods that implement the corresponding functionality:
-    `reset_token_validator`.
+    `client_key_getter`, `credential_version_getter`, `reset_token_validator`.
+
+    Passwordless login with emailed, signed and expiring login links can be enabled by
+    using the `login_link_email_sender` decorator.
+
+    Password hashing and verification is executed by the `hashing_executor` of the
+    user handler. Set it to `None` to hash passwords on the request thread. The hashing
+    algorithm and its cost can be configured with the `password_hasher` property, see
+    also `user_blueprint.hashers` and `user_blueprint.calibration.calibrate()`. If
+    `rehash_on_login` is enabled, the stored hash of a user whose hash was created with
+    outdated parameters is replaced (using the `password_updater` callback) after a
+    successful login. Failed logins can be throttled per client and per account by
+    setting `login_throttle` (note that the per-account limit lets anyone lock out an
+    account whose username is known, see `LoginThrottle`), and clients can be required
+    to solve proof-of-work challenges while the hashing backlog is long by setting
+    `login_challenge`. If `equalize_login_timing` is enabled, logins with an unknown
+    username verify the entered password against a precomputed dummy hash (a dummy pre-hash
+    if `client_prehashing` is set without migration), so every login costs the same regardless
+    of whether the user exists. While `client_prehashing` migrates users, the logins of
+    unknown and of already migrated users also verify the password against the dummy hash
+    of the password hasher, so they cost the same as the logins of unmigrated users. Setting `client_prehashing` moves the expensive key stretching to the
+    browser, see `user_blueprint.prehashing`.
+
+    Emailed links are built with `url_for()` by default, which requires a request context.
+    Set `link_base_url` to build them without one, for example in background workers or
+    command line tools.
+
+    Verification, password reset and login link emails are sent on the request thread
+    by default. Set `email_outbox` to send them on background worker threads instead,
+    see `user_blueprint.outbox`. The built-in email senders render the emails with the
+    precompiled `email_templates` of the blueprint's user handler, custom senders can
+    use `render_email()`.
     """
 
     # Initialization
@@ -67,9 +143,120 @@ class UserHandler(object):
         Initialization.
         """
 
-        self.token_signing_key: str = None
+        self.client_prehashing: Optional[ClientPrehashing] = None
+        """
+        The client-side pre-hashing protocol to use or `None` if passwords should
+        only be hashed on the server.
+        """
+
+        self.consumed_token_store: Optional[ConsumedTokenStore] = None
+        """
+        The store of the consumed password reset and login tokens (see `user_blueprint.token_store`)
+        or `None` if these tokens can be used until they expire.
+        """
+
+        self.email_templates: EmailTemplates = EmailTemplates()
+        """
+        The templates of the verification, password reset and login link emails
+        (see `user_blueprint.emails`). They are compiled on their first use.
+        """
+
+        self.equalize_login_timing: bool = False
+        """
+        Whether to verify the password of logins with an unknown username against a dummy
+        hash, so unknown-user logins cost the same as the logins of existing users.
+
+        While `client_prehashing` migrates users (`migrate` is enabled), existing users
+        are verified either with the password hasher (unmigrated users) or with a cheap
+        pre-hash check (migrated users). To hide which group a username belongs to, unknown
+        and migrated users are then also verified against the dummy hash of the password
+        hasher, so every login costs one password hasher verification until the migration
+        is finished and `migrate` is disabled.
+        """
+
+        self.hashing_executor: Optional[HashingExecutor] = HashingExecutor()
+        """
+        The executor that runs password hashing and verification jobs or `None`
+        if these jobs should be executed on the request thread.
+        """
+
+        self.password_hasher: PasswordHasher = PasslibArgon2Hasher()
+        """
+        The hasher to use to hash and verify passwords.
+        """
+
+        self.login_challenge: Optional[ProofOfWorkChallenge] = None
+        """
+        The proof-of-work challenge clients must solve before their login attempt is
+        verified while the hashing backlog is long, or `None` to disable challenges.
+        """
+
+        self.link_base_url: Optional[str] = None
+        """
+        The external URL of the blueprint (including its URL prefix, for example
+        `https://example.com/auth`) that the emailed links are built from, or `None` if
+        the links should be built with `url_for()`, which requires a request context.
+        """
+
+        self.link_templates: Dict[str, str] = dict(DEFAULT_LINK_TEMPLATES)
+        """
+        The templates of the emailed links by blueprint endpoint, relative to `link_base_url`.
+        The `{token}` placeholder is replaced with the token of the link.
+        """
+
+        self.login_throttle: Optional[LoginThrottle] = None
+        """
+        The throttle that limits the number of failed logins per client and account (reset
+        key of the user) or `None` if failed logins should not be throttled.
+        """
+
+        self.reset_request_cooldown: Optional[ResetRequestCooldown] = None
+        """
+        The cache of the recent password reset requests by email address that deduplicates
+        repeated requests, or `None` if every request should send a new email.
+        """
+
+        self.reset_token_cache: Optional[DecodedTokenCache] = None
+        """
+        The cache of the verified password reset tokens or `None` if reset tokens
+        should be verified on every use.
+        """
+
+        self.rehash_on_login: bool = True
+        """
+        Whether to rehash the password of users whose stored hash was created with
+        outdated Argon2 parameters when they log in.
+        """
+
+        self._client_key_getter: Callable[[], Optional[str]] = self._get_remote_address
+        """
+        Function that returns the key of the client of the current request that is used
+        for fair scheduling of the hashing jobs of different clients.
+        """
+
+        self._compact_tokens: bool = False
+        """
+        Whether to use compact binary tokens instead of JWTs.
+        """
+
+        self._credential_version_getter: Optional[Callable[[UserMixin], Any]] = None
+        """
+        Function that returns the current credential version of the given user.
+        """
+
+        self._dummy_hash: Optional[Tuple[PasswordHasher, str]] = None
+        """
+        The password hasher and the dummy hash it created for equalizing login timing.
+        """
+
+        self._email_outbox: Optional[EmailOutbox] = None
         """
-        The secret key to use to sign tokens.
+        The outbox that sends the emails of the user handler in the background.
+        """
+
+        self._login_link_email_sender: Callable[[UserMixin, str], bool] = None
+        """
+        Function that sends the given login link to the given user.
         """
 
         self._password_getter: Callable[[UserMixin], str] = None
@@ -102,6 +289,26 @@ class UserHandler(object):
         Function that executes extra validation on a valid JWT reset token.
         """
 
+        self._token_algorithm: str = "HS256"
+        """
+        The algorithm to sign tokens with.
+        """
+
+        self._token_codec: Optional[Union[CompactTokenCodec, TokenCodec]] = None
+        """
+        The token codec that signs tokens with the token signing key.
+        """
+
+        self._token_keyring: Optional[TokenKeyring] = None
+        """
+        The keyring to use to sign and verify tokens.
+        """
+
+        self._token_private_key: Optional[str] = None
+        """
+        The PEM encoded private key to sign tokens with if an asymmetric algorithm is used.
+        """
+
         self._user_by_reset_key_getter: Callable[[str], Optional[UserMixin]] = None
         """
         Function that returns the user corresponding to the given password reset key.
@@ -129,9 +336,178 @@ class UserHandler(object):
         Function that sends the given verification link to the given user.
         """
 
+    # Properties
+    # ------------------------------------------------------------
+
+    @property
+    def compact_tokens(self) -> bool:
+        """
+        Whether to use compact binary tokens (see `user_blueprint.tokens.CompactTokenCodec`)
+        instead of JWTs for password reset, registration verification and login links.
+
+        Changing the token format invalidates the tokens that have already been sent.
+        """
+        return self._compact_tokens
+
+    @compact_tokens.setter
+    def compact_tokens(self, value: bool) -> None:
+        self._compact_tokens = value
+        self._token_codec = None
+
+    @property
+    def email_outbox(self) -> Optional[EmailOutbox]:
+        """
+        The outbox (see `user_blueprint.outbox`) that sends the verification, password reset
+        and login link emails of the user handler on background worker threads, or `None`
+        if emails are sent on the request thread.
+
+        Emails are sent on the request thread if the outbox is full. Queued emails only
+        contain the reset key of their user, the user is looked up with the
+        `user_by_reset_key_getter` callback when the email is sent.
+
+        Setting this property starts the workers of the outbox. Emails are delivered within
+        the application context of the outbox's `app`. If it is not set, the current
+        application is used: the one whose context this property is set in, or else the
+        one that enqueues the first email.
+        """
+        return self._email_outbox
+
+    @email_outbox.setter
+    def email_outbox(self, value: Optional[EmailOutbox]) -> None:
+        if value is not None:
+            value.start(self._deliver_email, current_app._get_current_object() if has_app_context() else None)
+        self._email_outbox = value
+
+    @property
+    def token_algorithm(self) -> str:
+        """
+        The algorithm to sign tokens with: `"HS256"` (the default), `"EdDSA"` or `"ES256"`.
+
+        With the asymmetric `"EdDSA"` and `"ES256"` algorithms (see
+        `user_blueprint.tokens.AsymmetricTokenCodec`), the token keyring (or the token
+        signing key) holds the PEM encoded public key(s) that tokens are verified with, and
+        tokens are signed with `token_private_key`, which only needs to be set on the nodes
+        that send password reset, registration verification and login link emails.
+        Asymmetric algorithms can not be used with compact tokens.
+        """
+        return self._token_algorithm
+
+    @token_algorithm.setter
+    def token_algorithm(self, value: str) -> None:
+        if value != "HS256" and value not in ASYMMETRIC_TOKEN_ALGORITHMS:
+            raise ValueError(f"Unsupported token algorithm: {value}")
+
+        self._token_algorithm = value
+        self._token_codec = None
+
+    @property
+    def token_codec(self) -> Union[CompactTokenCodec, TokenCodec]:
+        """
+        The token codec that signs and verifies tokens with the token signing key.
+
+        Raises:
+            ValueError: If the token signing key is not set, or an asymmetric
+                        token algorithm is used with compact tokens.
+        """
+        codec: Optional[Union[CompactTokenCodec, TokenCodec]] = self._token_codec
+        if codec is None:
+            if self._token_keyring is None:
+                raise ValueError("The token signing key is not set.")
+            if self._token_algorithm != "HS256":
+                if self._compact_tokens:
+                    raise ValueError("Compact tokens can only be signed with the HS256 algorithm.")
+                codec = AsymmetricTokenCodec(self._token_keyring, self._token_private_key, self._token_algorithm)
+            else:
+                codec_class: Any = CompactTokenCodec if self._compact_tokens else TokenCodec
+                codec = codec_class(self._token_keyring)
+            self._token_codec = codec
+
+        return codec
+
+    @property
+    def token_keyring(self) -> Optional[TokenKeyring]:
+        """
+        The keyring to use to sign and verify tokens.
+
+        New tokens are signed with the current key of the keyring and carry its ID, so
+        tokens that were signed with any key of the keyring remain valid after rotation.
+        Use a `user_blueprint.tokens.FileTokenKeyring` to rotate keys without restarting
+        the application.
+        """
+        return self._token_keyring
+
+    @token_keyring.setter
+    def token_keyring(self, value: Optional[TokenKeyring]) -> None:
+        self._token_keyring = value
+        self._token_codec = None
+
+    @property
+    def token_private_key(self) -> Optional[str]:
+        """
+        The PEM encoded private key to sign tokens with if an asymmetric token algorithm
+        is used. It must belong to the current public key of the token keyring.
+
+        Nodes without a private key can verify tokens but can not create them.
+        """
+        return self._token_private_key
+
+    @token_private_key.setter
+    def token_private_key(self, value: Optional[str]) -> None:
+        self._token_private_key = value
+        self._token_codec = None
+
+    @property
+    def token_signing_key(self) -> Optional[str]:
+        """
+        The secret key to use to sign tokens, or the PEM encoded public key to verify
+        tokens with if an asymmetric token algorithm is used.
+
+        Setting this property replaces the token keyring with a keyring that only
+        contains the given (unnamed) key.
+        """
+        return None if self._token_keyring is None else self._token_keyring.get_current()[1]
+
+    @token_signing_key.setter
+    def token_signing_key(self, value: Optional[str]) -> None:
+        self.token_keyring = None if value is None else TokenKeyring({"": value}, "")
+
     # Decorator Methods
     # ------------------------------------------------------------
 
+    def client_key_getter(self, callback: Callable[[], Optional[str]]) -> Callable[[], Optional[str]]:
+        """
+        Decorator to use on the application method that returns the key (for example the
+        IP address or the entered username) of the client of the current request. Hashing
+        jobs are scheduled fairly between clients, so one client's burst of requests can
+        not starve the requests of other clients.
+
+        By default the remote address of the request is used as the client key.
+        """
+        self._client_key_getter = callback
+        return callback
+
+    def credential_version_getter(self, callback: Callable[[UserMixin], Any]) -> Callable[[UserMixin], Any]:
+        """
+        Decorator to use on the application or database method that returns the current
+        credential version of the given user: a value (for example a counter or a timestamp)
+        that changes whenever the user's password changes.
+
+        If this decorator is used, password reset, registration verification and login tokens
+        carry the credential version of their user, and tokens whose version does not match
+        the user's current version are rejected. This way every outstanding token of a user
+        is invalidated by a password change without storing the tokens.
+        """
+        self._credential_version_getter = callback
+        return callback
+
+    def login_link_email_sender(self, callback: Callable[[UserMixin, str], bool]) -> Callable[[UserMixin, str], bool]:
+        """
+        Decorator to use on the application method that sends the given user the
+        given login link. Passwordless login is only enabled if this decorator is used.
+        """
+        self._login_link_email_sender = callback
+        return callback
+
     def password_getter(self, callback: Callable[[UserMixin], str]) -> Callable[[UserMixin], str]:
         """
         Decorator to use on the application or database method that returns a given
@@ -227,6 +603,107 @@ class UserHandler(object):
     # Methods
     # ------------------------------------------------------------
 
+    def check_login_challenge(self, data: "LoginData", consume: bool = False) -> bool:
+        """
+        Checks whether the given login data contains a valid solution of a proof-of-work
+        challenge if the current hashing backlog requires one. Challenges that are easier
+        than the currently required difficulty are rejected, so cheap challenges collected
+        while the backlog was short can not be used once it grows.
+
+        Arguments:
+            data (LoginData): The login data to check.
+            consume (bool): Whether to mark the solved challenge as spent.
+
+        Returns:
+            `True` if no challenge is required or the login data contains a valid solution,
+            `False` otherwise.
+        """
+        difficulty: int = self.get_login_challenge_difficulty()
+        if difficulty == 0:
+            return True
+
+        return self.login_challenge.verify(
+            data.challenge, data.challenge_solution, consume=consume, min_difficulty=difficulty
+        )
+
+    def consume_token(self, token: str) -> bool:
+        """
+        Marks the given single-use (password reset or login) token as consumed.
+
+        Arguments:
+            token (str): The encoded token to consume.
+
+        Returns:
+            `True` if the token is valid and it has been consumed by this call (or there is
+            no consumed token store), `False` if the token is invalid or it had already
+            been consumed.
+        """
+        from time import time
+
+        token_id: str = get_token_id(token)
+        cache: Optional[DecodedTokenCache] = self.reset_token_cache
+        cached: Optional[CachedToken] = None if cache is None else cache.get(token_id)
+        data: Optional[Mapping] = self.token_codec.decode(token) if cached is None else cached.claims
+        if data is None:
+            return False
+
+        if cache is not None:
+            cache.invalidate(token_id)
+
+        store: Optional[ConsumedTokenStore] = self.consumed_token_store
+        # Tokens without expiration time are remembered for a day.
+        return store is None or store.consume(token_id, data.get("exp", time() + 86400))
+
+    def get_login_challenge(self) -> Optional[str]:
+        """
+        Returns a new proof-of-work challenge for the login form if the current hashing
+        backlog requires one.
+
+        Returns:
+            The challenge or `None` if no challenge is required.
+        """
+        difficulty: int = self.get_login_challenge_difficulty()
+        return None if difficulty == 0 else self.login_challenge.issue(difficulty)
+
+    def get_login_challenge_difficulty(self) -> int:
+        """
+        Returns the difficulty of the login challenges based on the current hashing backlog.
+
+        Returns:
+            The difficulty of the login challenges or 0 if no challenge is required.
+        """
+        if self.login_challenge is None or self.hashing_executor is None:
+            return 0
+
+        return self.login_challenge.get_difficulty(self.hashing_executor.queue_depth)
+
+    def get_prehash_parameters(self, identifier: str) -> Tuple[str, int]:
+        """
+        Returns the salt and the iteration count the browser must use to compute the
+        client hash of the password of the user with the given identifier.
+
+        The salt is derived from the username of the user (or from the given identifier if
+        there is no such user), so the username and the email address of a user get the
+        same salt.
+
+        Arguments:
+            identifier (str): The username or email address the user logs in with.
+
+        Returns:
+            The salt and the iteration count.
+
+        Raises:
+            ValueError: If client-side pre-hashing is not enabled.
+        """
+        if self.client_prehashing is None:
+            raise ValueError("Client-side pre-hashing is not enabled.")
+
+        user: Optional[UserMixin] = self.get_user(identifier.lower())
+        if user is None:
+            return self.client_prehashing.get_parameters(identifier, None)
+
+        return self.client_prehashing.get_parameters(user.username, self._password_getter(user))
+
     def get_user(self, identifier: str) -> Optional[UserMixin]:
         """
         Returns the user corresponding to the given identifier that could be either
@@ -241,6 +718,24 @@ class UserHandler(object):
         """
         return self._user_getter(identifier)
 
+    def get_user_for_login_token(self, token: str) -> Optional[UserMixin]:
+        """
+        Returns the user the given login token belongs to.
+
+        Arguments:
+            token (str): The encoded login token to get the corresponding user for.
+
+        Returns:
+            The user the login token belongs to if the token is valid and
+            such a user exists.
+        """
+        data: Optional[Mapping] = self._decode_single_use_token(token, "login_key")
+        if data is None:
+            return None
+
+        user: Optional[UserMixin] = self._user_by_reset_key_getter(data["login_key"])
+        return user if self._is_credential_version_current(user, data) else None
+
     def get_user_for_reset_token(self, token: str) -> Optional[UserMixin]:
         """
         Returns the user the given reset token belongs to.
@@ -251,17 +746,85 @@ class UserHandler(object):
         Returns:
             The user the reset token belongs to if the token is valid and
             such a user exists.
-        """
-        import jwt
 
+        If the user handler has a reset token cache, only the decoding and the signature
+        verification of the token are skipped on a cache hit: the reset token validator,
+        the user lookup and the credential version check are executed on every call.
+        """
+        cache: Optional[DecodedTokenCache] = self.reset_token_cache
+        cached: Optional[CachedToken] = None
+        if cache is not None:
+            token_id: str = get_token_id(token)
+            cached = cache.get(token_id)
+            if cached is not None:
+                store: Optional[ConsumedTokenStore] = self.consumed_token_store
+                if store is not None and store.is_consumed(token_id):
+                    cache.invalidate(token_id)
+                    return None
+
+        data: Optional[Mapping] = self._decode_single_use_token(token, "reset_key") if cached is None\
+            else cached.claims
         try:
-            data: Mapping = jwt.decode(token, self.token_signing_key)
-            if not self._reset_token_validator(data):
+            if data is None or not self._reset_token_validator(data):
                 return None
         except:
             return None
 
-        return self._user_by_reset_key_getter(data["reset_key"])
+        user: Optional[UserMixin] = self._user_by_reset_key_getter(data["reset_key"])
+        if not self._is_credential_version_current(user, data):
+            return None
+
+        if cache is not None and cached is None:
+            cache.put(token_id, data["reset_key"], data)
+
+        return user
+
+    def hash_password(self,
+                      password: str,
+                      category: str = REGISTRATION,
+                      client_hash: str = "",
+                      salt: str = "",
+                      username: str = "") -> str:
+        """
+        Returns the hash of the given password.
+
+        If client-side pre-hashing is enabled and the browser sent the client hash of the
+        password computed with the salt of the given username, the (cheap) pre-hashing
+        protocol hash of the client hash is returned. Client hashes that were computed with
+        any other salt are ignored.
+
+        Arguments:
+            password (str): The password to hash.
+            category (str): The scheduling category of the hashing job, see `user_blueprint.hashing`.
+            client_hash (str): The client hash of the password if the browser computed it.
+            salt (str): The salt the browser used to compute the client hash.
+            username (str): The username of the user the password belongs to.
+
+        Returns:
+            The hash of the password.
+
+        Raises:
+            HashingQueueFullError: If the queue of the hashing executor is full.
+            ValueError: If the client hash or the salt is malformed.
+        """
+        prehashing: Optional[ClientPrehashing] = self.client_prehashing
+        if prehashing is not None and client_hash and salt == prehashing.get_salt(username):
+            return prehashing.hash(client_hash, salt)
+
+        if self.hashing_executor is None:
+            return self.password_hasher.hash(password)
+
+        hasher: PasswordHasher = self.password_hasher
+        return self.hashing_executor.run(
+            hasher.hash, password, memory_kib=hasher.memory_kib, category=category, client=self._client_key_getter()
+        )
+
+    def hashing_retry_after(self) -> int:
+        """
+        Returns the number of seconds after which clients should retry requests that
+        were rejected because the hashing executor was saturated.
+        """
+        return 1 if self.hashing_executor is None else self.hashing_executor.retry_after()
 
     def insert_user(self, data: "RegistrationData") -> bool:
         """
@@ -273,20 +836,60 @@ class UserHandler(object):
         Returns:
             Whether the user has been successfully inserted to the database.
         """
+        from time import time
+
         if self._user_inserter(data):
             if self._verification_email_sender is not None:
-                from time import time
-                import jwt
                 user: UserMixin = self.get_user(data.email)
-                token: bytes = jwt.encode(
-                    {"verification_key": self._reset_key_getter(user), "exp": time() + 6000},
-                    self.token_signing_key
-                )
-                self._verification_email_sender(user, url_for(".verify", token=token, _external=True))
+                expires_at: float = time() + 6000
+                token: str = self._create_token("verification_key", user, 6000)
+                self._send_email(VERIFICATION_EMAIL, user, self._build_link("verify", token), expires_at)
             return True
 
         return False
 
+    def is_hashing_saturated(self, category: Optional[str] = None) -> bool:
+        """
+        Returns whether the hashing executor is saturated and requests that require
+        password hashing or verification should be rejected immediately.
+
+        Arguments:
+            category (Optional[str]): If not `None`, the queue limit of the given hashing
+                                      job category is also taken into account.
+        """
+        return self.hashing_executor is not None and\
+            self.hashing_executor.is_saturated(category, self._client_key_getter())
+
+    def is_login_link_enabled(self) -> bool:
+        """
+        Returns whether passwordless login with emailed login links is enabled.
+        """
+        return self._login_link_email_sender is not None
+
+    def is_login_throttled(self, username: str) -> bool:
+        """
+        Returns whether login attempts with the given username from the client of the
+        current request are throttled due to too many failed attempts.
+
+        Failures are counted per client and per account: the username is resolved to the
+        reset key of the user (the user is only looked up if the client itself is not
+        throttled), so the username and the email address of a user share one counter.
+
+        Arguments:
+            username (str): The entered username.
+
+        Returns:
+            `True` if the login attempt must be rejected, `False` otherwise.
+        """
+        if self.login_throttle is None:
+            return False
+
+        if not self.login_throttle.is_allowed(self._client_key_getter()):
+            return True
+
+        user: Optional[UserMixin] = self.get_user(username)
+        return user is not None and self._is_account_throttled(user)
+
     def login_user(self, data: "LoginData") -> bool:
         """
         Logs in the user (through the application's login manager) described by
@@ -297,26 +900,152 @@ class UserHandler(object):
 
         Returns:
             `True` if the login data corresponds to an existing user and the
-            entered password is correct, `False` otherwise.
+            entered password is correct, `False` otherwise (including the case
+            when the login attempt is throttled).
+
+        Raises:
+            HashingQueueFullError: If the queue of the hashing executor is full.
         """
+        if self.login_throttle is not None and not self.login_throttle.is_allowed(self._client_key_getter()):
+            return False
+
+        if not self.check_login_challenge(data, consume=True):
+            return False
+
         user = self.get_user(data.username)
+        if user is not None and self._is_account_throttled(user):
+            return False
+
         if user is None:
+            if self.equalize_login_timing:
+                self._verify_login_password(
+                    data,
+                    self.prepare_dummy_hash() if self.client_prehashing is None or self.client_prehashing.migrate
+                    else self.client_prehashing.create_dummy_hash()
+                )
+            self._record_login_failure(None)
             return False
 
-        from passlib.hash import argon2
+        password_hash: str = self._password_getter(user)
+        if not self._verify_login_password(data, password_hash):
+            self._record_login_failure(user)
+            return False
 
-        try:
-            if argon2.verify(data.password, self._password_getter(user)) and\
-                (self._verification_checker is None or self._verification_checker(user)):
-                from flask_login import login_user
-                login_user(user, remember=data.remember)
-                return True
-        except Exception:
-            # Catch everything the verify method can raise.
-            pass
+        if self._verification_checker is None or self._verification_checker(user):
+            from flask_login import login_user
+            login_user(user, remember=data.remember)
+            prehashing: Optional[ClientPrehashing] = self.client_prehashing
+            if prehashing is not None and not prehashing.is_prehash(password_hash):
+                self._migrate_password(user, data, password_hash)
+            elif self.rehash_on_login and self.password_needs_update(password_hash):
+                self._rehash_password(user, data.password, password_hash)
+            return True
 
         return False
 
+    def login_user_with_token(self, token: str, remember: bool = False) -> bool:
+        """
+        Logs in the user (through the application's login manager) the given login token
+        belongs to.
+
+        The token is verified with a single HMAC check, there is no password verification.
+
+        Arguments:
+            token (str): The encoded login token from the login link.
+            remember (bool): Whether to remember the user after the session expires.
+
+        Returns:
+            `True` if the token is valid and the corresponding user has been logged in,
+            `False` otherwise.
+        """
+        user: Optional[UserMixin] = self.get_user_for_login_token(token)
+        if user is None:
+            return False
+
+        if self._verification_checker is None or self._verification_checker(user):
+            if not self.consume_token(token):
+                return False
+
+            from flask_login import login_user
+            login_user(user, remember=remember)
+            return True
+
+        return False
+
+    def password_needs_update(self, password_hash: str) -> bool:
+        """
+        Returns whether the given password hash was created with outdated parameters
+        and should be replaced.
+
+        Arguments:
+            password_hash (str): The password hash to check.
+
+        Returns:
+            `True` if the hash should be replaced, `False` otherwise.
+        """
+        return self.password_hasher.needs_update(password_hash)
+
+    def prepare_dummy_hash(self) -> str:
+        """
+        Returns the dummy hash that is used to equalize the timing of logins with an unknown
+        username, computing it with the current password hasher if necessary.
+
+        The dummy hash is computed lazily on first use, but it is recommended to call this
+        method at application start when `equalize_login_timing` is enabled, so the first
+        unknown-user login does not pay for an extra hash computation.
+
+        Returns:
+            The dummy hash that matches the parameters of the current password hasher.
+        """
+        hasher: PasswordHasher = self.password_hasher
+        dummy_hash: Optional[Tuple[PasswordHasher, str]] = self._dummy_hash
+        if dummy_hash is None or dummy_hash[0] is not hasher:
+            from secrets import token_urlsafe
+            dummy_hash = (hasher, hasher.hash(token_urlsafe(32)))
+            self._dummy_hash = dummy_hash
+
+        return dummy_hash[1]
+
+    def render_email(self, kind: str, user: UserMixin, link: str) -> RenderedEmail:
+        """
+        Renders the email of the given kind with the email templates of the user handler.
+
+        Arguments:
+            kind (str): The kind of the email, see `user_blueprint.outbox`.
+            user (UserMixin): The user to render the email for. The user is assumed to have
+                              a `username` and an `email` property.
+            link (str): The link the email contains.
+
+        Returns:
+            The rendered email (subject, plain text and HTML body).
+        """
+        return self.email_templates.render(kind, user, link)
+
+    def send_login_link_email(self, email: str) -> bool:
+        """
+        Sends a login link to the given user.
+
+        Arguments:
+            email (str): The email address of the user to send the login link to.
+
+        Returns:
+            `True` if the login link email has been sent successfully, `False` otherwise
+            (including the case when passwordless login is not enabled).
+        """
+        from time import time
+
+        if self._login_link_email_sender is None:
+            return False
+
+        user: UserMixin = self.get_user(email)
+        if user is None:
+            return False
+
+        expires_at: float = time() + 600
+        token: str = self._create_token("login_key", user, 600)
+
+        return self._send_email(LOGIN_LINK_EMAIL, user, self._build_link("login_link", token), expires_at)
+
     def send_password_reset_email(self, email: str) -> bool:
         """
         Send a password reset email to the given user.
@@ -326,20 +1055,37 @@ class UserHandler(object):
 
         Returns:
             `True` if the reset email has been sent successfully, `False` otherwise.
+            If the address is in its cooldown period, the result of the first request.
         """
         from time import time
-        import jwt
 
-        user: UserMixin = self.get_user(email)
+        cooldown: Optional[ResetRequestCooldown] = self.reset_request_cooldown
+        if cooldown is not None:
+            recent: Optional[RecentResetRequest] = cooldown.get(email)
+            if recent is not None:
+                if not cooldown.resend or recent.token is None:
+                    return recent.sent
+
+                user: Optional[UserMixin] = self._user_by_reset_key_getter(recent.key)
+                store: Optional[ConsumedTokenStore] = self.consumed_token_store
+                if user is not None and (store is None or not store.is_consumed(get_token_id(recent.token))):
+                    return self._send_email(
+                        PASSWORD_RESET_EMAIL, user, self._build_link("reset", recent.token), recent.expires_at
+                    )
+
+        user = self.get_user(email)
         if user is None:
+            # Unknown addresses are not remembered, the address may be registered at any time.
             return False
 
-        token: bytes = jwt.encode(
-            {"reset_key": self._reset_key_getter(user), "exp": time() + 600},
-            self.token_signing_key
-        )
+        expires_at: float = time() + 600
+        token: str = self._create_token("reset_key", user, 600)
+        sent: bool = self._send_email(PASSWORD_RESET_EMAIL, user, self._build_link("reset", token), expires_at)
+        if cooldown is not None and sent:
+            # Failed requests are not remembered, so the user can try again right away.
+            cooldown.put(email, True, self._reset_key_getter(user), token, expires_at)
 
-        return self._password_reset_email_sender(user, url_for(".reset", token=token, _external=True))
+        return sent
 
     def update_password(self, user: UserMixin, password_hash: str) -> bool:
         """
@@ -352,8 +1098,38 @@ class UserHandler(object):
         Returns:
             `True` if the password has been updated successfully, `False` otherwise.
         """
+        if self.reset_token_cache is not None:
+            self.reset_token_cache.invalidate_key(self._reset_key_getter(user))
+        if self.reset_request_cooldown is not None:
+            self.reset_request_cooldown.invalidate_key(self._reset_key_getter(user))
+
         return self._password_updater(user, password_hash)
 
+    def verify_password(self, password: str, password_hash: str, category: str = LOGIN) -> bool:
+        """
+        Returns whether the given password matches the given hash.
+
+        Arguments:
+            password (str): The password to verify.
+            password_hash (str): The hash to verify the password against.
+            category (str): The scheduling category of the verification job, see `user_blueprint.hashing`.
+
+        Returns:
+            `True` if the password matches the hash, `False` otherwise (including
+            the case when the hash is malformed).
+
+        Raises:
+            HashingQueueFullError: If the queue of the hashing executor is full.
+        """
+        if self.hashing_executor is None:
+            return self.password_hasher.verify(password, password_hash)
+
+        hasher: PasswordHasher = self.password_hasher
+        return self.hashing_executor.run(
+            hasher.verify, password, password_hash,
+            memory_kib=hasher.memory_kib, category=category, client=self._client_key_getter()
+        )
+
     def verify_registration(self, token: str) -> None:
         """
         Verifies the registration corresponding to the given registration token.
@@ -364,11 +1140,14 @@ class UserHandler(object):
         if self._registration_verifier is None:
             return
 
-        import jwt
+        data: Optional[Mapping] = self.token_codec.decode(token)
+        if data is None or "verification_key" not in data:
+            return
+
         try:
-            data: Mapping = jwt.decode(token, self.token_signing_key)
             user: UserMixin = self.get_user(data["verification_key"])
-            self._registration_verifier(user)
+            if self._is_credential_version_current(user, data):
+                self._registration_verifier(user)
         except:
             pass
 
@@ -387,6 +1166,316 @@ class UserHandler(object):
         """
         return token is not None
 
+    def _build_link(self, endpoint: str, token: str) -> str:
+        """
+        Returns the external link of the given blueprint endpoint with the given token.
+
+        Arguments:
+            endpoint (str): The name of the blueprint endpoint, e.g. `"reset"`.
+            token (str): The token of the link.
+
+        Returns:
+            The link built from `link_base_url` and the link template of the endpoint if
+            the base URL is set, the link built with `url_for()` otherwise.
+        """
+        base_url: Optional[str] = self.link_base_url
+        if base_url is None:
+            return url_for(f".{endpoint}", token=token, _external=True)
+
+        return base_url.rstrip("/") + self.link_templates[endpoint].format(token=token)
+
+    def _create_token(self, claim: str, user: UserMixin, lifetime: float) -> str:
+        """
+        Creates a token for the given user.
+
+        Arguments:
+            claim (str): The claim that holds the reset key of the user and determines
+                         the purpose of the token.
+            user (UserMixin): The user to create the token for.
+            lifetime (float): The number of seconds the token is valid for.
+
+        Returns:
+            The encoded token.
+        """
+        from time import time
+
+        payload: Dict[str, Any] = {claim: self._reset_key_getter(user), "exp": time() + lifetime}
+        if self._credential_version_getter is not None:
+            payload["cv"] = str(self._credential_version_getter(user))
+
+        return self.token_codec.encode(payload)
+
+    def _decode_single_use_token(self, token: str, claim: str) -> Optional[Mapping]:
+        """
+        Decodes the given single-use token.
+
+        Arguments:
+            token (str): The encoded token to decode.
+            claim (str): The claim the token must have.
+
+        Returns:
+            The payload of the token or `None` if the token is invalid, it does not have
+            the given claim or it has already been consumed.
+        """
+        data: Optional[Mapping] = self.token_codec.decode(token)
+        if data is None or claim not in data:
+            return None
+
+        store: Optional[ConsumedTokenStore] = self.consumed_token_store
+        if store is not None and store.is_consumed(get_token_id(token)):
+            return None
+
+        return data
+
+    def _deliver_email(self, kind: str, user_key: str, link: str) -> bool:
+        """
+        Sends an email of the email outbox.
+
+        Arguments:
+            kind (str): The kind of the email, see `user_blueprint.outbox`.
+            user_key (str): The reset key of the user to send the email to.
+            link (str): The link the email contains.
+
+        Returns:
+            Whether the email has been sent successfully or it does not need to be sent
+            because the user no longer exists.
+        """
+        user: Optional[UserMixin] = self._user_by_reset_key_getter(user_key)
+        return user is None or self._send_email_now(kind, user, link)
+
+    def _get_remote_address(self) -> Optional[str]:
+        """
+        The default client key getter that returns the remote address of the current
+        request or `None` if there is no active request.
+        """
+        from flask import has_request_context, request
+        return request.remote_addr if has_request_context() else None
+
+    def _is_account_throttled(self, user: UserMixin) -> bool:
+        """
+        Returns whether login attempts for the given user are throttled due to too many
+        failed attempts, see `is_login_throttled()`.
+        """
+        return self.login_throttle is not None and\
+            not self.login_throttle.is_allowed(self._client_key_getter(), self._reset_key_getter(user))
+
+    def _is_credential_version_current(self, user: Optional[UserMixin], data: Mapping) -> bool:
+        """
+        Returns whether the given token payload was issued for the current credential
+        version of the given user.
+
+        Arguments:
+            user (Optional[UserMixin]): The user the token belongs to.
+            data (Mapping): The payload of the token.
+
+        Returns:
+            `False` if the user is `None` or the credential version of the token does not
+            match the user's current version, `True` otherwise (including the case when
+            credential versions are not used).
+        """
+        if user is None:
+            return False
+
+        if self._credential_version_getter is None:
+            return True
+
+        return data.get("cv") == str(self._credential_version_getter(user))
+
+    def _record_login_failure(self, user: Optional[UserMixin]) -> None:
+        """
+        Records a failed login attempt for the given user in the login throttle.
+
+        Arguments:
+            user (Optional[UserMixin]): The user whose password was entered incorrectly, `None`
+                                        if there is no such user, in which case the failure is
+                                        only counted for the client.
+        """
+        if self.login_throttle is not None:
+            self.login_throttle.record_failure(
+                self._client_key_getter(), None if user is None else self._reset_key_getter(user)
+            )
+
+    def _send_email(self, kind: str, user: UserMixin, link: str, expires_at: Optional[float] = None) -> bool:
+        """
+        Enqueues the given email into the email outbox, or sends it right away if there
+        is no outbox or the outbox is full.
+
+        Arguments:
+            kind (str): The kind of the email, see `user_blueprint.outbox`.
+            user (UserMixin): The user to send the email to.
+            link (str): The link the email contains.
+            expires_at (Optional[float]): The time the token of the link expires at, the
+                                          outbox drops the email after this time.
+
+        Returns:
+            Whether the email has been enqueued or sent successfully.
+        """
+        outbox: Optional[EmailOutbox] = self._email_outbox
+        if outbox is not None:
+            if outbox.app is None and has_app_context():
+                outbox.app = current_app._get_current_object()
+            try:
+                outbox.enqueue(kind, self._reset_key_getter(user), link, expires_at)
+                return True
+            except OutboxError:
+                pass
+
+        return self._send_email_now(kind, user, link)
+
+    def _send_email_now(self, kind: str, user: UserMixin, link: str) -> bool:
+        """
+        Sends the given email with the configured email sender of its kind.
+
+        Arguments:
+            kind (str): The kind of the email, see `user_blueprint.outbox`.
+            user (UserMixin): The user to send the email to.
+            link (str): The link the email contains.
+
+        Returns:
+            Whether the email has been sent successfully.
+        """
+        if kind == VERIFICATION_EMAIL:
+            # Verification email senders do not report the result.
+            self._verification_email_sender(user, link)
+            return True
+        elif kind == PASSWORD_RESET_EMAIL:
+            return bool(self._password_reset_email_sender(user, link))
+        elif kind == LOGIN_LINK_EMAIL:
+            return bool(self._login_link_email_sender(user, link))
+
+        raise ValueError(f"Unknown email kind: {kind}")
+
+    def _verify_login_password(self, data: "LoginData", password_hash: str) -> bool:
+        """
+        Returns whether the password in the given login data matches the given stored hash.
+
+        Pre-hashing protocol hashes are verified against the client hash of the login data
+        on the request thread, because checking them is cheap. Server-side hashes are verified
+        with the password hasher, unless client-side pre-hashing is enabled without migration.
+        During migration, pre-hashing protocol hashes are also verified against the dummy hash
+        if `equalize_login_timing` is enabled, see `equalize_login_timing`.
+
+        Arguments:
+            data (LoginData): The login data to verify.
+            password_hash (str): The stored hash of the user.
+        """
+        prehashing: Optional[ClientPrehashing] = self.client_prehashing
+        if prehashing is not None:
+            if prehashing.is_prehash(password_hash):
+                if self.equalize_login_timing and prehashing.migrate:
+                    self.verify_password(data.password, self.prepare_dummy_hash())
+                return prehashing.verify(data.client_hash, password_hash)
+            if not prehashing.migrate:
+                return False
+
+        return self.verify_password(data.password, password_hash)
+
+    def _migrate_password(self, user: UserMixin, data: "LoginData", password_hash: str) -> None:
+        """
+        Replaces the server-side password hash of the given, successfully logged in user
+        with a client-side pre-hashing protocol hash if the login data contains a client hash
+        that was computed with the user's salt.
+
+        The client hash is only stored once it is verified to be the client hash of the
+        (already verified) password, which requires a PBKDF2 computation on the server.
+        The verification is done the same way as rehashing, see `_rehash_password()`.
+
+        Arguments:
+            user (UserMixin): The user whose password hash is to be replaced.
+            data (LoginData): The login data of the user.
+            password_hash (str): The stored hash the password has been verified against.
+        """
+        prehashing: ClientPrehashing = self.client_prehashing
+        if data.salt != prehashing.get_salt(user.username):
+            return
+
+        try:
+            prehash: str = prehashing.hash(data.client_hash, data.salt)
+        except ValueError:
+            return
+
+        # The prehash is created here, so the secret key of the protocol is never sent
+        # to the hashing executor's (possibly separate) worker processes.
+        self._replace_password_hash(
+            user, password_hash, _create_prehash,
+            prehash, data.password, data.salt, prehashing.iterations, data.client_hash
+        )
+
+    def _rehash_password(self, user: UserMixin, password: str, password_hash: str) -> None:
+        """
+        Replaces the stored password hash of the given user with a new hash of the given
+        password that is created with the current password hasher.
+
+        If the user handler has a hashing executor, the new hash is computed in the background
+        and the password is updated (within the current application's context) once the hash
+        is ready, so the login request does not have to wait for a second hash computation.
+        Rehashing is skipped if the hashing executor is saturated, it will be retried on the
+        user's next login.
+
+        The background update reloads the user by its reset key and only stores the new hash
+        if the stored hash is still the one the password has been verified against, so a
+        password change that happens while the hash is computed is never overwritten.
+
+        Arguments:
+            user (UserMixin): The user whose password hash is to be updated.
+            password (str): The verified password of the user.
+            password_hash (str): The stored hash the password has been verified against.
+        """
+        hasher: PasswordHasher = self.password_hasher
+        self._replace_password_hash(user, password_hash, hasher.hash, password, memory_kib=hasher.memory_kib)
+
+    def _replace_password_hash(self,
+                               user: UserMixin,
+                               password_hash: str,
+                               create_hash: Callable[..., Optional[str]],
+                               *args: Any,
+                               memory_kib: int = 0) -> None:
+        """
+        Replaces the given stored password hash of the given user with the hash
+        `create_hash(*args)` returns, unless it returns `None`.
+
+        The new hash is created on the request thread if the user handler has no hashing
+        executor, otherwise in the background, see `_rehash_password()`. `create_hash` and
+        `args` must be picklable if the hashing executor uses processes.
+
+        Arguments:
+            user (UserMixin): The user whose password hash is to be replaced.
+            password_hash (str): The stored hash the password has been verified against.
+            create_hash (Callable[..., Optional[str]]): Function that creates the new hash.
+            args (Any): The positional arguments to call `create_hash` with.
+            memory_kib (int): The amount of memory (in KiB) `create_hash` allocates.
+        """
+        if self.hashing_executor is None:
+            new_hash: Optional[str] = create_hash(*args)
+            if new_hash is not None:
+                self.update_password(user, new_hash)
+            return
+
+        if self.hashing_executor.is_saturated(REHASH):
+            return
+
+        app: Any = current_app._get_current_object()
+        user_key: str = self._reset_key_getter(user)
+
+        def on_done(future: Future) -> None:
+            with app.app_context():
+                try:
+                    new_hash: Optional[str] = future.result()
+                    if new_hash is None:
+                        return
+                    current_user: Optional[UserMixin] = self._user_by_reset_key_getter(user_key)
+                    if current_user is not None and self._password_getter(current_user) == password_hash:
+                        self.update_password(current_user, new_hash)
+                except Exception:
+                    app.logger.exception("Failed to update the replaced password hash.")
+
+        try:
+            future: Future = self.hashing_executor.submit(create_hash, *args, memory_kib=memory_kib, category=REHASH)
+        except HashingError:
+            return
+
+        future.add_done_callback(on_done)
+
 
 class LoginForm(FlaskForm):
     """
@@ -401,8 +1490,26 @@ class LoginForm(FlaskForm):
         validators=[DataRequired(), Length(min=5, max=40)])
     password = PasswordField(
         "Password",
-         validators=[DataRequired(), Length(min=8, max=40)])
+         validators=[Length(max=40)])
     remember = BooleanField("Remember me")
+    challenge = HiddenField("Challenge")
+    challenge_solution = HiddenField("Challenge solution")
+    client_hash = HiddenField("Client hash", validators=[Regexp(f"^(?:{CLIENT_HASH_REGEX})?$")])
+    salt = HiddenField("Salt", validators=[Regexp(f"^(?:{SALT_REGEX})?$")])
+
+    # Additional validator methods
+    # ------------------------------------------------------------
+
+    def validate_password(self, password: PasswordField) -> None:
+        """
+        Validates the given `password`.
+
+        The password may only be omitted if the browser sent its client hash instead.
+
+        The method is automatically called by the form's `validate_on_submit()` method.
+        """
+        if not self.client_hash.data and len(password.data or "") < 8:
+            raise ValidationError("Field must be between 8 and 40 characters long.")
 
 
 class LoginData(NamedTuple):
@@ -428,6 +1535,26 @@ class LoginData(NamedTuple):
     Whether the user checked the remember field.
     """
 
+    challenge: str = ""
+    """
+    The proof-of-work challenge the client solved (if any).
+    """
+
+    challenge_solution: str = ""
+    """
+    The solution of the proof-of-work challenge.
+    """
+
+    client_hash: str = ""
+    """
+    The client hash of the entered password if the browser computed it.
+    """
+
+    salt: str = ""
+    """
+    The salt the browser used to compute the client hash.
+    """
+
     # Static methods
     # ------------------------------------------------------------
 
@@ -439,10 +1566,22 @@ class LoginData(NamedTuple):
         return LoginData(
             username=form.username.data.lower(),
             password=form.password.data,
-            remember=form.remember.data
+            remember=form.remember.data,
+            challenge=form.challenge.data or "",
+            challenge_solution=form.challenge_solution.data or "",
+            client_hash=form.client_hash.data or "",
+            salt=form.salt.data or ""
         )
 
 
+class LoginLinkForm(FlaskForm):
+    """
+    Form that confirms a login with an emailed login link.
+    """
+
+    remember = BooleanField("Remember me")
+
+
 class PasswordResetForm(FlaskForm):
     """
     Form where the user can reset her or his password.
@@ -454,6 +1593,8 @@ class PasswordResetForm(FlaskForm):
     password2 = PasswordField(
         "Repeat Password",
         validators=[EqualTo("password", "Field must be equal to Password.")])
+    client_hash = HiddenField("Client hash", validators=[Regexp(f"^(?:{CLIENT_HASH_REGEX})?$")])
+    salt = HiddenField("Salt", validators=[Regexp(f"^(?:{SALT_REGEX})?$")])
 
 
 class RegistrationForm(FlaskForm):
@@ -482,6 +1623,8 @@ class RegistrationForm(FlaskForm):
     password2 = PasswordField(
         "Repeat Password",
         validators=[EqualTo("password", "Field must be equal to Password.")])
+    client_hash = HiddenField("Client hash", validators=[Regexp(f"^(?:{CLIENT_HASH_REGEX})?$")])
+    salt = HiddenField("Salt", validators=[Regexp(f"^(?:{SALT_REGEX})?$")])
 
     # Initialization
     # ------------------------------------------------------------
@@ -501,6 +1644,16 @@ class RegistrationForm(FlaskForm):
         The user handler to use to check the availability of the chosen username and email address.
         """
 
+    # Properties
+    # ------------------------------------------------------------
+
+    @property
+    def user_handler(self) -> UserHandler:
+        """
+        The user handler the form is using.
+        """
+        return self._user_handler
+
     # Additional validator methods
     # ------------------------------------------------------------
 
@@ -553,7 +1706,7 @@ class RegistrationData(NamedTuple):
 
     password: str
     """
-    The Argon2 hash of the entered password.
+    The hash of the entered password.
     """
 
     # Static methods
@@ -563,18 +1716,31 @@ class RegistrationData(NamedTuple):
     def from_form(form: RegistrationForm) -> "RegistrationData":
         """
         Returns the registration data for the given registration form.
-        """
-        from passlib.hash import argon2
 
+        The password (or its client hash) is hashed by the user handler of the form.
+        """
         return RegistrationData(
             username=form.username.data.lower(),
             email=form.email.data.lower(),
             first_name=form.first_name.data.title(),
             last_name=form.last_name.data.title(),
-            password=argon2.hash(form.password.data)
+            password=form.user_handler.hash_password(
+                form.password.data,
+                client_hash=form.client_hash.data or "",
+                salt=form.salt.data or "",
+                username=form.username.data
+            )
         )
 
 
+class RequestLoginLinkForm(FlaskForm):
+    """
+    Login link request form.
+    """
+
+    email = StringField("Email", validators=[DataRequired(), Email()])
+
+
 class RequestPasswordResetForm(FlaskForm):
     """
     Password reset request form.
@@ -589,19 +1755,14 @@ class RequestPasswordResetForm(FlaskForm):
 
 def console_verification_email_sender(user: Any, verification_link: str) -> None:
     """
-    Registration verification email sender method that prints a message to the console.
+    Registration verification email sender method that prints the email to the console.
 
     Arguments:
         user (Any): The user to send the verification email to. The user is assumed to have a
                     `username` and an `email` property.
         verification_link (str): The user's verification link.
     """
-    print(
-        f"Email sent to {user.username}"
-        f"  Dear {user.username}\n"
-        f"  Please verify your email address and complete your registration "
-        f"by opening this link: {verification_link}.\n  Thank you!"
-    )
+    _print_email(VERIFICATION_EMAIL, user, verification_link)
 
 
 def console_password_reset_email_sender(user: Any, reset_link: str) -> bool:
@@ -616,10 +1777,55 @@ def console_password_reset_email_sender(user: Any, reset_link: str) -> bool:
     Returns:
         Whether the reset email has been sent successfully.
     """
-    print(
-        f"Email sent to {user.username}"
-        f"  Dear {user.username}\n"
-        f"  You have requested a password reset. Please open this link to change your password: "
-        f"{reset_link}\n  Thank you!"
-    )
+    _print_email(PASSWORD_RESET_EMAIL, user, reset_link)
+    return True
+
+
+def console_login_link_email_sender(user: Any, login_link: str) -> bool:
+    """
+    Sends the login link email with the given login link to the user.
+
+    Arguments:
+        user (Any): The user to send the login link email to. The user is assumed to have
+                    a `username` and an `email` property.
+        login_link (str): The user's login link.
+
+    Returns:
+        Whether the login link email has been sent successfully.
+    """
+    _print_email(LOGIN_LINK_EMAIL, user, login_link)
     return True
+
+
+def _create_prehash(prehash: str, password: str, salt: str, iterations: int, client_hash: str) -> Optional[str]:
+    """
+    Returns the given pre-hashing protocol hash if the given client hash is the client hash
+    of the given password with the given salt and number of iterations, `None` otherwise.
+
+    The function is executed by the hashing executor when a password is migrated to
+    client-side pre-hashing, so it must be picklable.
+
+    Arguments:
+        prehash (str): The pre-hashing protocol hash that was created from the client hash.
+        password (str): The verified password of the user.
+        salt (str): The salt the client hash was computed with.
+        iterations (int): The number of PBKDF2 iterations of the client hash.
+        client_hash (str): The client hash the browser computed.
+    """
+    return prehash if compare_digest(compute_client_hash(password, salt, iterations), client_hash) else None
+
+
+def _print_email(kind: str, user: Any, link: str) -> None:
+    """
+    Renders the email of the given kind with the `email_templates` of the blueprint's
+    user handler and prints its plain text version to the console.
+
+    Arguments:
+        kind (str): The kind of the email, see `user_blueprint.outbox`.
+        user (Any): The user to send the email to.
+        link (str): The link the email contains.
+    """
+    from user_blueprint.blueprint import user_handler
+    email: RenderedEmail = user_handler.render_email(kind, user, link)
+    lines: List[str] = [f"  {line}" if line else line for line in email.text.splitlines()]
+    print(f"Email sent to {user.username}: {email.subject}\n" + "\n".join(lines))
@@ -0,0 +1,26 @@
+"""
+Test configuration that makes the package importable from the source tree.
+"""
+
+
+# Imports
+# ----------------------------------------
+
+
+import sys
+
+from os import path
+
+
+# Metadata
+# ------------------------------------------------------------
+
+
+__author__ = "Peter Volf"
+
+
+# Entry
+# ------------------------------------------------------------
+
+
+sys.path.insert(0, path.join(path.dirname(path.dirname(path.abspath(__file__))), "src"))
@@ -0,0 +1,206 @@
+"""
+Tests of the views of the user blueprint.
+"""
+
+
+# Imports
+# ----------------------------------------
+
+
+from flask import Flask
+
+from flask_login import LoginManager, UserMixin
+
+import pytest
+
+from user_blueprint.blueprint import user_blueprint, user_handler
+from user_blueprint.hashers import ScryptHasher
+from user_blueprint.hashing import HashingExecutor
+from user_blueprint.prehashing import ClientPrehashing
+from user_blueprint.throttling import LoginThrottle
+from user_blueprint.token_store import MemoryConsumedTokenStore
+
+
+# Typing imports
+# ----------------------------------------
+
+
+from typing import Dict, Iterator, List, Optional, Tuple
+
+
+# Metadata
+# ------------------------------------------------------------
+
+
+__author__ = "Peter Volf"
+
+
+# Classes
+# ------------------------------------------------------------
+
+
+class User(UserMixin):
+    """
+    In-memory user.
+    """
+
+    def __init__(self, username: str, email: str, password: str) -> None:
+        self.id: str = username
+        self.username: str = username
+        self.email: str = email
+        self.password: str = password
+
+
+class Site(object):
+    """
+    Test application with an in-memory user database that is connected to the blueprint's
+    user handler.
+    """
+
+    def __init__(self) -> None:
+        self.users: Dict[str, User] = {}
+        self.emails: List[Tuple[str, str]] = []
+
+        self.app: Flask = Flask(__name__)
+        self.app.secret_key = "test-secret"
+        self.app.config["WTF_CSRF_ENABLED"] = False
+        self.app.register_blueprint(user_blueprint, url_prefix="/auth")
+        self.app.add_url_rule("/", "index", lambda: "index")
+        login_manager = LoginManager(self.app)
+        login_manager.user_loader(self.users.get)
+
+        user_handler.__init__()
+        user_handler.hashing_executor = None
+        user_handler.password_hasher = ScryptHasher(log_n=4)
+        user_handler.token_signing_key = "test-secret-" * 8
+        user_handler.consumed_token_store = MemoryConsumedTokenStore()
+        user_handler.user_getter(self.get_user)
+        user_handler.user_by_reset_key_getter(self.get_user)
+        user_handler.reset_key_getter(lambda user: user.email)
+        user_handler.password_getter(lambda user: user.password)
+        user_handler.password_updater(self.update_password)
+        user_handler.login_link_email_sender(lambda user, link: self.emails.append((user.email, link)) or True)
+        user_handler.password_reset_email_sender(lambda user, link: self.emails.append((user.email, link)) or True)
+
+        self.client = self.app.test_client()
+
+    def add_user(self, username: str = "alice123", password: str = "password123") -> User:
+        user = User(username, f"{username}@example.com", user_handler.hash_password(password))
+        self.users[username] = user
+        return user
+
+    def get_user(self, identifier: str) -> Optional[User]:
+        for user in self.users.values():
+            if identifier in (user.username, user.email):
+                return user
+        return None
+
+    def last_link_path(self) -> str:
+        return self.emails[-1][1].split("localhost", 1)[1]
+
+    def update_password(self, user: User, password_hash: str) -> bool:
+        user.password = password_hash
+        return True
+
+
+# Methods
+# ------------------------------------------------------------
+
+
+@pytest.fixture
+def site() -> Iterator[Site]:
+    site = Site()
+    yield site
+    if user_handler.hashing_executor is not None:
+        user_handler.hashing_executor.shutdown()
+    user_handler.__init__()
+
+
+def login(site: Site, username: str = "alice123", password: str = "password123"):
+    return site.client.post("/auth/login", data={"username": username, "password": password})
+
+
+def test_login(site: Site) -> None:
+    site.add_user()
+
+    assert login(site, password="wrong-password").status_code == 200
+    response = login(site)
+    assert response.status_code == 302 and response.headers["Location"] == "/"
+
+
+def test_login_throttled(site: Site) -> None:
+    site.add_user()
+    user_handler.login_throttle = LoginThrottle(max_failures_per_client=100, max_failures_per_username=2)
+
+    assert login(site, password="wrong-password").status_code == 200
+    assert login(site, "alice123@example.com", "wrong-password").status_code == 200
+    response = login(site)
+    assert response.status_code == 429
+    assert b"Too many failed login attempts" in response.data
+
+
+def test_login_busy(site: Site) -> None:
+    site.add_user()
+    user_handler.hashing_executor = HashingExecutor(max_workers=1, shed_queue_length=0)
+
+    response = login(site)
+    assert response.status_code == 503
+    assert int(response.headers["Retry-After"]) >= 1
+
+
+def test_login_link_is_consumed_on_post(site: Site) -> None:
+    site.add_user()
+    assert site.client.post("/auth/request_login_link", data={"email": "alice123@example.com"}).status_code == 200
+    path = site.last_link_path()
+
+    # Opening the link (for example by a link scanner) does not log in or consume the token.
+    for _ in range(2):
+        response = site.client.get(path)
+        assert response.status_code == 200 and b"Log In" in response.data
+
+    response = site.client.post(path)
+    assert response.status_code == 302 and response.headers["Location"] == "/"
+
+    site.client.get("/auth/logout")
+    response = site.client.post(path)
+    assert response.status_code == 302 and response.headers["Location"] == "/auth/request_login_link"
+    assert site.client.get(path).headers["Location"] == "/auth/request_login_link"
+
+
+def test_reset_token_is_single_use(site: Site) -> None:
+    user = site.add_user()
+    site.client.post("/auth/request_password_reset", data={"email": "alice123@example.com"})
+    path = site.last_link_path()
+
+    assert site.client.get(path).status_code == 200
+    response = site.client.post(path, data={"password": "new-password1", "password2": "new-password1"})
+    assert response.status_code == 302
+    assert user_handler.verify_password("new-password1", user.password)
+
+    response = site.client.post(path, data={"password": "new-password2", "password2": "new-password2"})
+    assert response.status_code == 302 and response.headers["Location"] == "/auth/login"
+    assert user_handler.verify_password("new-password1", user.password)
+
+
+def test_reset_busy(site: Site) -> None:
+    site.add_user()
+    site.client.post("/auth/request_password_reset", data={"email": "alice123@example.com"})
+    user_handler.hashing_executor = HashingExecutor(max_workers=1, shed_queue_length=0)
+
+    response = site.client.post(site.last_link_path(), data={"password": "new-password1", "password2": "new-password1"})
+    assert response.status_code == 503
+
+
+def test_prehash_parameters(site: Site) -> None:
+    site.add_user()
+    assert site.client.get("/auth/prehash_parameters?identifier=alice123").status_code == 404
+
+    prehashing = ClientPrehashing("prehash-secret-" * 4, iterations=1000)
+    user_handler.client_prehashing = prehashing
+    assert site.client.get("/auth/prehash_parameters?identifier=abc").status_code == 400
+
+    by_username = site.client.get("/auth/prehash_parameters?identifier=alice123").get_json()
+    by_email = site.client.get("/auth/prehash_parameters?identifier=alice123@example.com").get_json()
+    unknown = site.client.get("/auth/prehash_parameters?identifier=unknown1").get_json()
+    assert by_username == by_email == {"salt": prehashing.get_salt("alice123"), "iterations": 1000}
+    assert unknown == {"salt": prehashing.get_salt("unknown1"), "iterations": 1000}
@@ -0,0 +1,81 @@
+"""
+Tests of the proof-of-work login challenges.
+"""
+
+
+# Imports
+# ----------------------------------------
+
+
+from user_blueprint.challenge import ProofOfWorkChallenge, solve
+
+
+# Metadata
+# ------------------------------------------------------------
+
+
+__author__ = "Peter Volf"
+
+
+# Global properties
+# ------------------------------------------------------------
+
+
+SECRET: str = "test-secret-" * 8
+"""
+The signing key of the challenges.
+"""
+
+
+# Methods
+# ------------------------------------------------------------
+
+
+def test_get_difficulty() -> None:
+    challenges = ProofOfWorkChallenge(SECRET, threshold_queue_depth=8, base_difficulty=4,
+                                      max_difficulty=6, difficulty_step=2)
+
+    assert challenges.get_difficulty(7) == 0
+    assert challenges.get_difficulty(8) == 4
+    assert challenges.get_difficulty(10) == 5
+    assert challenges.get_difficulty(1000) == 6
+
+
+def test_verify_solution() -> None:
+    challenges = ProofOfWorkChallenge(SECRET, base_difficulty=8)
+    challenge = challenges.issue(8)
+    solution = solve(challenge)
+
+    assert solution is not None
+    assert challenges.verify(challenge, solution)
+    assert not ProofOfWorkChallenge("other-secret-" * 8).verify(challenge, solution)
+    assert not challenges.verify(challenge.replace("8.", "1.", 1), solution)
+    assert not challenges.verify(challenge, solution, min_difficulty=9)
+
+
+def test_verify_consumes_challenge() -> None:
+    challenges = ProofOfWorkChallenge(SECRET, base_difficulty=4)
+    challenge = challenges.issue(4)
+    solution = solve(challenge)
+
+    assert challenges.verify(challenge, solution, consume=True)
+    assert not challenges.verify(challenge, solution, consume=True)
+    assert not challenges.verify(challenge, solution)
+
+
+def test_verify_rejects_expired_challenge() -> None:
+    challenges = ProofOfWorkChallenge(SECRET, base_difficulty=4, ttl=-1)
+    challenge = challenges.issue(4)
+
+    assert not challenges.verify(challenge, solve(challenge))
+
+
+def test_verify_rejects_malformed_input() -> None:
+    challenges = ProofOfWorkChallenge(SECRET, base_difficulty=1)
+    challenge = challenges.issue(1)
+
+    for solution in ("", "-1", "1.5", "²", "٣", "1" * 21, " 1"):
+        assert not challenges.verify(challenge, solution), solution
+
+    for malformed in ("", "not a challenge", "١.١.nonce.signature", challenge + "é", challenge[:-1] + "é"):
+        assert not challenges.verify(malformed, "1"), malformed
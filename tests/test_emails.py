@@ -0,0 +1,94 @@
+"""
+Tests of the precompiled email templates.
+"""
+
+
+# Imports
+# ----------------------------------------
+
+
+from jinja2 import TemplateNotFound
+
+import pytest
+
+from user_blueprint.emails import EmailTemplates
+
+
+# Typing imports
+# ----------------------------------------
+
+
+from pathlib import Path
+
+
+# Metadata
+# ------------------------------------------------------------
+
+
+__author__ = "Peter Volf"
+
+
+# Classes
+# ------------------------------------------------------------
+
+
+class User(object):
+    """
+    User with the properties the email templates use.
+    """
+
+    def __init__(self, username: str, email: str) -> None:
+        self.username: str = username
+        self.email: str = email
+
+
+# Methods
+# ------------------------------------------------------------
+
+
+@pytest.mark.parametrize("kind", ["login_link", "password_reset", "verification"])
+def test_render_built_in_templates(kind: str) -> None:
+    email = EmailTemplates().render(kind, User("alice123", "alice@example.com"), "https://example.com/t/abc")
+
+    assert email.subject
+    assert "alice123" in email.text
+    assert "https://example.com/t/abc" in email.text
+    assert email.html is not None and 'href="https://example.com/t/abc"' in email.html
+
+
+def test_render_escapes_html_block_only() -> None:
+    email = EmailTemplates().render("login_link", User("<b>bob</b>", "bob@example.com"), "https://e.com/?a=1&b=2")
+
+    assert "<b>bob</b>" in email.text
+    assert "https://e.com/?a=1&b=2" in email.text
+    assert "&lt;b&gt;bob&lt;/b&gt;" in email.html and "<b>bob</b>" not in email.html
+    assert "https://e.com/?a=1&amp;b=2" in email.html
+
+
+def test_render_matches_jinja_for_transformed_fields(tmp_path: Path) -> None:
+    (tmp_path / "custom.jinja").write_text(
+        "{% block subject %}Hi {{ username|upper }} from {{ site }}{% endblock %}\n"
+        "{% block text %}{{ username }} <{{ email }}>: {{ link }}{% endblock %}\n"
+    )
+    templates = EmailTemplates(str(tmp_path), context={"site": "Example"})
+
+    for username in ("alice123", "<b>bob</b>"):
+        email = templates.render("custom", User(username, f"{username}@example.com"), "https://e.com/x")
+        assert email.subject == f"Hi {username.upper()} from Example"
+        assert email.text == f"{username} <{username}@example.com>: https://e.com/x"
+        assert email.html is None
+
+
+def test_clear_reloads_context(tmp_path: Path) -> None:
+    (tmp_path / "custom.jinja").write_text("{% block subject %}{{ site }}{% endblock %}")
+    templates = EmailTemplates(str(tmp_path), context={"site": "First"})
+    assert templates.render_fields("custom", ("a", "b", "c")).subject == "First"
+
+    templates.context["site"] = "Second"
+    templates.clear()
+    assert templates.render_fields("custom", ("a", "b", "c")).subject == "Second"
+
+
+def test_missing_template() -> None:
+    with pytest.raises(TemplateNotFound):
+        EmailTemplates().render_fields("unknown", ("a", "b", "c"))
@@ -0,0 +1,192 @@
+"""
+Tests of the job queues and the hashing executor.
+"""
+
+
+# Imports
+# ----------------------------------------
+
+
+from threading import Event
+
+import pytest
+
+from user_blueprint.hashing import LOGIN, REGISTRATION, RESET,\
+                                   FairJobQueue, HashingExecutor, HashingJob, HashingQueueFullError, PriorityJobQueue
+
+
+# Typing imports
+# ----------------------------------------
+
+
+from typing import Any, List, Optional
+
+
+# Metadata
+# ------------------------------------------------------------
+
+
+__author__ = "Peter Volf"
+
+
+# Methods
+# ------------------------------------------------------------
+
+
+def create_job(category: str = LOGIN, client: Optional[str] = None, name: str = "") -> HashingJob:
+    return HashingJob(lambda: name, (), category=category, client=client)
+
+
+def drain(queue: Any) -> List[HashingJob]:
+    result = []
+    while len(queue) > 0:
+        result.append(queue.pop())
+    return result
+
+
+def test_fair_queue_round_robin() -> None:
+    queue = FairJobQueue()
+    for index in range(4):
+        queue.push(create_job(client="a", name=f"a{index}"))
+    queue.push(create_job(client="b", name="b0"))
+    queue.push(create_job(client="c", name="c0"))
+
+    assert len(queue) == 6
+    assert queue.depth("a") == 4
+    assert [job.fn() for job in drain(queue)] == ["a0", "b0", "c0", "a1", "a2", "a3"]
+    assert queue.peek() is None
+    with pytest.raises(IndexError):
+        queue.pop()
+
+
+def test_fair_queue_quantum() -> None:
+    queue = FairJobQueue(quantum=2)
+    for index in range(3):
+        queue.push(create_job(client="a", name=f"a{index}"))
+        queue.push(create_job(client="b", name=f"b{index}"))
+
+    assert queue.peek().fn() == "a0"
+    assert [job.fn() for job in drain(queue)] == ["a0", "a1", "b0", "b1", "a2", "b2"]
+
+
+def test_fair_queue_invalid_quantum() -> None:
+    with pytest.raises(ValueError):
+        FairJobQueue(quantum=0)
+
+
+def test_priority_queue_weights() -> None:
+    queue = PriorityJobQueue({LOGIN: 4, REGISTRATION: 1})
+    for _ in range(10):
+        queue.push(create_job(LOGIN))
+        queue.push(create_job(REGISTRATION))
+
+    assert queue.depths() == {LOGIN: 10, REGISTRATION: 10}
+    first = [job.category for job in (queue.pop() for _ in range(10))]
+    assert first.count(LOGIN) == 8
+    assert first.count(REGISTRATION) == 2
+
+
+def test_priority_queue_idle_category_gets_no_credit() -> None:
+    queue = PriorityJobQueue({LOGIN: 1, RESET: 1})
+    for _ in range(10):
+        queue.push(create_job(LOGIN))
+    for _ in range(8):
+        queue.pop()
+
+    # The reset category was idle, it must not be served eight times in a row now.
+    for _ in range(4):
+        queue.push(create_job(RESET))
+    assert [job.category for job in drain(queue)] == [RESET, LOGIN, RESET, LOGIN, RESET, RESET]
+
+
+def test_priority_queue_client_depth() -> None:
+    queue = PriorityJobQueue()
+    queue.push(create_job(LOGIN, "a"))
+    queue.push(create_job(RESET, "a"))
+    queue.push(create_job(RESET, "b"))
+
+    assert queue.client_depth("a") == 2
+    assert queue.depth(RESET) == 2
+    assert queue.depth(REGISTRATION) == 0
+
+
+def test_priority_queue_invalid_weight() -> None:
+    with pytest.raises(ValueError):
+        PriorityJobQueue({LOGIN: 0})
+
+
+def test_executor_runs_jobs() -> None:
+    executor = HashingExecutor(max_workers=2)
+    try:
+        assert executor.run(pow, 2, 10) == 1024
+        assert executor.submit(sum, (1, 2, 3), category=RESET).result(timeout=5) == 6
+        assert executor.stats().started_jobs == 2
+    finally:
+        executor.shutdown()
+
+
+def test_executor_queue_limits() -> None:
+    started = Event()
+    release = Event()
+
+    def block() -> None:
+        started.set()
+        release.wait(5)
+
+    executor = HashingExecutor(max_workers=1, max_queue_size=2, queue_limits={RESET: 1}, client_queue_limit=1)
+    try:
+        running = executor.submit(block)
+        assert started.wait(5)
+
+        queued = executor.submit(lambda: "reset", category=RESET, client="a")
+        assert executor.queue_depth == 1
+        assert executor.is_saturated(RESET)
+        with pytest.raises(HashingQueueFullError):
+            executor.submit(lambda: None, category=RESET, client="b")
+        with pytest.raises(HashingQueueFullError):
+            executor.submit(lambda: None, category=LOGIN, client="a")
+
+        login = executor.submit(lambda: "login", category=LOGIN, client="b")
+        assert executor.is_saturated()
+        with pytest.raises(HashingQueueFullError):
+            executor.submit(lambda: None)
+
+        release.set()
+        running.result(timeout=5)
+        assert queued.result(timeout=5) == "reset"
+        assert login.result(timeout=5) == "login"
+        assert not executor.is_saturated()
+    finally:
+        release.set()
+        executor.shutdown()
+
+
+def test_executor_memory_budget() -> None:
+    release = Event()
+    executor = HashingExecutor(max_workers=4, max_hash_memory_mb=1)
+    try:
+        first = executor.submit(release.wait, 5, memory_kib=768)
+        second = executor.submit(lambda: "second", memory_kib=512)
+        assert executor.running == 1
+        assert executor.queue_depth == 1
+
+        release.set()
+        assert first.result(timeout=5)
+        assert second.result(timeout=5) == "second"
+    finally:
+        release.set()
+        executor.shutdown()
+
+
+def test_executor_shedding() -> None:
+    release = Event()
+    executor = HashingExecutor(max_workers=1, shed_queue_length=1)
+    try:
+        executor.submit(release.wait, 5)
+        assert not executor.is_saturated()
+        executor.submit(lambda: None)
+        assert executor.is_saturated()
+        assert executor.retry_after() >= 1
+    finally:
+        release.set()
+        executor.shutdown()
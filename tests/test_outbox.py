@@ -0,0 +1,299 @@
+"""
+Tests of the background email outbox.
+"""
+
+
+# Imports
+# ----------------------------------------
+
+
+from pathlib import Path
+
+from sqlite3 import connect
+
+from threading import Event, Lock
+
+from time import sleep, time
+
+from flask import Flask, current_app
+
+import pytest
+
+from user_blueprint.outbox import PASSWORD_RESET_EMAIL, VERIFICATION_EMAIL, EmailOutbox, OutboxFullError
+
+
+# Typing imports
+# ----------------------------------------
+
+
+from typing import List, Tuple
+
+
+# Metadata
+# ------------------------------------------------------------
+
+
+__author__ = "Peter Volf"
+
+
+# Classes
+# ------------------------------------------------------------
+
+
+class FlakyDelivery(object):
+    """
+    Delivery callback that fails the given number of times before it succeeds.
+    """
+
+    def __init__(self, failures: int = 0) -> None:
+        self.calls: List[Tuple[str, str, str]] = []
+        self.failures: int = failures
+        self._lock: Lock = Lock()
+
+    def __call__(self, kind: str, user_key: str, link: str) -> bool:
+        with self._lock:
+            self.calls.append((kind, user_key, link))
+            if self.failures > 0:
+                self.failures -= 1
+                raise RuntimeError("The mail server is down.")
+            return True
+
+
+# Methods
+# ------------------------------------------------------------
+
+
+def test_outbox_delivers_emails() -> None:
+    outbox = EmailOutbox(max_workers=2)
+    delivery = FlakyDelivery()
+    outbox.start(delivery)
+    try:
+        outbox.enqueue(VERIFICATION_EMAIL, "alice", "https://example.com/verify/1")
+        outbox.enqueue(PASSWORD_RESET_EMAIL, "bob", "https://example.com/reset/2")
+        assert outbox.join(5)
+    finally:
+        outbox.shutdown()
+
+    assert sorted(delivery.calls) == [
+        (PASSWORD_RESET_EMAIL, "bob", "https://example.com/reset/2"),
+        (VERIFICATION_EMAIL, "alice", "https://example.com/verify/1")
+    ]
+    assert outbox.stats().sent == 2
+    assert len(outbox) == 0
+
+
+def test_outbox_retries_failed_deliveries() -> None:
+    outbox = EmailOutbox(max_workers=1, max_attempts=5, retry_delay=0.01, max_retry_delay=0.02)
+    delivery = FlakyDelivery(failures=2)
+    outbox.start(delivery)
+    try:
+        outbox.enqueue(PASSWORD_RESET_EMAIL, "alice", "link")
+        assert outbox.join(5)
+    finally:
+        outbox.shutdown()
+
+    stats = outbox.stats()
+    assert len(delivery.calls) == 3
+    assert (stats.sent, stats.retried, stats.failed) == (1, 2, 0)
+
+
+def test_outbox_drops_emails_after_max_attempts() -> None:
+    outbox = EmailOutbox(max_workers=1, max_attempts=3, retry_delay=0.01)
+    delivery = FlakyDelivery(failures=10)
+    outbox.start(delivery)
+    try:
+        outbox.enqueue(PASSWORD_RESET_EMAIL, "alice", "link")
+        assert outbox.join(5)
+    finally:
+        outbox.shutdown()
+
+    stats = outbox.stats()
+    assert len(delivery.calls) == 3
+    assert (stats.sent, stats.retried, stats.failed) == (0, 2, 1)
+
+
+def test_outbox_treats_false_as_failure() -> None:
+    outbox = EmailOutbox(max_workers=1, max_attempts=2, retry_delay=0.01)
+    calls: List[str] = []
+    outbox.start(lambda kind, user_key, link: calls.append(user_key) and False)
+    try:
+        outbox.enqueue(VERIFICATION_EMAIL, "alice", "link")
+        assert outbox.join(5)
+    finally:
+        outbox.shutdown()
+
+    assert calls == ["alice", "alice"]
+    assert outbox.stats().failed == 1
+
+
+def test_outbox_full() -> None:
+    release = Event()
+    outbox = EmailOutbox(max_workers=1, max_queue_size=1)
+    outbox.start(lambda kind, user_key, link: release.wait(5))
+    try:
+        outbox.enqueue(VERIFICATION_EMAIL, "alice", "link")
+        with pytest.raises(OutboxFullError):
+            for _ in range(3):
+                outbox.enqueue(VERIFICATION_EMAIL, "bob", "link")
+    finally:
+        release.set()
+        outbox.shutdown()
+
+
+def test_outbox_persists_retry_state(tmp_path: Path) -> None:
+    database_path = str(tmp_path / "outbox.db")
+    outbox = EmailOutbox(max_workers=1, retry_delay=60, database_path=database_path)
+    outbox.start(FlakyDelivery(failures=1))
+    outbox.enqueue(PASSWORD_RESET_EMAIL, "alice", "https://example.com/reset/1")
+    for _ in range(500):
+        if outbox.stats().retried == 1:
+            break
+        sleep(0.01)
+    outbox.shutdown()
+
+    connection = connect(database_path)
+    try:
+        rows = connection.execute("SELECT kind, user_key, link, attempts FROM outbox").fetchall()
+    finally:
+        connection.close()
+    assert rows == [(PASSWORD_RESET_EMAIL, "alice", "https://example.com/reset/1", 1)]
+
+    recovered = EmailOutbox(max_workers=1, database_path=database_path)
+    delivery = FlakyDelivery()
+    recovered.start(delivery)
+    try:
+        # The retry is not due yet, but the email is back in the queue.
+        assert len(recovered) == 1
+        assert delivery.calls == []
+    finally:
+        recovered.shutdown()
+
+
+def test_outbox_delivers_in_app_context() -> None:
+    app = Flask("outbox-test")
+    names: List[str] = []
+    outbox = EmailOutbox(max_workers=1)
+    outbox.start(lambda kind, user_key, link: names.append(current_app.name) or True, app)
+    try:
+        outbox.enqueue(VERIFICATION_EMAIL, "alice", "link")
+        assert outbox.join(5)
+    finally:
+        outbox.shutdown()
+
+    assert names == ["outbox-test"]
+
+
+def test_outbox_expired_links_are_dropped(tmp_path: Path) -> None:
+    database_path = str(tmp_path / "outbox.db")
+    outbox = EmailOutbox(max_workers=1, database_path=database_path)
+    delivery = FlakyDelivery()
+    outbox.start(delivery)
+    try:
+        outbox.enqueue(PASSWORD_RESET_EMAIL, "alice", "expired", time() - 1)
+        outbox.enqueue(PASSWORD_RESET_EMAIL, "bob", "valid", time() + 60)
+        assert outbox.join(5)
+    finally:
+        outbox.shutdown()
+
+    assert delivery.calls == [(PASSWORD_RESET_EMAIL, "bob", "valid")]
+    assert outbox.stats().failed == 1
+
+    connection = connect(database_path)
+    try:
+        with connection:
+            connection.execute(
+                "INSERT INTO outbox (kind, user_key, link, attempts, due, expires_at) VALUES (?, ?, ?, 0, 0, ?)",
+                (PASSWORD_RESET_EMAIL, "carol", "expired", time() - 1)
+            )
+        recovered = EmailOutbox(max_workers=1, database_path=database_path)
+        recovered.start(delivery)
+        recovered.shutdown()
+        assert len(recovered) == 0
+        assert connection.execute("SELECT COUNT(*) FROM outbox").fetchone() == (0,)
+    finally:
+        connection.close()
+
+
+def test_outbox_shared_database(tmp_path: Path) -> None:
+    database_path = str(tmp_path / "outbox.db")
+    first = EmailOutbox(max_workers=1, retry_delay=60, database_path=database_path)
+    first.start(FlakyDelivery(failures=2))
+    first.enqueue(PASSWORD_RESET_EMAIL, "alice", "link-1")
+    first.enqueue(PASSWORD_RESET_EMAIL, "bob", "link-2")
+    for _ in range(500):
+        if first.stats().retried == 2:
+            break
+        sleep(0.01)
+    assert first.stats().retried == 2
+
+    # The emails are claimed by the running outbox, another process must not send them.
+    second = EmailOutbox(max_workers=1, database_path=database_path)
+    second.start(FlakyDelivery())
+    try:
+        assert len(second) == 0
+
+        # Stopped outboxes release their emails.
+        first.shutdown()
+        third = EmailOutbox(max_workers=1, database_path=database_path)
+        third.start(FlakyDelivery())
+        try:
+            assert len(third) == 2
+        finally:
+            third.shutdown()
+    finally:
+        second.shutdown()
+
+
+def test_outbox_takes_over_expired_claims(tmp_path: Path) -> None:
+    database_path = str(tmp_path / "outbox.db")
+    outbox = EmailOutbox(max_workers=1, database_path=database_path, lease_time=0.2)
+    delivery = FlakyDelivery()
+    outbox.start(delivery)
+    try:
+        connection = connect(database_path)
+        try:
+            with connection:
+                # Emails of a crashed process: one whose claim is still valid and one whose claim expired.
+                connection.execute(
+                    "INSERT INTO outbox (kind, user_key, link, attempts, due, owner, lease) VALUES "
+                    "(?, 'alice', 'live-claim', 0, 0, 'crashed', ?), (?, 'bob', 'expired-claim', 0, 0, 'crashed', ?)",
+                    (PASSWORD_RESET_EMAIL, time() + 0.5, PASSWORD_RESET_EMAIL, time() - 1)
+                )
+        finally:
+            connection.close()
+
+        for _ in range(500):
+            if len(delivery.calls) == 2:
+                break
+            sleep(0.01)
+    finally:
+        outbox.shutdown()
+
+    assert [call[2] for call in delivery.calls] == ["expired-claim", "live-claim"]
+
+
+def test_outbox_upgrades_database(tmp_path: Path) -> None:
+    database_path = str(tmp_path / "outbox.db")
+    connection = connect(database_path)
+    try:
+        with connection:
+            connection.execute(
+                "CREATE TABLE outbox (id INTEGER PRIMARY KEY AUTOINCREMENT, kind TEXT NOT NULL, "
+                "user_key TEXT NOT NULL, link TEXT NOT NULL, attempts INTEGER NOT NULL, due REAL NOT NULL)"
+            )
+            connection.execute(
+                "INSERT INTO outbox (kind, user_key, link, attempts, due) VALUES (?, 'alice', 'link', 0, 0)",
+                (VERIFICATION_EMAIL,)
+            )
+    finally:
+        connection.close()
+
+    outbox = EmailOutbox(max_workers=1, database_path=database_path)
+    delivery = FlakyDelivery()
+    outbox.start(delivery)
+    try:
+        assert outbox.join(5)
+    finally:
+        outbox.shutdown()
+
+    assert delivery.calls == [(VERIFICATION_EMAIL, "alice", "link")]
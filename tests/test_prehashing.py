@@ -0,0 +1,84 @@
+"""
+Tests of the client-side pre-hashing protocol.
+"""
+
+
+# Imports
+# ----------------------------------------
+
+
+import pytest
+
+from user_blueprint.prehashing import ClientPrehashing, compute_client_hash
+
+
+# Metadata
+# ------------------------------------------------------------
+
+
+__author__ = "Peter Volf"
+
+
+# Global properties
+# ------------------------------------------------------------
+
+
+SECRET: str = "prehash-secret-" * 4
+"""
+The secret key of the keyed hash of the client hashes.
+"""
+
+
+# Methods
+# ------------------------------------------------------------
+
+
+def test_salt_is_stable_and_secret_dependent() -> None:
+    prehashing = ClientPrehashing(SECRET)
+
+    assert prehashing.get_salt("alice123") == prehashing.get_salt("Alice123")
+    assert prehashing.get_salt("alice123") != prehashing.get_salt("bob12345")
+    assert prehashing.get_salt("alice123") != ClientPrehashing("other-secret-" * 4).get_salt("alice123")
+
+
+def test_hash_and_verify() -> None:
+    prehashing = ClientPrehashing(SECRET, iterations=1000)
+    salt = prehashing.get_salt("alice123")
+    client_hash = compute_client_hash("password123", salt, 1000)
+    password_hash = prehashing.hash(client_hash, salt)
+
+    assert prehashing.is_prehash(password_hash)
+    assert not prehashing.is_prehash("$argon2id$v=19$m=65536,t=3,p=4$c2FsdA$aGFzaA")
+    assert not prehashing.is_prehash(None)
+    assert client_hash not in password_hash
+    assert prehashing.verify(client_hash, password_hash)
+    assert not prehashing.verify(compute_client_hash("password124", salt, 1000), password_hash)
+    assert not prehashing.verify("", password_hash)
+    assert not ClientPrehashing("other-secret-" * 4).verify(client_hash, password_hash)
+    assert not prehashing.verify(client_hash, prehashing.create_dummy_hash())
+
+
+def test_hash_rejects_malformed_input() -> None:
+    prehashing = ClientPrehashing(SECRET)
+    salt = prehashing.get_salt("alice123")
+
+    with pytest.raises(ValueError):
+        prehashing.hash("not a client hash", salt)
+    with pytest.raises(ValueError):
+        prehashing.hash(compute_client_hash("password123", salt, 1), "not a salt$")
+
+
+def test_get_parameters_keeps_stored_iterations() -> None:
+    old = ClientPrehashing(SECRET, iterations=1000)
+    new = ClientPrehashing(SECRET, iterations=2000)
+    salt = old.get_salt("alice123")
+    password_hash = old.hash(compute_client_hash("password123", salt, 1000), salt)
+
+    assert new.get_parameters("alice123", password_hash) == (salt, 1000)
+    assert new.get_parameters("alice123", None) == (salt, 2000)
+    assert new.get_parameters("unknown1", None) == (new.get_salt("unknown1"), 2000)
+
+
+def test_invalid_iterations() -> None:
+    with pytest.raises(ValueError):
+        ClientPrehashing(SECRET, iterations=0)
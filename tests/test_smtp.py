@@ -0,0 +1,158 @@
+"""
+Tests of the pooled SMTP email sender.
+"""
+
+
+# Imports
+# ----------------------------------------
+
+
+from email import message_from_bytes
+from email.message import Message
+from socketserver import StreamRequestHandler, ThreadingTCPServer
+from threading import Thread
+
+import pytest
+
+from user_blueprint.emails import EmailTemplates
+from user_blueprint.smtp import SMTPEmailSender
+
+
+# Typing imports
+# ----------------------------------------
+
+
+from typing import Iterator, List
+
+
+# Metadata
+# ------------------------------------------------------------
+
+
+__author__ = "Peter Volf"
+
+
+# Classes
+# ------------------------------------------------------------
+
+
+class RecordingSMTPHandler(StreamRequestHandler):
+    """
+    Request handler of a local SMTP server that records the received messages and
+    rejects the recipients that start with "reject".
+    """
+
+    def handle(self) -> None:
+        self.server.connections += 1
+        self._reply(b"220 test ESMTP")
+        while True:
+            line: bytes = self.rfile.readline()
+            command: bytes = line[:4].upper()
+            if not line:
+                return
+            elif command in (b"EHLO", b"HELO"):
+                self._reply(b"250 test")
+            elif command == b"RCPT":
+                self._reply(b"550 Rejected" if b"<reject" in line else b"250 OK")
+            elif command == b"DATA":
+                self._reply(b"354 End data with <CR><LF>.<CR><LF>")
+                data: List[bytes] = []
+                while (line := self.rfile.readline()) not in (b".\r\n", b""):
+                    data.append(line[1:] if line.startswith(b"..") else line)
+                self.server.messages.append(message_from_bytes(b"".join(data)))
+                self._reply(b"250 OK")
+            elif command == b"QUIT":
+                self._reply(b"221 Bye")
+                return
+            else:
+                self._reply(b"250 OK")
+
+    def _reply(self, reply: bytes) -> None:
+        self.wfile.write(reply + b"\r\n")
+
+
+class User(object):
+    """
+    User with the properties the email senders use.
+    """
+
+    def __init__(self, username: str, email: str) -> None:
+        self.username: str = username
+        self.email: str = email
+
+
+# Methods
+# ------------------------------------------------------------
+
+
+@pytest.fixture
+def server() -> Iterator[ThreadingTCPServer]:
+    server = ThreadingTCPServer(("127.0.0.1", 0), RecordingSMTPHandler)
+    server.daemon_threads = True
+    server.connections = 0
+    server.messages = []
+    Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def create_sender(server: ThreadingTCPServer, **kwargs) -> SMTPEmailSender:
+    return SMTPEmailSender(
+        "127.0.0.1", "noreply@example.com", port=server.server_address[1], security=None,
+        templates=EmailTemplates(), timeout=5, **kwargs
+    )
+
+
+def test_send_reuses_connections(server: ThreadingTCPServer) -> None:
+    sender = create_sender(server)
+    for index in range(3):
+        assert sender.send_message(sender.create_message(f"user{index}@example.com", "Subject", "Body"))
+    sender.close()
+
+    assert server.connections == 1
+    assert [message["To"] for message in server.messages] == [f"user{index}@example.com" for index in range(3)]
+
+
+def test_send_batch_skips_rejected_messages(server: ThreadingTCPServer) -> None:
+    sender = create_sender(server, max_messages_per_connection=2)
+    messages = [
+        sender.create_message(recipient, "Subject", "Body")
+        for recipient in ("a@example.com", "reject@example.com", "b@example.com", "c@example.com")
+    ]
+
+    assert sender.send(messages) == 3
+    sender.close()
+
+    assert [message["To"] for message in server.messages] == ["a@example.com", "b@example.com", "c@example.com"]
+    assert server.connections == 2
+
+
+def test_login_link_email_sender(server: ThreadingTCPServer) -> None:
+    sender = create_sender(server)
+
+    assert sender.login_link_email_sender(User("<b>bob</b>", "bob@example.com"), "https://e.com/login/abc")
+    sender.close()
+
+    message: Message = server.messages[0]
+    assert message["To"] == "bob@example.com"
+    assert message["Subject"] == "Your login link"
+    text, html = (part.get_payload(decode=True).decode("utf-8") for part in message.get_payload())
+    assert "<b>bob</b>" in text and "https://e.com/login/abc" in text
+    assert "&lt;b&gt;bob&lt;/b&gt;" in html and 'href="https://e.com/login/abc"' in html
+
+
+def test_send_fails_without_server() -> None:
+    server = ThreadingTCPServer(("127.0.0.1", 0), RecordingSMTPHandler)
+    port = server.server_address[1]
+    server.server_close()
+
+    sender = SMTPEmailSender("127.0.0.1", "noreply@example.com", port=port, security=None, timeout=1)
+    assert not sender.send_message(sender.create_message("a@example.com", "Subject", "Body"))
+
+
+def test_invalid_configuration() -> None:
+    with pytest.raises(ValueError):
+        SMTPEmailSender("127.0.0.1", "noreply@example.com", security="tls")
+    with pytest.raises(ValueError):
+        SMTPEmailSender("127.0.0.1", "noreply@example.com", pool_size=0)
@@ -0,0 +1,104 @@
+"""
+Tests of the count-min sketches and the login throttle.
+"""
+
+
+# Imports
+# ----------------------------------------
+
+
+import pytest
+
+from user_blueprint.throttling import CountMinSketch, DecayingCountMinSketch, LoginThrottle
+
+
+# Metadata
+# ------------------------------------------------------------
+
+
+__author__ = "Peter Volf"
+
+
+# Classes
+# ------------------------------------------------------------
+
+
+class FakeClock(object):
+    """
+    Manually advanced clock.
+    """
+
+    def __init__(self, now: float = 1000) -> None:
+        self.now: float = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+# Methods
+# ------------------------------------------------------------
+
+
+def test_count_min_sketch_counts() -> None:
+    sketch = CountMinSketch(width=1024, depth=4)
+    for _ in range(5):
+        sketch.add("a")
+    assert sketch.add("b", 3) == 3
+
+    assert sketch.estimate("a") == 5
+    assert sketch.estimate("b") == 3
+    assert sketch.estimate("c") == 0
+
+    sketch.clear()
+    assert sketch.estimate("a") == 0
+
+
+def test_count_min_sketch_never_underestimates() -> None:
+    sketch = CountMinSketch(width=16, depth=2)
+    counts = {f"key{index}": index % 7 + 1 for index in range(100)}
+    for key, count in counts.items():
+        sketch.add(key, count)
+
+    assert all(sketch.estimate(key) >= count for key, count in counts.items())
+
+
+def test_count_min_sketch_invalid_size() -> None:
+    with pytest.raises(ValueError):
+        CountMinSketch(width=0)
+    with pytest.raises(ValueError):
+        CountMinSketch(depth=9)
+
+
+def test_decaying_count_min_sketch_window() -> None:
+    clock = FakeClock()
+    sketch = DecayingCountMinSketch(100, width=1024, clock=clock)
+    for _ in range(4):
+        sketch.add("a")
+
+    clock.now += 50
+    assert sketch.estimate("a") == 4
+
+    # Half of the previous window is still within the sliding window.
+    clock.now += 100
+    assert sketch.estimate("a") == pytest.approx(2)
+    assert sketch.add("a") == pytest.approx(3)
+
+    clock.now += 250
+    assert sketch.estimate("a") == 0
+
+
+def test_login_throttle_limits() -> None:
+    throttle = LoginThrottle(max_failures_per_client=3, max_failures_per_username=2, width=1024)
+
+    throttle.record_failure("client-1", "alice")
+    assert throttle.is_allowed("client-2", "alice")
+    throttle.record_failure("client-2", "alice")
+    assert not throttle.is_allowed("client-3", "alice")
+    assert throttle.is_allowed("client-3", "bob")
+    assert throttle.is_allowed("client-3")
+
+    throttle.record_failure("client-1", None)
+    throttle.record_failure("client-1", None)
+    assert not throttle.is_allowed("client-1")
+    assert not throttle.is_allowed("client-1", "bob")
+    assert throttle.is_allowed(None, "bob")
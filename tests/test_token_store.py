@@ -0,0 +1,161 @@
+"""
+Tests of the consumed token store, the decoded token cache and the reset request cooldown.
+"""
+
+
+# Imports
+# ----------------------------------------
+
+
+import pytest
+
+from user_blueprint.token_store import DecodedTokenCache, MemoryConsumedTokenStore, ResetRequestCooldown, get_token_id
+
+
+# Metadata
+# ------------------------------------------------------------
+
+
+__author__ = "Peter Volf"
+
+
+# Classes
+# ------------------------------------------------------------
+
+
+class FakeClock(object):
+    """
+    Manually advanced clock.
+    """
+
+    def __init__(self, now: float = 1000) -> None:
+        self.now: float = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+# Methods
+# ------------------------------------------------------------
+
+
+def test_get_token_id() -> None:
+    assert get_token_id("token") == get_token_id("token")
+    assert get_token_id("token") != get_token_id("other")
+    assert "token" not in get_token_id("token")
+    assert len(get_token_id("token")) == 32
+
+
+def test_consumed_token_store_consumes_once() -> None:
+    clock = FakeClock()
+    store = MemoryConsumedTokenStore(clock=clock)
+
+    assert not store.is_consumed("a")
+    assert store.consume("a", clock.now + 60)
+    assert store.is_consumed("a")
+    assert not store.consume("a", clock.now + 60)
+    assert store.consume("b", clock.now + 60)
+    assert len(store) == 2
+
+
+def test_consumed_token_store_forgets_expired_tokens() -> None:
+    clock = FakeClock()
+    store = MemoryConsumedTokenStore(tick=1, wheel_size=8, clock=clock)
+    store.consume("short", clock.now + 2.5)
+    store.consume("long", clock.now + 20)
+
+    clock.now += 3
+    assert not store.is_consumed("short")
+    assert store.is_consumed("long")
+    assert len(store) == 1
+
+    # The wheel turns more than once before the long token expires.
+    clock.now += 10
+    assert store.is_consumed("long")
+    clock.now += 8
+    assert not store.is_consumed("long")
+    assert len(store) == 0
+
+
+def test_consumed_token_store_ignores_expired_tokens() -> None:
+    clock = FakeClock()
+    store = MemoryConsumedTokenStore(clock=clock)
+
+    assert store.consume("expired", clock.now - 1)
+    assert len(store) == 0
+
+
+def test_consumed_token_store_invalid_arguments() -> None:
+    with pytest.raises(ValueError):
+        MemoryConsumedTokenStore(tick=0)
+    with pytest.raises(ValueError):
+        MemoryConsumedTokenStore(wheel_size=0)
+
+
+def test_decoded_token_cache() -> None:
+    clock = FakeClock()
+    cache = DecodedTokenCache(max_size=2, ttl=60, clock=clock)
+    cache.put("t1", "alice", {"reset_key": "alice", "exp": clock.now + 30})
+    cache.put("t2", "bob", {"reset_key": "bob"})
+
+    assert cache.get("t1").key == "alice"
+    cache.put("t3", "alice", {"reset_key": "alice"})
+    # The least recently used entry is evicted.
+    assert cache.get("t2") is None
+    assert len(cache) == 2
+
+    cache.invalidate_key("alice")
+    assert cache.get("t1") is None
+    assert cache.get("t3") is None
+
+
+def test_decoded_token_cache_expiration() -> None:
+    clock = FakeClock()
+    cache = DecodedTokenCache(ttl=60, clock=clock)
+    cache.put("short", "alice", {"reset_key": "alice", "exp": clock.now + 10})
+    cache.put("long", "bob", {"reset_key": "bob", "exp": clock.now + 600})
+
+    clock.now += 11
+    assert cache.get("short") is None
+    assert cache.get("long") is not None
+    clock.now += 50
+    assert cache.get("long") is None
+
+
+def test_cooldown_deduplicates_requests() -> None:
+    clock = FakeClock()
+    cooldown = ResetRequestCooldown(window=60, clock=clock)
+    cooldown.put("Alice@Example.com", True, "alice", "token", clock.now + 600)
+
+    recent = cooldown.get("alice@example.com")
+    assert recent.sent
+    assert recent.key == "alice"
+    assert recent.token == "token"
+
+    clock.now += 61
+    assert cooldown.get("alice@example.com") is None
+
+
+def test_cooldown_ends_with_the_token() -> None:
+    clock = FakeClock()
+    cooldown = ResetRequestCooldown(window=60, clock=clock)
+    cooldown.put("alice@example.com", True, "alice", "token", clock.now + 10)
+
+    clock.now += 11
+    assert cooldown.get("alice@example.com") is None
+
+
+def test_cooldown_invalidation_and_eviction() -> None:
+    cooldown = ResetRequestCooldown(max_size=2)
+    cooldown.put("a@example.com", True, "a", "token-a")
+    cooldown.put("a2@example.com", True, "a", "token-a2")
+    cooldown.invalidate_key("a")
+    assert cooldown.get("a@example.com") is None
+    assert cooldown.get("a2@example.com") is None
+
+    for address in ("b@example.com", "c@example.com", "d@example.com"):
+        cooldown.put(address, True, address[0], "token")
+    assert len(cooldown) == 2
+    assert cooldown.get("b@example.com") is None
+    cooldown.invalidate_key("b")
+    assert cooldown.get("d@example.com") is not None
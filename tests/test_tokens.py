@@ -0,0 +1,197 @@
+"""
+Tests of the token codecs.
+"""
+
+
+# Imports
+# ----------------------------------------
+
+
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from time import time
+
+import jwt
+
+import pytest
+
+from user_blueprint.tokens import AsymmetricTokenCodec, CompactTokenCodec, TokenCodec, TokenKeyring
+
+
+# Typing imports
+# ----------------------------------------
+
+
+from typing import List, Tuple
+
+
+# Metadata
+# ------------------------------------------------------------
+
+
+__author__ = "Peter Volf"
+
+
+# Global properties
+# ------------------------------------------------------------
+
+
+SECRET: str = "test-secret-" * 8
+"""
+The signing key of the tests, long enough for every HMAC algorithm.
+"""
+
+OTHER_SECRET: str = "other-secret-" * 8
+"""
+A signing key that differs from `SECRET`.
+"""
+
+
+# Methods
+# ------------------------------------------------------------
+
+
+def create_key_pair(algorithm: str) -> Tuple[str, str]:
+    serialization = pytest.importorskip("cryptography.hazmat.primitives.serialization")
+    if algorithm == "EdDSA":
+        from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
+        private_key = Ed25519PrivateKey.generate()
+    else:
+        from cryptography.hazmat.primitives.asymmetric.ec import SECP256R1, generate_private_key
+        private_key = generate_private_key(SECP256R1())
+
+    return (
+        private_key.public_key().public_bytes(
+            serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo
+        ).decode("ascii"),
+        private_key.private_bytes(
+            serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+        ).decode("ascii")
+    )
+
+
+def non_canonical_variants(token: str) -> List[str]:
+    """
+    Returns encodings of the given token whose last base64 segment decodes to the same bytes.
+    """
+    alphabet = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_"
+    variants = [token + "=" * (-len(token.rsplit(".", 1)[-1]) % 4 or 4), token + "=="]
+    if len(token.rsplit(".", 1)[-1]) % 4 in (2, 3):
+        # The low bits of the last character are not part of the decoded bytes.
+        variants.append(token[:-1] + alphabet[alphabet.index(token[-1]) ^ 1])
+
+    return variants
+
+
+def test_token_codec_round_trip() -> None:
+    codec = TokenCodec(SECRET)
+    payload = {"reset_key": "alice@example.com", "exp": int(time()) + 60}
+
+    token = codec.encode(payload)
+    assert codec.decode(token) == payload
+    assert jwt.decode(token, SECRET, algorithms=["HS256"]) == payload
+    assert codec.decode(jwt.encode(payload, SECRET, algorithm="HS256")) == payload
+
+
+def test_token_codec_rejects_invalid_tokens() -> None:
+    codec = TokenCodec(SECRET)
+    token = codec.encode({"reset_key": "alice@example.com", "exp": time() + 60})
+
+    assert TokenCodec(OTHER_SECRET).decode(token) is None
+    assert codec.decode(token[:-2] + ("AA" if token[-2:] != "AA" else "BB")) is None
+    assert codec.decode(codec.encode({"reset_key": "alice@example.com", "exp": time() - 1})) is None
+    assert codec.decode(jwt.encode({"reset_key": "a"}, SECRET, algorithm="HS512")) is None
+    assert codec.decode("not a token") is None
+
+
+def test_token_codec_key_rotation() -> None:
+    old = TokenCodec(TokenKeyring({"1": "first", "2": "second"}, "1"))
+    new = TokenCodec(TokenKeyring({"1": "first", "2": "second"}, "2"))
+    payload = {"login_key": "alice@example.com", "exp": int(time()) + 60}
+
+    token = old.encode(payload)
+    assert jwt.get_unverified_header(token)["kid"] == "1"
+    assert new.decode(token) == payload
+    assert TokenCodec(TokenKeyring({"2": "second"}, "2")).decode(token) is None
+
+
+def test_compact_token_codec_round_trip() -> None:
+    codec = CompactTokenCodec(TokenKeyring({"k": SECRET}, "k"))
+    payload = {"verification_key": "alice@example.com", "exp": int(time()) + 60, "cv": "3"}
+
+    token = codec.encode(payload)
+    assert codec.decode(token) == payload
+    assert len(token) < len(TokenCodec(SECRET).encode(payload))
+
+
+def test_compact_token_codec_rejects_invalid_tokens() -> None:
+    codec = CompactTokenCodec(SECRET)
+    token = codec.encode({"reset_key": "alice@example.com", "exp": time() + 60})
+
+    assert CompactTokenCodec(OTHER_SECRET).decode(token) is None
+    assert CompactTokenCodec(SECRET, mac_size=10).decode(token) is None
+    assert codec.decode(token[:-2] + ("AA" if token[-2:] != "AA" else "BB")) is None
+    assert codec.decode(codec.encode({"reset_key": "alice@example.com", "exp": time() - 1})) is None
+    assert codec.decode(TokenCodec(SECRET).encode({"reset_key": "a", "exp": time() + 60})) is None
+    assert codec.decode("") is None
+
+
+def test_compact_token_codec_rejects_non_canonical_encodings() -> None:
+    codec = CompactTokenCodec(SECRET)
+    for value in ("a@example.com", "ab@example.com", "abc@example.com"):
+        token = codec.encode({"login_key": value, "exp": time() + 60})
+        assert codec.decode(token) is not None
+        for variant in non_canonical_variants(token):
+            assert codec.decode(variant) is None, variant
+
+
+def test_compact_token_codec_invalid_payloads() -> None:
+    codec = CompactTokenCodec(SECRET)
+    with pytest.raises(ValueError):
+        codec.encode({"reset_key": "alice@example.com"})
+    with pytest.raises(ValueError):
+        codec.encode({"reset_key": "alice@example.com", "login_key": "alice@example.com", "exp": time() + 60})
+    with pytest.raises(ValueError):
+        CompactTokenCodec(SECRET, mac_size=8)
+
+
+@pytest.mark.parametrize("algorithm", ["EdDSA", "ES256"])
+def test_asymmetric_token_codec(algorithm: str) -> None:
+    public_key, private_key = create_key_pair(algorithm)
+    signer = AsymmetricTokenCodec(public_key, private_key, algorithm)
+    verifier = AsymmetricTokenCodec(public_key, algorithm=algorithm)
+    payload = {"reset_key": "alice@example.com", "exp": int(time()) + 60}
+
+    token = signer.encode(payload)
+    assert verifier.decode(token) == payload
+    assert jwt.get_unverified_header(token)["alg"] == algorithm
+    assert AsymmetricTokenCodec(create_key_pair(algorithm)[0], algorithm=algorithm).decode(token) is None
+    assert verifier.decode(TokenCodec(public_key).encode(payload)) is None
+    with pytest.raises(ValueError):
+        verifier.encode(payload)
+
+
+@pytest.mark.parametrize("algorithm", ["EdDSA", "ES256"])
+def test_asymmetric_token_codec_rejects_non_canonical_signatures(algorithm: str) -> None:
+    public_key, private_key = create_key_pair(algorithm)
+    codec = AsymmetricTokenCodec(public_key, private_key, algorithm)
+    token = codec.encode({"login_key": "alice@example.com", "exp": int(time()) + 60})
+
+    for variant in non_canonical_variants(token):
+        assert codec.decode(variant) is None, variant
+
+
+def test_asymmetric_token_codec_rejects_high_s_signatures() -> None:
+    public_key, private_key = create_key_pair("ES256")
+    codec = AsymmetricTokenCodec(public_key, private_key, "ES256")
+    order = 0xFFFFFFFF00000000FFFFFFFFFFFFFFFFBCE6FAADA7179E84F3B9CAC2FC632551
+
+    for _ in range(8):
+        token = codec.encode({"login_key": "alice@example.com", "exp": int(time()) + 60})
+        signing_input, signature = token.rsplit(".", 1)
+        raw = urlsafe_b64decode(signature + "==")
+        s = int.from_bytes(raw[32:], "big")
+        assert s <= order // 2
+
+        high_s = raw[:32] + (order - s).to_bytes(32, "big")
+        assert codec.decode(token) is not None
+        assert codec.decode(f"{signing_input}.{urlsafe_b64encode(high_s).rstrip(b'=').decode('ascii')}") is None
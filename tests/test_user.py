@@ -0,0 +1,239 @@
+"""
+Tests of the password handling of the user handler.
+"""
+
+
+# Imports
+# ----------------------------------------
+
+
+from time import sleep, time
+
+from flask import Flask
+
+from flask_login import LoginManager, UserMixin
+
+import pytest
+
+from user_blueprint.hashers import ScryptHasher
+from user_blueprint.hashing import HashingExecutor
+from user_blueprint.prehashing import ClientPrehashing, compute_client_hash
+from user_blueprint.throttling import LoginThrottle
+from user_blueprint.user import LoginData, UserHandler
+
+
+# Typing imports
+# ----------------------------------------
+
+
+from typing import Callable, Dict, Iterator, Optional
+
+
+# Metadata
+# ------------------------------------------------------------
+
+
+__author__ = "Peter Volf"
+
+
+# Classes
+# ------------------------------------------------------------
+
+
+class User(UserMixin):
+    """
+    In-memory user.
+    """
+
+    def __init__(self, username: str, email: str, password: str) -> None:
+        self.id: str = username
+        self.username: str = username
+        self.email: str = email
+        self.password: str = password
+
+
+class CountingHasher(ScryptHasher):
+    """
+    Scrypt hasher that counts its verifications.
+    """
+
+    def __init__(self) -> None:
+        super(CountingHasher, self).__init__(log_n=4)
+        self.verifications: int = 0
+
+    def verify(self, password: str, password_hash: str) -> bool:
+        self.verifications += 1
+        return super(CountingHasher, self).verify(password, password_hash)
+
+
+class UserDatabase(object):
+    """
+    In-memory user database that is connected to a user handler.
+    """
+
+    def __init__(self, user_handler: UserHandler) -> None:
+        self.users: Dict[str, User] = {}
+
+        user_handler.user_getter(self.get)
+        user_handler.user_by_reset_key_getter(self.get)
+        user_handler.reset_key_getter(lambda user: user.email)
+        user_handler.password_getter(lambda user: user.password)
+        user_handler.password_updater(self.update_password)
+
+    def add(self, user_handler: UserHandler, username: str, password: str) -> User:
+        user = User(username, f"{username}@example.com", user_handler.hash_password(password))
+        self.users[username] = user
+        return user
+
+    def get(self, identifier: str) -> Optional[User]:
+        for user in self.users.values():
+            if identifier in (user.username, user.email):
+                return user
+        return None
+
+    def update_password(self, user: User, password_hash: str) -> bool:
+        user.password = password_hash
+        return True
+
+
+# Methods
+# ------------------------------------------------------------
+
+
+def wait_for(condition: Callable[[], bool], timeout: float = 10) -> None:
+    deadline = time() + timeout
+    while not condition():
+        assert time() < deadline, "Timed out."
+        sleep(0.01)
+
+
+@pytest.fixture
+def app() -> Flask:
+    app = Flask(__name__)
+    app.secret_key = "test-secret"
+    LoginManager(app)
+    return app
+
+
+@pytest.fixture
+def user_handler() -> Iterator[UserHandler]:
+    user_handler = UserHandler()
+    user_handler.password_hasher = ScryptHasher(log_n=4)
+    user_handler.hashing_executor = None
+    yield user_handler
+    if user_handler.hashing_executor is not None:
+        user_handler.hashing_executor.shutdown()
+
+
+def test_rehash_on_login_with_process_executor(app: Flask, user_handler: UserHandler) -> None:
+    database = UserDatabase(user_handler)
+    user = database.add(user_handler, "alice123", "password123")
+    user_handler.password_hasher = ScryptHasher(log_n=5)
+    user_handler.hashing_executor = HashingExecutor(max_workers=1, use_processes=True)
+
+    with app.test_request_context():
+        assert user_handler.login_user(LoginData("alice123", "password123", False))
+
+    wait_for(lambda: user.password.startswith("$scrypt$ln=5,"))
+    assert user_handler.verify_password("password123", user.password)
+
+
+def test_migrate_to_prehashing_with_process_executor(app: Flask, user_handler: UserHandler) -> None:
+    database = UserDatabase(user_handler)
+    user = database.add(user_handler, "alice123", "password123")
+    prehashing = ClientPrehashing("prehash-secret-" * 4, iterations=1000)
+    user_handler.client_prehashing = prehashing
+    user_handler.hashing_executor = HashingExecutor(max_workers=1, use_processes=True)
+    salt = prehashing.get_salt("alice123")
+    client_hash = compute_client_hash("password123", salt, 1000)
+
+    with app.test_request_context():
+        assert user_handler.login_user(
+            LoginData("alice123", "password123", False, client_hash=client_hash, salt=salt)
+        )
+
+    wait_for(lambda: prehashing.is_prehash(user.password))
+    assert prehashing.verify(client_hash, user.password)
+
+
+def test_migration_ignores_invalid_client_hash(app: Flask, user_handler: UserHandler) -> None:
+    database = UserDatabase(user_handler)
+    user = database.add(user_handler, "alice123", "password123")
+    password_hash = user.password
+    prehashing = ClientPrehashing("prehash-secret-" * 4, iterations=1000)
+    user_handler.client_prehashing = prehashing
+    salt = prehashing.get_salt("alice123")
+
+    with app.test_request_context():
+        assert user_handler.login_user(LoginData(
+            "alice123", "password123", False,
+            client_hash=compute_client_hash("other-password", salt, 1000), salt=salt
+        ))
+
+    assert user.password == password_hash
+
+
+@pytest.mark.parametrize("migrate", [True, False])
+def test_equalized_login_timing_with_prehashing(app: Flask, user_handler: UserHandler, migrate: bool) -> None:
+    hasher = CountingHasher()
+    user_handler.password_hasher = hasher
+    user_handler.equalize_login_timing = True
+    database = UserDatabase(user_handler)
+    database.add(user_handler, "alice123", "password123")
+    migrated = database.add(user_handler, "bob12345", "password123")
+    prehashing = ClientPrehashing("prehash-secret-" * 4, iterations=1000, migrate=migrate)
+    user_handler.client_prehashing = prehashing
+
+    def login(username: str) -> int:
+        salt = prehashing.get_salt(username)
+        data = LoginData(username, "password123" if migrate else "", False,
+                         client_hash=compute_client_hash("password123", salt, 1000), salt=salt)
+        hasher.verifications = 0
+        with app.test_request_context():
+            user_handler.login_user(data)
+        return hasher.verifications
+
+    salt = prehashing.get_salt("bob12345")
+    migrated.password = prehashing.hash(compute_client_hash("password123", salt, 1000), salt)
+
+    user_handler.prepare_dummy_hash()
+    if migrate:
+        assert login("alice123") == login("bob12345") == login("unknown1") == 1
+    else:
+        assert login("bob12345") == login("unknown1") == 0
+
+
+def test_login_throttle_counts_failures_per_account(app: Flask, user_handler: UserHandler) -> None:
+    database = UserDatabase(user_handler)
+    database.add(user_handler, "alice123", "password123")
+    database.add(user_handler, "bob12345", "password123")
+    user_handler.login_throttle = LoginThrottle(max_failures_per_client=100, max_failures_per_username=4)
+    client = ["10.0.0.1"]
+    user_handler.client_key_getter(lambda: client[0])
+
+    with app.test_request_context():
+        for index, username in enumerate(("alice123", "alice123@example.com") * 2):
+            client[0] = f"10.0.0.{index}"
+            assert not user_handler.is_login_throttled(username)
+            assert not user_handler.login_user(LoginData(username, "wrong-password", False))
+
+        client[0] = "10.0.1.1"
+        assert user_handler.is_login_throttled("alice123")
+        assert user_handler.is_login_throttled("alice123@example.com")
+        assert not user_handler.login_user(LoginData("alice123", "password123", False))
+        assert not user_handler.is_login_throttled("bob12345")
+        assert not user_handler.is_login_throttled("unknown1")
+        assert user_handler.login_user(LoginData("bob12345", "password123", False))
+
+
+def test_login_throttle_counts_unknown_usernames_per_client(app: Flask, user_handler: UserHandler) -> None:
+    UserDatabase(user_handler).add(user_handler, "alice123", "password123")
+    user_handler.login_throttle = LoginThrottle(max_failures_per_client=3, max_failures_per_username=100)
+    user_handler.client_key_getter(lambda: "10.0.0.1")
+
+    with app.test_request_context():
+        for index in range(3):
+            assert not user_handler.login_user(LoginData(f"unknown{index}", "password123", False))
+
+        assert user_handler.is_login_throttled("alice123")
+        assert not user_handler.login_user(LoginData("alice123", "password123", False))